@@ -3,9 +3,14 @@
 # Copyright 2015-2017 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import sys
+
 from setuptools import setup
 from setuptools import find_packages
 
+# the asyncio DAOs are python 3 only
+exclude = ['xivo_dao.aio', 'xivo_dao.aio.*'] if sys.version_info < (3, 5) else []
+
 
 setup(
     name='xivo-dao',
@@ -15,5 +20,8 @@ setup(
     author_email='dev@wazo.community',
     url='http://wazo.community',
     license='GPLv3',
-    packages=find_packages(),
+    packages=find_packages(exclude=exclude),
+    extras_require={
+        'asyncio': ['asyncpg'],
+    },
 )
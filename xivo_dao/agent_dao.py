@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
-# Copyright 2007-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2007-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import unicode_literals
 
 from collections import namedtuple
-from sqlalchemy.sql import select, and_
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.sql import and_, func
 from xivo_dao.alchemy.agentfeatures import AgentFeatures
 from xivo_dao.alchemy.queuemember import QueueMember
 from xivo_dao.alchemy.queuefeatures import QueueFeatures
@@ -19,55 +20,79 @@ _Queue = namedtuple('_Queue', ['id', 'tenant_uuid', 'name', 'penalty'])
 
 @daosession
 def agent_with_id(session, agent_id, tenant_uuids=None):
-    agent = _get_agent(session, AgentFeatures.id == int(agent_id), tenant_uuids)
-    _add_queues_to_agent(session, agent)
-    return agent
+    return _get_agent(session, AgentFeatures.id == int(agent_id), tenant_uuids)
 
 
 @daosession
 def agent_with_number(session, agent_number, tenant_uuids=None):
-    agent = _get_agent(session, AgentFeatures.number == agent_number, tenant_uuids)
-    _add_queues_to_agent(session, agent)
-    return agent
+    return _get_agent(session, AgentFeatures.number == agent_number, tenant_uuids)
 
 
 @daosession
 def agent_with_user_uuid(session, user_uuid, tenant_uuids=None):
     query = (
-        session.query(AgentFeatures)
+        _agents_with_queues_query(session, tenant_uuids)
         .join(UserFeatures, AgentFeatures.id == UserFeatures.agentid)
         .filter(UserFeatures.uuid == user_uuid)
     )
-    if tenant_uuids is not None:
-        query = query.filter(AgentFeatures.tenant_uuid.in_(tenant_uuids))
 
-    agent_row = query.first()
-    if agent_row is None:
+    row = query.first()
+    if row is None:
         raise LookupError('no agent found for user %s' % user_uuid)
-    agent = _Agent(agent_row.id, agent_row.tenant_uuid, agent_row.number, [])
-    _add_queues_to_agent(session, agent)
-    return agent
+    return _to_agent(row)
+
+
+@daosession
+def agents_with_queues(session, ids=None, tenant_uuids=None):
+    """Returns the agents with their queues, every agent unless `ids` is given"""
+    query = _agents_with_queues_query(session, tenant_uuids)
+    if ids is not None:
+        query = query.filter(AgentFeatures.id.in_(ids))
+    return [_to_agent(row) for row in query.order_by(AgentFeatures.id)]
 
 
 def _get_agent(session, whereclause, tenant_uuids=None):
-    query = session.query(AgentFeatures).filter(whereclause)
-    if tenant_uuids is not None:
-        query = query.filter(AgentFeatures.tenant_uuid.in_(tenant_uuids))
-    agent = query.first()
-    if agent is None:
+    row = _agents_with_queues_query(session, tenant_uuids).filter(whereclause).first()
+    if row is None:
         raise LookupError('no agent matching clause %s' % whereclause)
-    return _Agent(agent.id, agent.tenant_uuid, agent.number, [])
+    return _to_agent(row)
 
 
-def _add_queues_to_agent(session, agent):
-    query = select([QueueFeatures.id, QueueFeatures.tenant_uuid, QueueMember.queue_name, QueueMember.penalty],
-                   and_(QueueMember.usertype == 'agent',
-                        QueueMember.userid == agent.id,
-                        QueueMember.queue_name == QueueFeatures.name))
+def _agents_with_queues_query(session, tenant_uuids=None):
+    def queue_array(column):
+        aggregate = func.array_agg(aggregate_order_by(column, QueueFeatures.id))
+        return aggregate.filter(QueueFeatures.id.isnot(None))
 
-    for row in session.execute(query):
-        queue = _Queue(row['id'], row['tenant_uuid'], row['queue_name'], row['penalty'])
-        agent.queues.append(queue)
+    query = (
+        session.query(
+            AgentFeatures.id.label('id'),
+            AgentFeatures.tenant_uuid.label('tenant_uuid'),
+            AgentFeatures.number.label('number'),
+            queue_array(QueueFeatures.id).label('queue_ids'),
+            queue_array(QueueFeatures.tenant_uuid).label('queue_tenant_uuids'),
+            queue_array(QueueMember.queue_name).label('queue_names'),
+            queue_array(QueueMember.penalty).label('queue_penalties'),
+        )
+        .outerjoin(QueueMember, and_(QueueMember.usertype == 'agent',
+                                     QueueMember.userid == AgentFeatures.id))
+        .outerjoin(QueueFeatures, QueueMember.queue_name == QueueFeatures.name)
+        .group_by(AgentFeatures.id)
+    )
+    if tenant_uuids is not None:
+        query = query.filter(AgentFeatures.tenant_uuid.in_(tenant_uuids))
+    return query
+
+
+def _to_agent(row):
+    queues = [
+        _Queue(*queue) for queue in zip(
+            row.queue_ids or [],
+            row.queue_tenant_uuids or [],
+            row.queue_names or [],
+            row.queue_penalties or [],
+        )
+    ]
+    return _Agent(row.id, row.tenant_uuid, row.number, queues)
 
 
 @daosession
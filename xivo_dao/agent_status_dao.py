@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
-# Copyright 2007-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2007-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from collections import namedtuple
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import bindparam
+from sqlalchemy.orm import Query
 from sqlalchemy.sql.expression import case
 from xivo_dao.alchemy.agent_login_status import AgentLoginStatus
 from xivo_dao.alchemy.agent_membership_status import AgentMembershipStatus
@@ -10,8 +13,9 @@ from xivo_dao.alchemy.agentfeatures import AgentFeatures
 from xivo_dao.alchemy.queuemember import QueueMember
 from xivo_dao.alchemy.queuefeatures import QueueFeatures
 from xivo_dao.alchemy.userfeatures import UserFeatures
-from xivo_dao.helpers.db_utils import flush_session
-from xivo_dao.helpers.db_manager import daosession
+from xivo_dao.helpers import agent_status_registry
+from xivo_dao.helpers.db_utils import bulk_insert, flush_session
+from xivo_dao.helpers.db_manager import bakery, daosession
 
 
 _AgentStatus = namedtuple('_AgentStatus', ['agent_id', 'agent_number', 'extension',
@@ -22,6 +26,10 @@ _Queue = namedtuple('_Queue', ['id', 'name', 'penalty'])
 
 @daosession
 def get_status(session, agent_id, tenant_uuids=None):
+    registry = _get_registry(session)
+    if registry:
+        return _registry_status(registry.get_by_id(session, agent_id), tenant_uuids)
+
     login_status = _get_login_status_by_id(session, agent_id, tenant_uuids=tenant_uuids)
     if not login_status:
         return None
@@ -31,6 +39,10 @@ def get_status(session, agent_id, tenant_uuids=None):
 
 @daosession
 def get_status_by_number(session, agent_number, tenant_uuids=None):
+    registry = _get_registry(session)
+    if registry:
+        return _registry_status(registry.get_by_number(session, agent_number), tenant_uuids)
+
     login_status = _get_login_status_by_number(session, agent_number, tenant_uuids=tenant_uuids)
     if not login_status:
         return None
@@ -40,6 +52,10 @@ def get_status_by_number(session, agent_number, tenant_uuids=None):
 
 @daosession
 def get_status_by_user(session, user_uuid, tenant_uuids=None):
+    registry = _get_registry(session)
+    if registry:
+        return _registry_status(registry.get_by_user_uuid(session, user_uuid), tenant_uuids)
+
     login_status = _get_login_status_by_user(session, user_uuid, tenant_uuids=tenant_uuids)
     if not login_status:
         return None
@@ -47,53 +63,96 @@ def get_status_by_user(session, user_uuid, tenant_uuids=None):
     return _to_agent_status(login_status, _get_queues_for_agent(session, login_status.agent_id))
 
 
+def _get_registry(session):
+    # the registry does not know the uncommitted changes of the session
+    registry = agent_status_registry.registry
+    if registry.enabled and not agent_status_registry.is_pending(session):
+        return registry
+    return None
+
+
+def _registry_status(entry, tenant_uuids, with_queues=True):
+    if not entry:
+        return None
+
+    login_status, memberships = entry
+    if tenant_uuids is not None and login_status.tenant_uuid not in tenant_uuids:
+        return None
+
+    queues = None
+    if with_queues:
+        queues = [_Queue(m.queue_id, m.queue_name, m.penalty) for m in memberships]
+    return _to_agent_status(login_status, queues)
+
+
 def _get_login_status_by_id(session, agent_id, tenant_uuids=None):
-    login_status = (session
-                    .query(AgentLoginStatus)
-                    .outerjoin((AgentFeatures, AgentFeatures.id == AgentLoginStatus.agent_id))
-                    .filter(AgentLoginStatus.agent_id == agent_id))
-    if tenant_uuids is not None:
-        login_status = login_status.filter(AgentFeatures.tenant_uuid.in_(tenant_uuids))
-    return login_status.first()
+    return _login_status_by_id_query(agent_id, tenant_uuids).with_session(session).first()
 
 
 def _get_login_status_by_number(session, agent_number, tenant_uuids=None):
-    login_status = (session
-                    .query(AgentLoginStatus)
-                    .outerjoin((AgentFeatures, AgentFeatures.id == AgentLoginStatus.agent_id))
-                    .filter(AgentLoginStatus.agent_number == agent_number))
-    if tenant_uuids is not None:
-        login_status = login_status.filter(AgentFeatures.tenant_uuid.in_(tenant_uuids))
-    return login_status.first()
+    return _login_status_by_number_query(agent_number, tenant_uuids).with_session(session).first()
 
 
 def _get_login_status_by_user(session, user_uuid, tenant_uuids=None):
-    login_status = (session
-                    .query(AgentLoginStatus)
-                    .outerjoin((AgentFeatures, AgentFeatures.id == AgentLoginStatus.agent_id))
-                    .join((UserFeatures, AgentFeatures.id == UserFeatures.agentid))
-                    .filter(UserFeatures.uuid == user_uuid))
-    if tenant_uuids is not None:
-        login_status = login_status.filter(AgentFeatures.tenant_uuid.in_(tenant_uuids))
-    return login_status.first()
+    return _login_status_by_user_query(user_uuid, tenant_uuids).with_session(session).first()
 
 
 def _get_queues_for_agent(session, agent_id):
+    query = _queues_for_agent_query(agent_id).with_session(session)
+    return [_Queue(q.queue_id, q.queue_name, q.penalty) for q in query]
+
+
+def _get_queues_for_agents(session, agent_ids):
     query = (session
-             .query(AgentMembershipStatus.queue_id.label('queue_id'),
-                    AgentMembershipStatus.queue_name.label('queue_name'),
-                    AgentMembershipStatus.penalty.label('penalty'))
-             .filter(AgentMembershipStatus.agent_id == agent_id))
+             .query(AgentMembershipStatus)
+             .filter(AgentMembershipStatus.agent_id.in_(agent_ids)))
+
+    queues = {}
+    for q in query:
+        queues.setdefault(q.agent_id, []).append(_Queue(q.queue_id, q.queue_name, q.penalty))
+    return queues
+
+
+def _login_status_query(tenant_uuids):
+    login_status = (Query(AgentLoginStatus)
+                    .outerjoin((AgentFeatures, AgentFeatures.id == AgentLoginStatus.agent_id)))
+    if tenant_uuids is not None:
+        login_status = login_status.filter(AgentFeatures.tenant_uuid.in_(tenant_uuids))
+    return login_status
 
-    return [_Queue(q.queue_id, q.queue_name, q.penalty) for q in query]
+
+def _login_status_by_id_query(agent_id, tenant_uuids=None):
+    return _login_status_query(tenant_uuids).filter(AgentLoginStatus.agent_id == agent_id)
+
+
+def _login_status_by_number_query(agent_number, tenant_uuids=None):
+    return _login_status_query(tenant_uuids).filter(AgentLoginStatus.agent_number == agent_number)
+
+
+def _login_status_by_user_query(user_uuid, tenant_uuids=None):
+    return (_login_status_query(tenant_uuids)
+            .join((UserFeatures, AgentFeatures.id == UserFeatures.agentid))
+            .filter(UserFeatures.uuid == user_uuid))
+
+
+def _queues_for_agent_query(agent_id):
+    return (Query([AgentMembershipStatus.queue_id.label('queue_id'),
+                   AgentMembershipStatus.queue_name.label('queue_name'),
+                   AgentMembershipStatus.penalty.label('penalty')])
+            .filter(AgentMembershipStatus.agent_id == agent_id))
 
 
 @daosession
 def get_extension_from_agent_id(session, agent_id):
-    login_status_row = (session
-                        .query(AgentLoginStatus.extension, AgentLoginStatus.context)
-                        .filter(AgentLoginStatus.agent_id == agent_id)
-                        .first())
+    registry = _get_registry(session)
+    if registry:
+        entry = registry.get_by_id(session, agent_id)
+        login_status_row = entry[0] if entry else None
+    else:
+        login_status_row = (session
+                            .query(AgentLoginStatus.extension, AgentLoginStatus.context)
+                            .filter(AgentLoginStatus.agent_id == agent_id)
+                            .first())
 
     if not login_status_row:
         raise LookupError('agent with id %s is not logged' % agent_id)
@@ -103,11 +162,7 @@ def get_extension_from_agent_id(session, agent_id):
 
 @daosession
 def get_agent_id_from_extension(session, extension, context):
-    login_status = (session
-                    .query(AgentLoginStatus)
-                    .filter(AgentLoginStatus.extension == extension)
-                    .filter(AgentLoginStatus.context == context)
-                    .first())
+    login_status = _get_login_status_by_extension(session, extension, context)
     if not login_status:
         raise LookupError('No agent logged onto extension %s@%s' % (extension, context))
     return login_status.agent_id
@@ -115,8 +170,12 @@ def get_agent_id_from_extension(session, extension, context):
 
 @daosession
 def get_statuses(session, tenant_uuids=None):
+    return _statuses_query(tenant_uuids).with_session(session).all()
+
+
+def _statuses_query(tenant_uuids=None):
     query = (
-        session.query(
+        Query([
             AgentFeatures.id.label('agent_id'),
             AgentFeatures.tenant_uuid.label('tenant_uuid'),
             AgentFeatures.number.label('agent_number'),
@@ -126,24 +185,59 @@ def get_statuses(session, tenant_uuids=None):
             AgentLoginStatus.paused.label('paused'),
             AgentLoginStatus.paused_reason.label('paused_reason'),
             case([(AgentLoginStatus.agent_id == None, False)], else_=True).label('logged')  # noqa
-        ).outerjoin((AgentLoginStatus, AgentFeatures.id == AgentLoginStatus.agent_id))
+        ]).outerjoin((AgentLoginStatus, AgentFeatures.id == AgentLoginStatus.agent_id))
     )
 
     if tenant_uuids is not None:
         query = query.filter(AgentFeatures.tenant_uuid.in_(tenant_uuids))
 
-    return query.all()
+    return query
+
+
+def _get_login_status_by_extension(session, extension, context):
+    registry = _get_registry(session)
+    if registry:
+        entry = registry.get_by_extension(session, extension, context)
+        return entry[0] if entry else None
+
+    return _login_status_by_extension_baked(session).params(extension=extension, context=context).first()
+
+
+_login_status_by_extension_baked = bakery(lambda session: session.query(AgentLoginStatus))
+_login_status_by_extension_baked += lambda query: (
+    query
+    .filter(AgentLoginStatus.extension == bindparam('extension'))
+    .filter(AgentLoginStatus.context == bindparam('context'))
+)
+
+
+def _queue_agent_ids_query(session, queue_id):
+    return (session
+            .query(QueueMember.userid)
+            .filter(QueueFeatures.name == QueueMember.queue_name)
+            .filter(QueueFeatures.id == queue_id)
+            .filter(QueueMember.usertype == 'agent'))
+
+
+def _registry_queue_statuses(session, registry, queue_id, select):
+    queue_agent_ids = set(row.userid for row in _queue_agent_ids_query(session, queue_id))
+    statuses = []
+    for login_status, memberships in registry.logged_agents(session):
+        is_member = any(m.queue_id == queue_id for m in memberships)
+        if select(login_status.agent_id in queue_agent_ids, is_member):
+            statuses.append(_to_agent_status(login_status, None))
+    return statuses
 
 
 @daosession
 def get_statuses_for_queue(session, queue_id):
-    session = session
+    registry = _get_registry(session)
+    if registry:
+        return _registry_queue_statuses(
+            session, registry, queue_id, lambda in_queue, is_member: in_queue,
+        )
 
-    subquery = (session
-                .query(QueueMember.userid)
-                .filter(QueueFeatures.name == QueueMember.queue_name)
-                .filter(QueueFeatures.id == queue_id)
-                .filter(QueueMember.usertype == 'agent'))
+    subquery = _queue_agent_ids_query(session, queue_id)
     query = (session
              .query(AgentLoginStatus)
              .filter(AgentLoginStatus.agent_id.in_(subquery)))
@@ -153,11 +247,13 @@ def get_statuses_for_queue(session, queue_id):
 
 @daosession
 def get_statuses_to_add_to_queue(session, queue_id):
-    q1 = (session
-          .query(QueueMember.userid)
-          .filter(QueueFeatures.name == QueueMember.queue_name)
-          .filter(QueueFeatures.id == queue_id)
-          .filter(QueueMember.usertype == 'agent'))
+    registry = _get_registry(session)
+    if registry:
+        return _registry_queue_statuses(
+            session, registry, queue_id, lambda in_queue, is_member: in_queue and not is_member,
+        )
+
+    q1 = _queue_agent_ids_query(session, queue_id)
     q2 = (session
           .query(AgentMembershipStatus.agent_id)
           .filter(AgentMembershipStatus.queue_id == queue_id))
@@ -171,14 +267,16 @@ def get_statuses_to_add_to_queue(session, queue_id):
 
 @daosession
 def get_statuses_to_remove_from_queue(session, queue_id):
+    registry = _get_registry(session)
+    if registry:
+        return _registry_queue_statuses(
+            session, registry, queue_id, lambda in_queue, is_member: is_member and not in_queue,
+        )
+
     q1 = (session
           .query(AgentMembershipStatus.agent_id)
           .filter(AgentMembershipStatus.queue_id == queue_id))
-    q2 = (session
-          .query(QueueMember.userid)
-          .filter(QueueFeatures.name == QueueMember.queue_name)
-          .filter(QueueFeatures.id == queue_id)
-          .filter(QueueMember.usertype == 'agent'))
+    q2 = _queue_agent_ids_query(session, queue_id)
     agent_ids_to_remove = q1.except_(q2)
     query = (session
              .query(AgentLoginStatus)
@@ -189,14 +287,26 @@ def get_statuses_to_remove_from_queue(session, queue_id):
 
 @daosession
 def get_logged_agent_ids(session, tenant_uuids=None):
-    query = (session
-             .query(AgentLoginStatus.agent_id, AgentFeatures.tenant_uuid)
+    registry = _get_registry(session)
+    if registry:
+        return [
+            login_status.agent_id
+            for login_status, _ in registry.logged_agents(session)
+            if tenant_uuids is None or login_status.tenant_uuid in tenant_uuids
+        ]
+
+    query = _logged_agent_ids_query(tenant_uuids).with_session(session)
+    return [q.agent_id for q in query]
+
+
+def _logged_agent_ids_query(tenant_uuids=None):
+    query = (Query([AgentLoginStatus.agent_id, AgentFeatures.tenant_uuid])
              .outerjoin(AgentFeatures, AgentFeatures.id == AgentLoginStatus.agent_id))
 
     if tenant_uuids is not None:
         query = query.filter(AgentFeatures.tenant_uuid.in_(tenant_uuids))
 
-    return [q.agent_id for q in query]
+    return query
 
 
 def _to_agent_status(agent_login_status, queues):
@@ -214,6 +324,9 @@ def _to_agent_status(agent_login_status, queues):
 
 @daosession
 def is_extension_in_use(session, extension, context):
+    if _get_registry(session):
+        return _get_login_status_by_extension(session, extension, context) is not None
+
     count = (session
              .query(AgentLoginStatus)
              .filter(AgentLoginStatus.extension == extension)
@@ -239,6 +352,29 @@ def log_in_agent(session, agent_id, agent_number, extension, context, interface,
 def _add_agent(session, agent):
     with flush_session(session):
         session.add(agent)
+    agent_status_registry.mark_changed(session, [agent.agent_id])
+
+
+@daosession
+def log_in_agents(session, agents):
+    """Log in `agents` with a single INSERT and returns their statuses
+
+    `agents` are dicts with the agent_id, agent_number, extension, context,
+    interface and state_interface of each agent.
+    """
+    if not agents:
+        return []
+
+    table = AgentLoginStatus.__table__
+    rows = [dict(agent, paused=False) for agent in agents]
+    login_statuses = session.execute(table.insert().values(rows).returning(*table.c)).fetchall()
+
+    agent_ids = [login_status.agent_id for login_status in login_statuses]
+    agent_status_registry.mark_changed(session, agent_ids)
+
+    queues = _get_queues_for_agents(session, agent_ids)
+    return [_to_agent_status(login_status, queues.get(login_status.agent_id, []))
+            for login_status in login_statuses]
 
 
 @daosession
@@ -246,17 +382,54 @@ def log_off_agent(session, agent_id):
     (session
      .query(AgentLoginStatus)
      .filter(AgentLoginStatus.agent_id == agent_id)
-     .delete(synchronize_session='fetch'))
+     .delete(synchronize_session='evaluate'))
+    agent_status_registry.mark_changed(session, [agent_id])
+
+
+@daosession
+def log_off_agents(session, agent_ids):
+    """Log off `agent_ids` with a single DELETE and returns the ids of the agents that were logged"""
+    if not agent_ids:
+        return []
+
+    table = AgentLoginStatus.__table__
+    query = table.delete().where(table.c.agent_id.in_(agent_ids)).returning(table.c.agent_id)
+    logged_off = [row.agent_id for row in session.execute(query)]
+    agent_status_registry.mark_changed(session, logged_off)
+    return logged_off
 
 
 @daosession
 def add_agent_to_queues(session, agent_id, queues):
-    for queue in queues:
-        agent_membership_status = AgentMembershipStatus(agent_id=agent_id,
-                                                        queue_id=queue.id,
-                                                        queue_name=queue.name,
-                                                        penalty=queue.penalty)
-        session.add(agent_membership_status)
+    rows = [
+        {'agent_id': agent_id, 'queue_id': queue.id, 'queue_name': queue.name, 'penalty': queue.penalty}
+        for queue in queues
+    ]
+    bulk_insert(session, AgentMembershipStatus.__table__, rows)
+    agent_status_registry.mark_changed(session, [agent_id])
+
+
+@daosession
+def set_memberships(session, agent_id, queues):
+    """Make `queues` the only queues of the agent, adding, updating and removing memberships"""
+    table = AgentMembershipStatus.__table__
+    query = table.delete().where(table.c.agent_id == agent_id)
+    if queues:
+        query = query.where(~table.c.queue_id.in_([queue.id for queue in queues]))
+    session.execute(query)
+
+    if queues:
+        query = insert(table).values([
+            {'agent_id': agent_id, 'queue_id': queue.id, 'queue_name': queue.name, 'penalty': queue.penalty}
+            for queue in queues
+        ])
+        query = query.on_conflict_do_update(
+            index_elements=[table.c.agent_id, table.c.queue_id],
+            set_={'queue_name': query.excluded.queue_name, 'penalty': query.excluded.penalty},
+        )
+        session.execute(query)
+
+    agent_status_registry.mark_changed(session, [agent_id])
 
 
 @daosession
@@ -265,7 +438,8 @@ def remove_agent_from_queues(session, agent_id, queue_ids):
      .query(AgentMembershipStatus)
      .filter(AgentMembershipStatus.agent_id == agent_id)
      .filter(AgentMembershipStatus.queue_id.in_(queue_ids))
-     .delete(synchronize_session='fetch'))
+     .delete(synchronize_session=False))
+    agent_status_registry.mark_changed(session, [agent_id])
 
 
 @daosession
@@ -273,7 +447,8 @@ def remove_agent_from_all_queues(session, agent_id):
     (session
      .query(AgentMembershipStatus)
      .filter(AgentMembershipStatus.agent_id == agent_id)
-     .delete(synchronize_session='fetch'))
+     .delete(synchronize_session='evaluate'))
+    agent_status_registry.mark_changed(session, [agent_id])
 
 
 @daosession
@@ -281,7 +456,8 @@ def remove_all_agents_from_queue(session, queue_id):
     (session
      .query(AgentMembershipStatus)
      .filter(AgentMembershipStatus.queue_id == queue_id)
-     .delete(synchronize_session='fetch'))
+     .delete(synchronize_session='evaluate'))
+    agent_status_registry.mark_changed(session)
 
 
 @daosession
@@ -291,6 +467,7 @@ def update_penalty(session, agent_id, queue_id, penalty):
      .filter(AgentMembershipStatus.queue_id == queue_id)
      .filter(AgentMembershipStatus.agent_id == agent_id)
      .update({'penalty': penalty}))
+    agent_status_registry.mark_changed(session, [agent_id])
 
 
 @daosession
@@ -299,3 +476,4 @@ def update_pause_status(session, agent_id, is_paused, reason=None):
      .query(AgentLoginStatus)
      .filter(AgentLoginStatus.agent_id == agent_id)
      .update({'paused': is_paused, 'paused_reason': reason}))
+    agent_status_registry.mark_changed(session, [agent_id])
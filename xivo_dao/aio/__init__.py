@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# asyncio flavour of the hot path DAOs, python 3 only
+#
+# The queries are the ones of the synchronous DAOs, compiled for asyncpg and
+# run on the pool created by xivo_dao.helpers.db_manager.init_async_db.
+
+import asyncio
+
+from sqlalchemy.util import KeyedTuple
+
+from xivo_dao.helpers import db_manager
+
+_init_lock = None
+
+
+async def _pool():
+    pool = db_manager.AsyncPool
+    if pool is not None:
+        return pool
+    return await _create_pool()
+
+
+async def _create_pool():
+    global _init_lock
+    if db_manager.AsyncPoolOptions is None:
+        raise RuntimeError('init_async_db must be called before using xivo_dao.aio')
+    if _init_lock is None:
+        _init_lock = asyncio.Lock()
+    async with _init_lock:
+        if db_manager.AsyncPool is None:
+            import asyncpg
+            db_manager.AsyncPool = await asyncpg.create_pool(**db_manager.AsyncPoolOptions)
+    return db_manager.AsyncPool
+
+
+def _to_row(record):
+    return KeyedTuple(list(record.values()), list(record.keys()))
+
+
+async def fetch_all(query):
+    sql, args = db_manager.compile_for_asyncpg(query)
+    pool = await _pool()
+    async with pool.acquire() as connection:
+        records = await connection.fetch(sql, *args)
+    return [_to_row(record) for record in records]
+
+
+async def fetch_first(query):
+    rows = await fetch_all(query.limit(1))
+    return rows[0] if rows else None
+
+
+async def fetch_scalar(query):
+    row = await fetch_first(query)
+    return row[0] if row else None
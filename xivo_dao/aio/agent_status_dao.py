@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from xivo_dao import agent_status_dao
+
+from . import fetch_all, fetch_first
+
+
+async def get_status(agent_id, tenant_uuids=None):
+    query = agent_status_dao._login_status_by_id_query(agent_id, tenant_uuids)
+    return await _get_status(await fetch_first(query))
+
+
+async def get_status_by_number(agent_number, tenant_uuids=None):
+    query = agent_status_dao._login_status_by_number_query(agent_number, tenant_uuids)
+    return await _get_status(await fetch_first(query))
+
+
+async def get_status_by_user(user_uuid, tenant_uuids=None):
+    query = agent_status_dao._login_status_by_user_query(user_uuid, tenant_uuids)
+    return await _get_status(await fetch_first(query))
+
+
+async def _get_status(login_status):
+    if not login_status:
+        return None
+
+    rows = await fetch_all(agent_status_dao._queues_for_agent_query(login_status.agent_id))
+    queues = [agent_status_dao._Queue(q.queue_id, q.queue_name, q.penalty) for q in rows]
+    return agent_status_dao._to_agent_status(login_status, queues)
+
+
+async def get_statuses(tenant_uuids=None):
+    return await fetch_all(agent_status_dao._statuses_query(tenant_uuids))
+
+
+async def get_logged_agent_ids(tenant_uuids=None):
+    rows = await fetch_all(agent_status_dao._logged_agent_ids_query(tenant_uuids))
+    return [row.agent_id for row in rows]
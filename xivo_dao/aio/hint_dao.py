@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from xivo.xivo_helpers import clean_extension
+
+from xivo_dao.resources.func_key import hint_dao
+
+from . import fetch_all, fetch_scalar
+
+
+async def progfunckey_extension():
+    return clean_extension(await fetch_scalar(hint_dao._extenfeatures_query('phoneprogfunckey')))
+
+
+async def calluser_extension():
+    return clean_extension(await fetch_scalar(hint_dao._extenfeatures_query('calluser')))
+
+
+async def user_hints(context):
+    user_extensions = await fetch_all(hint_dao._user_extensions_query(context))
+    if not user_extensions:
+        return tuple()
+
+    user_ids = set(item.user_id for item in user_extensions)
+    rows = await fetch_all(hint_dao._user_arguments_query(user_ids))
+    user_arguments = {row.user_id: row.argument for row in rows}
+    return hint_dao._user_hints(user_extensions, user_arguments)
+
+
+async def conference_hints(context):
+    return hint_dao._conference_hints(await fetch_all(hint_dao._conference_hints_query(context)))
+
+
+async def service_hints(context):
+    return hint_dao._service_hints(await fetch_all(hint_dao._service_hints_query(context)))
+
+
+async def forward_hints(context):
+    return hint_dao._user_argument_hints(await fetch_all(hint_dao._forward_hints_query(context)))
+
+
+async def agent_hints(context):
+    return hint_dao._user_argument_hints(await fetch_all(hint_dao._agent_hints_query(context)))
+
+
+async def custom_hints(context):
+    return hint_dao._custom_hints(await fetch_all(hint_dao._custom_hints_query(context)))
+
+
+async def bsfilter_hints(context):
+    bsfilter_extension = await fetch_scalar(hint_dao._extenfeatures_query('bsfilter'))
+    rows = await fetch_all(hint_dao._bsfilter_hints_query(context))
+    return hint_dao._bsfilter_hints(bsfilter_extension, rows)
+
+
+async def groupmember_hints(context):
+    return hint_dao._user_argument_hints(await fetch_all(hint_dao._groupmember_hints_query(context)))
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from xivo_dao import line_dao
+
+from . import fetch_all
+
+
+async def get_interface_from_exten_and_context(extension, context):
+    query = line_dao._interface_from_exten_and_context_query(extension, context)
+    rows = await fetch_all(query)
+    return line_dao._interface_from_exten_and_context_rows(rows, extension, context)
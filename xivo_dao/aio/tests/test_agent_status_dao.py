@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from hamcrest import assert_that, contains, contains_inanyorder, has_properties, none
+
+from xivo_dao.alchemy.agent_login_status import AgentLoginStatus
+from xivo_dao.alchemy.agent_membership_status import AgentMembershipStatus
+
+from .. import agent_status_dao
+from .test_dao import AsyncDAOTestCase
+
+
+class TestAgentStatusDao(AsyncDAOTestCase):
+
+    def add_login_status(self, agent_id, **kwargs):
+        kwargs.setdefault('agent_number', str(agent_id))
+        kwargs.setdefault('extension', '1{}'.format(agent_id))
+        kwargs.setdefault('context', 'default')
+        kwargs.setdefault('interface', 'Local/{}@default'.format(agent_id))
+        kwargs.setdefault('state_interface', 'SIP/{}'.format(agent_id))
+        return self.insert(AgentLoginStatus.__table__, agent_id=agent_id, **kwargs)
+
+    def test_get_status(self):
+        self.add_login_status(42, agent_number='1042', paused_reason='lunch')
+        self.insert(AgentMembershipStatus.__table__, agent_id=42, queue_id=1, queue_name='sales', penalty=3)
+
+        status = self.run_async(agent_status_dao.get_status(42))
+
+        assert_that(status, has_properties(
+            agent_id=42,
+            agent_number='1042',
+            paused=False,
+            paused_reason='lunch',
+            queues=contains(has_properties(id=1, name='sales', penalty=3)),
+        ))
+
+    def test_get_status_not_logged(self):
+        status = self.run_async(agent_status_dao.get_status(42))
+
+        assert_that(status, none())
+
+    def test_get_logged_agent_ids(self):
+        self.add_login_status(42)
+        self.add_login_status(43)
+
+        agent_ids = self.run_async(agent_status_dao.get_logged_agent_ids())
+
+        assert_that(agent_ids, contains_inanyorder(42, 43))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import asyncio
+import unittest
+
+from sqlalchemy.engine.url import make_url
+
+from xivo_dao.helpers import db_manager
+from xivo_dao.tests import test_dao
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+_connect_error = None
+
+
+class _ConnectionPool(object):
+    '''Pool handing out the connection of the running test'''
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def acquire(self):
+        return _Acquire(self._connection)
+
+
+class _Acquire(object):
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    async def __aenter__(self):
+        return self._connection
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+def _dsn():
+    url = make_url(test_dao.TEST_DB_URL)
+    url.drivername = 'postgresql'
+    return str(url)
+
+
+class AsyncDAOTestCase(unittest.TestCase):
+    '''
+    Runs the asyncio DAOs on an asyncpg connection
+
+    The rows inserted by a test are rolled back with the transaction of the
+    connection. The tests are skipped when asyncpg is not installed or the
+    test database is not reachable.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        global _connect_error
+        if asyncpg is None:
+            raise unittest.SkipTest('asyncpg is not installed')
+        if _connect_error:
+            raise unittest.SkipTest(_connect_error)
+
+        cls.loop = asyncio.new_event_loop()
+        try:
+            connection = cls.loop.run_until_complete(asyncpg.connect(_dsn()))
+        except (OSError, asyncpg.PostgresError) as e:
+            _connect_error = 'test database not reachable: {}'.format(e)
+            cls.loop.close()
+            raise unittest.SkipTest(_connect_error)
+        cls.loop.run_until_complete(connection.close())
+
+        test_dao.DAOTestCase.setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.close()
+
+    def setUp(self):
+        self.connection = self.run_async(asyncpg.connect(_dsn()))
+        self.transaction = self.connection.transaction()
+        self.run_async(self.transaction.start())
+        db_manager.AsyncPool = _ConnectionPool(self.connection)
+
+    def tearDown(self):
+        db_manager.AsyncPool = None
+        self.run_async(self.transaction.rollback())
+        self.run_async(self.connection.close())
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def insert(self, table, **values):
+        statement = table.insert().values(**values).returning(*table.c)
+        sql, args = db_manager.compile_for_asyncpg(statement)
+        return self.run_async(self.connection.fetchrow(sql, *args))
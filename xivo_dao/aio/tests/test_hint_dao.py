@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from hamcrest import assert_that, empty, equal_to
+
+from xivo_dao.alchemy.extension import Extension
+
+from .. import hint_dao
+from .test_dao import AsyncDAOTestCase
+
+
+class TestHintDao(AsyncDAOTestCase):
+
+    def test_progfunckey_extension(self):
+        self.insert(Extension.__table__, exten='_*735.', context='xivo-features',
+                    type='extenfeatures', typeval='phoneprogfunckey')
+
+        extension = self.run_async(hint_dao.progfunckey_extension())
+
+        assert_that(extension, equal_to('*735'))
+
+    def test_user_hints_without_users(self):
+        hints = self.run_async(hint_dao.user_hints('default'))
+
+        assert_that(hints, empty())
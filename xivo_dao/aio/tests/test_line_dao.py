@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from hamcrest import assert_that, calling, equal_to, raises
+
+from xivo_dao.alchemy.extension import Extension
+from xivo_dao.alchemy.line_extension import LineExtension
+from xivo_dao.alchemy.linefeatures import LineFeatures
+from xivo_dao.alchemy.tenant import Tenant
+from xivo_dao.alchemy.usercustom import UserCustom
+
+from .. import line_dao
+from .test_dao import AsyncDAOTestCase
+
+
+class TestGetInterfaceFromExtenAndContext(AsyncDAOTestCase):
+
+    def test_custom_line(self):
+        tenant = self.insert(Tenant.__table__)
+        custom = self.insert(UserCustom.__table__, tenant_uuid=tenant['uuid'],
+                             interface='dahdi/i1/12345', category='user')
+        line = self.insert(LineFeatures.__table__, name='dahdi/i1/12345', context='default',
+                           provisioningid=123456, endpoint_custom_id=custom['id'])
+        extension = self.insert(Extension.__table__, exten='1234', context='default', type='user')
+        self.insert(LineExtension.__table__, line_id=line['id'], extension_id=extension['id'],
+                    main_extension=True)
+
+        interface = self.run_async(line_dao.get_interface_from_exten_and_context('1234', 'default'))
+
+        assert_that(interface, equal_to('dahdi/i1/12345'))
+
+    def test_no_line(self):
+        assert_that(
+            calling(self.run_async).with_args(line_dao.get_interface_from_exten_and_context('1234', 'default')),
+            raises(LookupError),
+        )
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from hamcrest import assert_that, calling, raises
+
+from xivo_dao.tests.test_dao import UNKNOWN_ID
+
+from .. import user_line_dao
+from .test_dao import AsyncDAOTestCase
+
+
+class TestGetLineIdentityByUserId(AsyncDAOTestCase):
+
+    def test_no_line(self):
+        assert_that(
+            calling(self.run_async).with_args(user_line_dao.get_line_identity_by_user_id(UNKNOWN_ID)),
+            raises(LookupError),
+        )
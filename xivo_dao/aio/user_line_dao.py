@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from xivo_dao import user_line_dao
+
+from . import fetch_first
+
+
+async def get_line_identity_by_user_id(user_id):
+    row = await fetch_first(user_line_dao._line_identity_by_user_id_query(int(user_id)))
+    return user_line_dao._line_identity(row, user_id)
@@ -1,17 +1,18 @@
 # -*- coding: utf-8 -*-
-# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2020-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import logging
 
-from sqlalchemy import and_, text, select
-from sqlalchemy.orm import relationship
+from sqlalchemy import and_, event, text, select
+from sqlalchemy.orm import Session, relationship
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.ext.orderinglist import ordering_list
-from sqlalchemy.schema import Column, UniqueConstraint, ForeignKey
+from sqlalchemy.schema import Column, Index, UniqueConstraint, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.types import (
+    BigInteger,
     Boolean,
     Integer,
     String,
@@ -34,6 +35,9 @@ from .endpoint_sip_section_option import EndpointSIPSectionOption
 
 logger = logging.getLogger(__name__)
 
+# session.info key of the uuids of the templates changed by the last flushes
+CHANGED_TEMPLATES_KEY = 'changed_endpoint_sip_templates'
+
 
 class EndpointSIPTemplate(Base):
 
@@ -57,7 +61,10 @@ class EndpointSIPTemplate(Base):
 class EndpointSIP(Base):
 
     __tablename__ = 'endpoint_sip'
-    __table_args__ = (UniqueConstraint('name'),)
+    __table_args__ = (
+        UniqueConstraint('name'),
+        Index('endpoint_sip__idx__change_txid', 'change_txid'),
+    )
 
     uuid = Column(UUID(as_uuid=True), server_default=text('uuid_generate_v4()'), primary_key=True)
     label = Column(Text)
@@ -66,6 +73,8 @@ class EndpointSIP(Base):
     tenant_uuid = Column(String(36), ForeignKey('tenant.uuid', ondelete='CASCADE'), nullable=False)
     transport_uuid = Column(UUID(as_uuid=True), ForeignKey('pjsip_transport.uuid'))
     template = Column(Boolean, server_default=text('false'))
+    # id of the last transaction that changed this endpoint, see _bump_change_txid
+    change_txid = Column(BigInteger, server_default=text('txid_current()'), nullable=False)
 
     transport = relationship('PJSIPTransport')
     template_relations = relationship(
@@ -410,3 +419,52 @@ class EndpointSIP(Base):
         matching_options = section.find(key)
         for _, value in matching_options:
             return value
+
+
+_BUMP_CHANGE_TXID_QUERY = text('''
+UPDATE endpoint_sip SET change_txid = txid_current()
+WHERE uuid = ANY(CAST(:endpoint_uuids AS uuid[]))
+OR uuid IN (
+  SELECT endpoint_sip_uuid FROM endpoint_sip_section
+  WHERE uuid = ANY(CAST(:section_uuids AS uuid[]))
+)
+RETURNING uuid, template
+''')
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_change_txid(session, flush_context):
+    """Mark the endpoints touched by a flush as changed by the current transaction
+
+    The endpoint rows, their sections, options and templates, and the lines and
+    trunks using them are considered. Bulk query updates bypass the session and
+    are not tracked. The uuids of the changed templates are added to
+    session.info[CHANGED_TEMPLATES_KEY].
+    """
+    changed_templates = session.info.setdefault(CHANGED_TEMPLATES_KEY, set())
+    endpoint_uuids = set()
+    section_uuids = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, EndpointSIP):
+            if obj not in session.deleted:
+                endpoint_uuids.add(obj.uuid)
+            elif obj.template:
+                changed_templates.add(str(obj.uuid))
+        elif isinstance(obj, EndpointSIPTemplate):
+            endpoint_uuids.add(obj.child_uuid)
+        elif isinstance(obj, EndpointSIPSectionOption):
+            section_uuids.add(obj.endpoint_sip_section_uuid)
+        elif getattr(obj, 'endpoint_sip_uuid', None):
+            endpoint_uuids.add(obj.endpoint_sip_uuid)
+
+    endpoint_uuids.discard(None)
+    section_uuids.discard(None)
+    if not endpoint_uuids and not section_uuids:
+        return
+
+    rows = session.connection().execute(
+        _BUMP_CHANGE_TXID_QUERY,
+        endpoint_uuids=[str(uuid) for uuid in endpoint_uuids],
+        section_uuids=[str(uuid) for uuid in section_uuids],
+    )
+    changed_templates.update(str(row.uuid) for row in rows if row.template)
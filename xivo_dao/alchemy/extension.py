@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from sqlalchemy.ext.associationproxy import association_proxy
@@ -10,7 +10,7 @@ from sqlalchemy.types import Integer, String, Boolean
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.sql import case, cast, not_, select, func
 
-from xivo_dao.helpers.db_manager import Base, IntAsString
+from xivo_dao.helpers.db_manager import Base, IntAsString, trigram_index
 from xivo_dao.alchemy import enum
 from xivo_dao.alchemy.context import Context
 
@@ -25,6 +25,8 @@ class Extension(Base):
         Index('extensions__idx__exten', 'exten'),
         Index('extensions__idx__type', 'type'),
         Index('extensions__idx__typeval', 'typeval'),
+        trigram_index('extensions__idx__trgm_context', 'context'),
+        trigram_index('extensions__idx__trgm_exten', 'exten'),
     )
 
     id = Column(Integer)
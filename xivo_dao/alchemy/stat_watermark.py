@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from sqlalchemy.schema import Column, PrimaryKeyConstraint
+from sqlalchemy.types import BigInteger, Integer, String
+
+from xivo_dao.helpers.db_manager import Base
+
+
+class StatWatermark(Base):
+    # not created by xivo-manage-db yet, see the README
+
+    __tablename__ = 'stat_watermark'
+    __table_args__ = (
+        PrimaryKeyConstraint('name'),
+    )
+
+    name = Column(String(64))
+    queue_log_id = Column(Integer, nullable=False, server_default='0')
+    # last queue_log id seen by the previous run and the first transaction id not assigned then
+    pending_queue_log_id = Column(Integer)
+    pending_txid = Column(BigInteger)
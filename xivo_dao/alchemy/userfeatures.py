@@ -32,7 +32,7 @@ from sqlalchemy.types import (
     Text,
 )
 
-from xivo_dao.helpers.db_manager import Base
+from xivo_dao.helpers.db_manager import Base, trigram_index
 from xivo_dao.helpers.uuid import new_uuid
 
 from . import enum
@@ -85,6 +85,9 @@ class UserFeatures(Base):
         Index('userfeatures__idx__musiconhold', 'musiconhold'),
         Index('userfeatures__idx__uuid', 'uuid'),
         Index('userfeatures__idx__voicemailid', 'voicemailid'),
+        trigram_index('userfeatures__idx__trgm_callerid', 'callerid'),
+        trigram_index('userfeatures__idx__trgm_email', 'email'),
+        trigram_index('userfeatures__idx__trgm_loginclient', 'loginclient'),
     )
 
     id = Column(Integer, nullable=False)
@@ -10,17 +10,24 @@ from collections import (
 )
 from distutils import util
 
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.orm import joinedload
 from sqlalchemy.sql.expression import (
     and_,
+    case,
     cast,
+    distinct,
     func,
     literal,
+    literal_column,
     or_,
+    select,
+    text,
 )
-from sqlalchemy.types import Integer
+from sqlalchemy.types import Integer, Text
 
 from xivo_dao.helpers.db_manager import daosession
+from xivo_dao.helpers.sip_template_cache import template_cache
 from xivo_dao.alchemy.useriax import UserIAX
 from xivo_dao.alchemy.linefeatures import LineFeatures
 from xivo_dao.alchemy.user_line import UserLine
@@ -83,8 +90,8 @@ def find_sccp_general_settings(session):
 
 
 @daosession
-def find_sccp_line_settings(session):
-    sccp_pickup_members = find_pickup_members('sccp')
+def find_sccp_line_settings(session, reload_context=None):
+    sccp_pickup_members = _get_pickup_members('sccp', reload_context)
 
     def line_config(*args):
         (
@@ -157,6 +164,104 @@ def find_sccp_line_settings(session):
         yield line_config(*row)
 
 
+_EMPTY_JSON_ARRAY = literal_column("'[]'::json")
+_EMPTY_JSONB_OBJECT = literal_column("'{}'::jsonb")
+
+
+def _json_array(session, selectable, column=None, order_by=None):
+    '''
+    Returns the rows of `selectable` as a JSON array built by PostgreSQL,
+    encoded in UTF-8. Each element is the whole row, or `column` if given.
+    '''
+    rows = selectable.alias('settings')
+    element = rows.c[column] if column else literal_column(rows.name)
+    if order_by:
+        element = aggregate_order_by(element, rows.c[order_by])
+    document = func.coalesce(func.json_agg(element), _EMPTY_JSON_ARRAY)
+    return session.execute(select([cast(document, Text)]).select_from(rows)).scalar().encode('utf-8')
+
+
+def _pickup_groups_by_endpoint(session, protocol):
+    pickups = _pickup_members_query(session, protocol).subquery()
+    category, pickup_id, endpoint_sip_uuid, endpoint_sccp_id, endpoint_custom_id = pickups.c
+    endpoint_id = {
+        'sip': endpoint_sip_uuid,
+        'sccp': endpoint_sccp_id,
+        'custom': endpoint_custom_id,
+    }[protocol]
+
+    members = select([
+        endpoint_id.label('endpoint_id'),
+        case([(category == 'member', 'pickupgroup')], else_='callgroup').label('name'),
+        pickup_id.label('id'),
+    ]).alias('pickup_member')
+    groups = select([
+        members.c.endpoint_id,
+        members.c.name,
+        func.json_agg(distinct(members.c.id)).label('ids'),
+    ]).group_by(members.c.endpoint_id, members.c.name).alias('pickup_group')
+    return select([
+        groups.c.endpoint_id,
+        func.jsonb_object_agg(groups.c.name, groups.c.ids).label('groups'),
+    ]).group_by(groups.c.endpoint_id).alias('pickup_groups')
+
+
+@daosession
+def find_sccp_line_settings_json(session):
+    '''
+    Returns the documents of find_sccp_line_settings as a JSON array rendered by
+    the database, the pickup groups being arrays instead of sets.
+    '''
+    pickup_groups = _pickup_groups_by_endpoint(session, 'sccp')
+
+    def optional(key, column):
+        return case(
+            [(column != '', func.jsonb_build_object(key, column))],
+            else_=_EMPTY_JSONB_OBJECT,
+        )
+
+    line = func.jsonb_build_object(
+        'id', SCCPLine.id,
+        'name', SCCPLine.name,
+        'cid_name', SCCPLine.cid_name,
+        'cid_num', SCCPLine.cid_num,
+        'user_id', UserLine.user_id,
+        'number', Extension.exten,
+        'context', LineFeatures.context,
+        'language', UserFeatures.language,
+        'uuid', UserFeatures.uuid,
+        'tenant_uuid', SCCPLine.tenant_uuid,
+        'enable_online_recording', UserFeatures.enableonlinerec,
+    ).op('||')(
+        optional('allow', SCCPLine.allow)
+    ).op('||')(
+        optional('disallow', SCCPLine.disallow)
+    ).op('||')(
+        func.coalesce(pickup_groups.c.groups, _EMPTY_JSONB_OBJECT)
+    )
+
+    query = session.query(
+        line.label('line'),
+    ).select_from(
+        SCCPLine,
+    ).join(LineFeatures, and_(
+        LineFeatures.endpoint_sccp_id == SCCPLine.id,
+    )).join(
+        UserLine, UserLine.line_id == LineFeatures.id,
+    ).join(UserFeatures, and_(
+        UserFeatures.id == UserLine.user_id, UserLine.main_user.is_(True),
+    )).join(LineExtension, and_(
+        LineFeatures.id == LineExtension.line_id,
+        LineExtension.main_extension.is_(True),
+    )).join(
+        Extension, LineExtension.extension_id == Extension.id,
+    ).outerjoin(
+        pickup_groups, pickup_groups.c.endpoint_id == SCCPLine.id,
+    ).filter(LineFeatures.commented == 0)
+
+    return _json_array(session, query.statement, column='line')
+
+
 @daosession
 def find_sccp_device_settings(session):
     query = session.query(
@@ -398,8 +503,24 @@ def find_sip_general_settings(session):
 
 
 @daosession
-def find_sip_user_settings(session):
-    pickup_members = find_pickup_members('sip')
+def find_sip_user_settings(session, reload_context=None):
+    return _find_sip_user_settings(session, reload_context=reload_context)
+
+
+@daosession
+def find_sip_user_settings_since(session, since, known_uuids=(), reload_context=None):
+    '''
+    Returns the configurations of the lines' endpoints changed since the
+    `since` marker of a previous call, see _find_sip_settings_since.
+    '''
+    def find_settings(session, endpoint_uuids=None):
+        return _find_sip_user_settings(session, endpoint_uuids, reload_context)
+
+    return _find_sip_settings_since(session, LineFeatures, find_settings, since, known_uuids)
+
+
+def _find_sip_user_settings(session, endpoint_uuids=None, reload_context=None):
+    pickup_members = _get_pickup_members('sip', reload_context)
     query = session.query(
         LineFeatures,
     ).options(
@@ -427,6 +548,8 @@ def find_sip_user_settings(session):
     ).filter(
         LineFeatures.endpoint_sip_uuid.isnot(None),
     )
+    if endpoint_uuids is not None:
+        query = query.filter(LineFeatures.endpoint_sip_uuid.in_(endpoint_uuids))
 
     lines = query.all()
     application_mapping = {}
@@ -449,10 +572,13 @@ def find_sip_user_settings(session):
                 voicemail_mapping[line.endpoint_sip_uuid].append(user.voicemail)
 
     def get_flat_config(endpoint):
-        if endpoint.uuid in flat_configs:
-            return flat_configs[endpoint.uuid]
+        if endpoint.template:
+            return template_cache.get('user', endpoint.uuid, lambda: build_flat_config(endpoint))
+        return build_flat_config(endpoint)[0]
 
-        parents = [get_flat_config(parent) for parent in endpoint.templates]
+    def build_flat_config(endpoint):
+        templates = endpoint.templates
+        parents = [get_flat_config(parent) for parent in templates]
         base_config = endpoint_to_dict(endpoint)
         context_name = context_mapping.get(endpoint.uuid)
         application_uuid = application_mapping.get(endpoint.uuid)
@@ -556,9 +682,7 @@ def find_sip_user_settings(session):
             'template': base_config['template'],
             'asterisk_id': base_config['asterisk_id'],
         })
-        if builder['template']:
-            flat_configs[builder['uuid']] = builder
-        return builder
+        return builder, [parent.uuid for parent in templates]
 
     # A flat_config is an endpoint config with all inherited fields merged into a single object
     flat_configs = {}
@@ -575,6 +699,19 @@ def find_sip_user_settings(session):
 
 @daosession
 def find_sip_trunk_settings(session):
+    return _find_sip_trunk_settings(session)
+
+
+@daosession
+def find_sip_trunk_settings_since(session, since, known_uuids=()):
+    '''
+    Returns the configurations of the trunks' endpoints changed since the
+    `since` marker of a previous call, see _find_sip_settings_since.
+    '''
+    return _find_sip_settings_since(session, TrunkFeatures, _find_sip_trunk_settings, since, known_uuids)
+
+
+def _find_sip_trunk_settings(session, endpoint_uuids=None):
     query = session.query(
         TrunkFeatures,
     ).options(
@@ -598,6 +735,8 @@ def find_sip_trunk_settings(session):
     ).filter(
         TrunkFeatures.endpoint_sip_uuid.isnot(None),
     )
+    if endpoint_uuids is not None:
+        query = query.filter(TrunkFeatures.endpoint_sip_uuid.in_(endpoint_uuids))
 
     trunks = query.all()
     context_mapping = {}
@@ -607,10 +746,13 @@ def find_sip_trunk_settings(session):
         context_mapping[trunk.endpoint_sip_uuid] = trunk.context
 
     def get_flat_config(endpoint):
-        if endpoint.uuid in flat_configs:
-            return flat_configs[endpoint.uuid]
+        if endpoint.template:
+            return template_cache.get('trunk', endpoint.uuid, lambda: build_flat_config(endpoint))
+        return build_flat_config(endpoint)[0]
 
-        parents = [get_flat_config(parent) for parent in endpoint.templates]
+    def build_flat_config(endpoint):
+        templates = endpoint.templates
+        parents = [get_flat_config(parent) for parent in templates]
         base_config = endpoint_to_dict(endpoint)
         context_name = context_mapping.get(endpoint.uuid)
         transport_name = None
@@ -675,9 +817,7 @@ def find_sip_trunk_settings(session):
             'template': base_config['template'],
             'asterisk_id': base_config['asterisk_id'],
         })
-        if builder['template']:
-            flat_configs[builder['uuid']] = builder
-        return builder
+        return builder, [parent.uuid for parent in templates]
 
     # A flat_config is an endpoint config with all inherited fields merged into a single object
     flat_configs = {}
@@ -692,6 +832,66 @@ def find_sip_trunk_settings(session):
     ]
 
 
+_CHANGE_MARKER_QUERY = text('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+
+_CHANGED_ENDPOINT_UUIDS_QUERY = text('''
+WITH RECURSIVE changed(uuid) AS (
+  SELECT uuid FROM endpoint_sip WHERE change_txid >= :since
+  UNION
+  SELECT endpoint_sip_template.child_uuid
+  FROM endpoint_sip_template
+  JOIN changed ON endpoint_sip_template.parent_uuid = changed.uuid
+)
+SELECT uuid FROM changed
+''')
+
+
+def _find_sip_settings_since(session, owner, find_settings, since, known_uuids):
+    '''
+    Returns a dict:
+    {
+        'configs': [<flat config>, ...],
+        'deleted': [<endpoint uuid>, ...],
+        'marker': <marker to pass as `since` to the next call>,
+    }
+
+    configs are the endpoints changed by a transaction at or after the `since`
+    marker, along with the endpoints inheriting from a changed template. A `since` of None returns every endpoint.
+
+    deleted are the uuids of `known_uuids` that are no longer used by an
+    `owner` (LineFeatures or TrunkFeatures).
+
+    The marker is the oldest transaction still running when the call starts, so
+    a change committed concurrently is returned again rather than missed.
+    Only the endpoint, section, option, template, line and trunk rows are
+    tracked: changes to a line's users, voicemails, extensions or pickup
+    groups still need a full reload.
+    '''
+    marker = session.execute(_CHANGE_MARKER_QUERY).scalar()
+
+    if since is None:
+        configs = find_settings(session)
+    else:
+        changed = [row.uuid for row in session.execute(_CHANGED_ENDPOINT_UUIDS_QUERY, {'since': since})]
+        configs = find_settings(session, changed) if changed else []
+
+    deleted = []
+    if known_uuids:
+        known_uuids = set(str(uuid) for uuid in known_uuids)
+        used_uuids = set(
+            str(uuid) for uuid, in session.query(owner.endpoint_sip_uuid).filter(
+                owner.endpoint_sip_uuid.in_(known_uuids),
+            )
+        )
+        deleted = sorted(known_uuids - used_uuids)
+
+    return {
+        'configs': configs,
+        'deleted': deleted,
+        'marker': marker,
+    }
+
+
 def canonicalize_config(config):
     sections = [
         'aor_section_options',
@@ -738,6 +938,16 @@ def endpoint_to_dict(endpoint):
     }
 
 
+_PICKUP_GROUPS = {
+    'member': 'pickupgroup',
+    'pickup': 'callgroup',
+}
+
+
+def _new_pickup_members():
+    return defaultdict(lambda: defaultdict(set))
+
+
 @daosession
 def find_pickup_members(session, protocol):
     '''
@@ -747,12 +957,7 @@ def find_pickup_members(session, protocol):
      ...,
     }
     '''
-    group_map = {
-        'member': 'pickupgroup',
-        'pickup': 'callgroup',
-    }
-
-    res = defaultdict(lambda: defaultdict(set))
+    res = _new_pickup_members()
 
     def _add_member(m):
         if protocol == 'sip':
@@ -761,10 +966,70 @@ def find_pickup_members(session, protocol):
             res_base = res[m.endpoint_sccp_id]
         elif protocol == 'custom':
             res_base = res[m.endpoint_custom_id]
-        return res_base[group_map[m.category]].add(m.id)
+        return res_base[_PICKUP_GROUPS[m.category]].add(m.id)
 
     add_member = _add_member
 
+    for member in _pickup_members_query(session, protocol).all():
+        add_member(member)
+
+    return res
+
+
+@daosession
+def find_all_pickup_members(session):
+    '''
+    Returns the maps of find_pickup_members for every protocol from a single query:
+    {'sip': {endpoint_sip_uuid: {...}, ...},
+     'sccp': {endpoint_sccp_id: {...}, ...},
+     'custom': {endpoint_custom_id: {...}, ...},
+    }
+    '''
+    res = {
+        'sip': _new_pickup_members(),
+        'sccp': _new_pickup_members(),
+        'custom': _new_pickup_members(),
+    }
+
+    for m in _pickup_members_query(session).all():
+        if m.endpoint_sip_uuid is not None:
+            res_base = res['sip'][m.endpoint_sip_uuid]
+        elif m.endpoint_sccp_id is not None:
+            res_base = res['sccp'][m.endpoint_sccp_id]
+        elif m.endpoint_custom_id is not None:
+            res_base = res['custom'][m.endpoint_custom_id]
+        else:
+            continue
+        res_base[_PICKUP_GROUPS[m.category]].add(m.id)
+
+    return res
+
+
+class ReloadContext(object):
+    '''
+    Results shared by the settings generated for a single reload
+
+    Pass the same instance to the find_*_settings functions accepting a
+    `reload_context` so that the pickup members are computed once for every
+    protocol instead of once per function.
+    '''
+
+    def __init__(self):
+        self._pickup_members = None
+
+    def pickup_members(self, protocol):
+        if self._pickup_members is None:
+            self._pickup_members = find_all_pickup_members()
+        return self._pickup_members[protocol]
+
+
+def _get_pickup_members(protocol, reload_context=None):
+    if reload_context is None:
+        return find_pickup_members(protocol)
+    return reload_context.pickup_members(protocol)
+
+
+def _pickup_members_query(session, protocol=None):
     base_query = session.query(
         PickupMember.category,
         Pickup.id,
@@ -824,10 +1089,7 @@ def find_pickup_members(session, protocol):
         )
     )
 
-    for member in users.union(groups.union(queues)).all():
-        add_member(member)
-
-    return res
+    return users.union(groups.union(queues))
 
 
 @daosession
@@ -861,6 +1123,11 @@ def find_iax_calllimits_settings(session):
     return [row.todict() for row in rows]
 
 
+@daosession
+def find_iax_calllimits_settings_json(session):
+    return _json_array(session, IAXCallNumberLimits.__table__.select())
+
+
 @daosession
 def find_queue_general_settings(session):
     rows = session.query(StaticQueue).filter(and_(
@@ -878,6 +1145,11 @@ def find_queue_settings(session):
     return [row.todict() for row in rows]
 
 
+@daosession
+def find_queue_settings_json(session):
+    return _json_array(session, Queue.__table__.select().where(Queue.commented == 0), order_by='name')
+
+
 @daosession
 def find_queue_skillrule_settings(session):
     rows = session.query(QueueSkillRule).all()
@@ -892,9 +1164,11 @@ def find_queue_penalty_settings(session):
     return [row.todict() for row in rows]
 
 
-@daosession
-def find_queue_members_settings(session, queue_name):
-    user_members = session.query(
+_Member = namedtuple('Member', ['interface', 'penalty', 'name', 'state_interface'])
+
+
+def _queue_user_members_query(session):
+    return session.query(
         QueueMember.category,
         QueueMember.penalty,
         QueueMember.position,
@@ -904,38 +1178,59 @@ def find_queue_members_settings(session, queue_name):
         UserFeatures, QueueMember.userid == UserFeatures.id
     ).filter(and_(
         QueueMember.commented == 0,
-        QueueMember.queue_name == queue_name,
         QueueMember.usertype == 'user',
-    )).order_by(QueueMember.position).all()
+    ))
 
-    def is_user_in_group(row):
-        return row.category == 'group' and row.uuid is not None
 
-    res = []
-    Member = namedtuple('Member', ['interface', 'penalty', 'name', 'state_interface'])
-    for row in user_members:
-        if is_user_in_group(row):
-            member = Member(
-                interface='Local/{}@usersharedlines'.format(row.uuid),
-                penalty=str(row.penalty),
-                name='',
-                state_interface='hint:{}@usersharedlines'.format(row.uuid),
-            )
-        else:
-            # TODO clean after pjsip migration
-            if row.interface.startswith('SIP/'):
-                interface = row.interface.replace('SIP', 'PJSIP')
-            else:
-                interface = row.interface
+def _queue_member_setting(row):
+    if row.category == 'group' and row.uuid is not None:
+        return _Member(
+            interface='Local/{}@usersharedlines'.format(row.uuid),
+            penalty=str(row.penalty),
+            name='',
+            state_interface='hint:{}@usersharedlines'.format(row.uuid),
+        )
 
-            member = Member(
-                interface=interface,
-                penalty=str(row.penalty),
-                name='',
-                state_interface='',
-            )
-        res.append(member)
-    return res
+    # TODO clean after pjsip migration
+    if row.interface.startswith('SIP/'):
+        interface = row.interface.replace('SIP', 'PJSIP')
+    else:
+        interface = row.interface
+
+    return _Member(
+        interface=interface,
+        penalty=str(row.penalty),
+        name='',
+        state_interface='',
+    )
+
+
+@daosession
+def find_queue_members_settings(session, queue_name):
+    user_members = _queue_user_members_query(session).filter(
+        QueueMember.queue_name == queue_name,
+    ).order_by(QueueMember.position).all()
+
+    return [_queue_member_setting(row) for row in user_members]
+
+
+@daosession
+def find_all_queue_members_settings(session):
+    '''
+    Returns a map:
+    {queue_name: [Member(interface, penalty, name, state_interface), ...]}
+
+    with the members of every queue and group, in the same order as
+    find_queue_members_settings.
+    '''
+    user_members = _queue_user_members_query(session).add_columns(
+        QueueMember.queue_name,
+    ).order_by(QueueMember.queue_name, QueueMember.position)
+
+    res = defaultdict(list)
+    for row in user_members:
+        res[row.queue_name].append(_queue_member_setting(row))
+    return dict(res)
 
 
 @daosession
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import sys
+
+# the asyncio DAOs are python 3 only
+collect_ignore = ['aio'] if sys.version_info < (3, 5) else []
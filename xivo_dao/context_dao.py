@@ -2,10 +2,16 @@
 # Copyright (C) 2012-2015 Avencall
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+from sqlalchemy import bindparam
+
 from xivo_dao.alchemy.context import Context
-from xivo_dao.helpers.db_manager import daosession
+from xivo_dao.helpers.db_manager import bakery, daosession
 
 
 @daosession
 def get(session, context_name):
-    return session.query(Context).filter(Context.name == context_name).first()
+    return _get_baked(session).params(context_name=context_name).first()
+
+
+_get_baked = bakery(lambda session: session.query(Context))
+_get_baked += lambda query: query.filter(Context.name == bindparam('context_name'))
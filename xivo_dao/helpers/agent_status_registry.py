@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import threading
+
+from collections import namedtuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+
+from xivo_dao.alchemy.agent_login_status import AgentLoginStatus
+from xivo_dao.alchemy.agent_membership_status import AgentMembershipStatus
+from xivo_dao.alchemy.agentfeatures import AgentFeatures
+from xivo_dao.alchemy.userfeatures import UserFeatures
+
+NOTIFY_CHANNEL = 'agent_status_changed'
+# payload asking for a reload of every agent
+NOTIFY_ALL = '*'
+
+PENDING_KEY = 'pending_agent_statuses'
+_CHANGED_KEY = 'changed_agent_statuses'
+_NOTIFY_QUERY = text('SELECT pg_notify(:channel, :payload)')
+# a NOTIFY payload must be shorter than 8000 bytes
+_NOTIFY_BATCH_SIZE = 500
+
+LoginStatus = namedtuple('LoginStatus', ['agent_id', 'agent_number', 'extension', 'context',
+                                         'interface', 'state_interface', 'login_at', 'paused',
+                                         'paused_reason', 'tenant_uuid'])
+Membership = namedtuple('Membership', ['queue_id', 'queue_name', 'penalty'])
+
+
+class AgentStatusRegistry(object):
+    '''
+    Process wide copy of the agent_login_status and agent_membership_status tables
+
+    The logged agents are indexed by agent id, agent number, user uuid and
+    extension@context. The registry is loaded on its first use and the agents
+    invalidated by the writes of this process or the notifications of the
+    other ones are reloaded on the next lookup.
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._stale = set()
+        self._statuses = {}
+        self._memberships = {}
+        self._by_number = {}
+        self._by_extension = {}
+        self._user_agents = {}
+        self.hits = 0
+        self.reloads = 0
+
+    def get_by_id(self, session, agent_id):
+        with self._lock:
+            self._refresh(session)
+            return self._get(agent_id)
+
+    def get_by_number(self, session, agent_number):
+        with self._lock:
+            self._refresh(session)
+            return self._get(self._by_number.get(agent_number))
+
+    def get_by_user_uuid(self, session, user_uuid):
+        with self._lock:
+            self._refresh(session)
+            return self._get(self._user_agents.get(user_uuid))
+
+    def get_by_extension(self, session, extension, context):
+        with self._lock:
+            self._refresh(session)
+            return self._get(self._by_extension.get((extension, context)))
+
+    def logged_agents(self, session):
+        '''Returns the (login status, memberships) of every logged agent'''
+        with self._lock:
+            self._refresh(session)
+            self.hits += 1
+            return [(status, self._memberships.get(agent_id, []))
+                    for agent_id, status in self._statuses.items()]
+
+    def invalidate(self, agent_ids=None):
+        '''Reload the given agents, or every agent, on the next lookup'''
+        with self._lock:
+            if agent_ids is None:
+                self._loaded = False
+                return
+            self._stale.update(agent_ids)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'reloads': self.reloads,
+                'size': len(self._statuses),
+            }
+
+    def _get(self, agent_id):
+        self.hits += 1
+        status = self._statuses.get(agent_id)
+        if status is None:
+            return None
+        return status, self._memberships.get(agent_id, [])
+
+    def _refresh(self, session):
+        if not self._loaded:
+            self._statuses.clear()
+            self._memberships.clear()
+            self._by_number.clear()
+            self._by_extension.clear()
+            self._user_agents.clear()
+            self._stale.clear()
+            self._load(session, None)
+            self._loaded = True
+        elif self._stale:
+            agent_ids = self._stale
+            self._stale = set()
+            for agent_id in agent_ids:
+                self._remove(agent_id)
+            self._load(session, agent_ids)
+
+    def _remove(self, agent_id):
+        status = self._statuses.pop(agent_id, None)
+        self._memberships.pop(agent_id, None)
+        if status:
+            self._by_number.pop(status.agent_number, None)
+            self._by_extension.pop((status.extension, status.context), None)
+        for user_uuid in [uuid for uuid, id_ in self._user_agents.items() if id_ == agent_id]:
+            del self._user_agents[user_uuid]
+
+    def _load(self, session, agent_ids):
+        self.reloads += 1
+
+        statuses = (session
+                    .query(AgentLoginStatus, AgentFeatures.tenant_uuid)
+                    .outerjoin(AgentFeatures, AgentFeatures.id == AgentLoginStatus.agent_id))
+        memberships = session.query(AgentMembershipStatus)
+        users = (session
+                 .query(UserFeatures.uuid, UserFeatures.agentid)
+                 .filter(UserFeatures.agentid.isnot(None)))
+        if agent_ids is not None:
+            statuses = statuses.filter(AgentLoginStatus.agent_id.in_(agent_ids))
+            memberships = memberships.filter(AgentMembershipStatus.agent_id.in_(agent_ids))
+            users = users.filter(UserFeatures.agentid.in_(agent_ids))
+
+        for row, tenant_uuid in statuses:
+            status = LoginStatus(row.agent_id, row.agent_number, row.extension, row.context,
+                                 row.interface, row.state_interface, row.login_at, row.paused,
+                                 row.paused_reason, tenant_uuid)
+            self._statuses[status.agent_id] = status
+            self._by_number[status.agent_number] = status.agent_id
+            self._by_extension[(status.extension, status.context)] = status.agent_id
+
+        for row in memberships:
+            membership = Membership(row.queue_id, row.queue_name, row.penalty)
+            self._memberships.setdefault(row.agent_id, []).append(membership)
+
+        for user_uuid, agent_id in users:
+            self._user_agents[user_uuid] = agent_id
+
+
+registry = AgentStatusRegistry()
+# notify the changes even though this process does not use the registry
+_notifications = False
+
+
+def enable():
+    registry.enabled = True
+    registry.invalidate()
+
+
+def disable():
+    registry.enabled = False
+    registry.invalidate()
+
+
+def enable_notifications():
+    '''Notify the agent status changes of this process to the registries of the other ones'''
+    global _notifications
+    _notifications = True
+
+
+def disable_notifications():
+    global _notifications
+    _notifications = False
+
+
+def _is_active():
+    return registry.enabled or _notifications
+
+
+def is_pending(session):
+    '''True when the session changed agent statuses that are not committed yet'''
+    return bool(session.info.get(PENDING_KEY))
+
+
+def mark_changed(session, agent_ids=None):
+    '''Invalidate the agents changed by `session` in every process once it ends
+
+    `agent_ids` None means every agent. Does nothing unless the registry or
+    the notifications are enabled.
+    '''
+    if not _is_active():
+        return
+
+    payloads = [NOTIFY_ALL] if agent_ids is None else [str(agent_id) for agent_id in agent_ids]
+    if not payloads:
+        return
+
+    session.info.setdefault(PENDING_KEY, set()).update(
+        [NOTIFY_ALL] if agent_ids is None else agent_ids
+    )
+    payloads = sorted(payloads)
+    for i in range(0, len(payloads), _NOTIFY_BATCH_SIZE):
+        payload = ','.join(payloads[i:i + _NOTIFY_BATCH_SIZE])
+        session.connection().execute(_NOTIFY_QUERY, channel=NOTIFY_CHANNEL, payload=payload)
+
+
+def clear_pending(session):
+    '''Invalidate the agents changed by `session` and forget them, as its commit does'''
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        _invalidate(pending)
+
+
+def _invalidate(values):
+    values = set(values)
+    if NOTIFY_ALL in values:
+        registry.invalidate()
+    else:
+        registry.invalidate(values)
+
+
+def listen(dbapi_connection):
+    '''Subscribe a DBAPI connection to the agent status changes of the other processes'''
+    cursor = dbapi_connection.cursor()
+    cursor.execute('LISTEN {}'.format(NOTIFY_CHANNEL))
+    cursor.close()
+
+
+def handle_notifications(dbapi_connection):
+    '''
+    Invalidate the agents notified on a connection given to listen
+
+    Meant to be called when the connection is readable, e.g. from a select loop.
+    '''
+    dbapi_connection.poll()
+    while dbapi_connection.notifies:
+        notify = dbapi_connection.notifies.pop(0)
+        _invalidate(
+            value if value == NOTIFY_ALL else int(value)
+            for value in notify.payload.split(',') if value
+        )
+
+
+def _user_agent_ids(user, deleted):
+    if deleted:
+        return [user.agentid]
+    history = inspect(user).attrs.agentid.history
+    return list(history.added) + list(history.deleted)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_agents(session, flush_context):
+    if not _is_active():
+        return
+
+    # the user and tenant of an agent are part of its status
+    changed = set()
+    for deleted, objs in ((False, session.new), (False, session.dirty), (True, session.deleted)):
+        for obj in objs:
+            if isinstance(obj, UserFeatures):
+                changed.update(_user_agent_ids(obj, deleted))
+            elif isinstance(obj, AgentFeatures):
+                changed.add(obj.id)
+    changed.discard(None)
+    if changed:
+        session.info.setdefault(_CHANGED_KEY, set()).update(changed)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _notify_changed_agents(session, flush_context):
+    changed = session.info.pop(_CHANGED_KEY, None)
+    if changed:
+        mark_changed(session, changed)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _invalidate_pending_agents(session):
+    clear_pending(session)
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
-# Copyright 2015-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2015-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import six
+
 from contextlib import contextmanager
+from sqlalchemy.sql import text
 from xivo_dao.helpers import db_manager
 from xivo_dao.helpers.db_manager import daosession
 
@@ -17,6 +20,15 @@ def flush_session(session):
         raise
 
 
+BULK_INSERT_SIZE = 1000
+
+
+def bulk_insert(session, table, rows, batch_size=BULK_INSERT_SIZE):
+    """Insert `rows` (dicts with the same keys) with multi-row INSERT statements"""
+    for i in six.moves.range(0, len(rows), batch_size):
+        session.execute(table.insert().values(rows[i:i + batch_size]))
+
+
 @daosession
 def get_dao_session(session):
     return session
@@ -25,6 +37,8 @@ def get_dao_session(session):
 @contextmanager
 def session_scope(read_only=False):
     session = db_manager.Session()
+    if read_only:
+        session.info[db_manager.READ_ONLY] = True
     try:
         yield session
         if not read_only:
@@ -34,3 +48,38 @@ def session_scope(read_only=False):
         raise
     finally:
         db_manager.Session.remove()
+
+
+@contextmanager
+def snapshot_scope(snapshot_id=None):
+    '''
+    Runs the DAO calls of the current thread in a read only REPEATABLE READ
+    transaction, so that every query of a config build sees the same data.
+
+    Yields the id of the snapshot. Other threads or processes can enter
+    snapshot_scope(snapshot_id) on their own connection to see the same data,
+    as long as the scope that exported it is still open.
+
+    The session already bound to the thread is set aside and restored on exit.
+    '''
+    registry = db_manager.Session.registry
+    previous = registry() if registry.has() else None
+
+    session = db_manager.Session.session_factory()
+    try:
+        connection = session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+        connection.execute(text('SET TRANSACTION READ ONLY'))
+        if snapshot_id:
+            connection.execute(text('SET TRANSACTION SNAPSHOT :snapshot_id'), snapshot_id=snapshot_id)
+        else:
+            snapshot_id = connection.execute(text('SELECT pg_export_snapshot()')).scalar()
+
+        registry.set(session)
+        yield snapshot_id
+    finally:
+        session.rollback()
+        session.close()
+        if previous is None:
+            registry.clear()
+        else:
+            registry.set(previous)
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-# Copyright 2015-2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2015-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import unicode_literals
@@ -79,6 +79,7 @@ invalid_func_key_type = FormattedError(InputError, "FuncKey type '{}' does not e
 invalid_destination_type = FormattedError(InputError, "FuncKey destination type '{}' does not exist")
 param_not_found = FormattedError(InputError, "field '{}': {} was not found")
 invalid_query_parameter = FormattedError(InputError, "parameter '{}': '{}' is not valid")
+exclusive_parameters = FormattedError(InputError, "parameters '{}' and '{}' cannot be used together")
 invalid_view = FormattedError(InputError, "view '{}' does not exist")
 ivr_exten_used = FormattedError(InputError, "exten '{}' used in more than one choice")
 invalid_exten_pattern = FormattedError(InputError, "exten '{}' cannot be a pattern")
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import inspect
+import logging
+import threading
+import time
+
+from collections import namedtuple
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_N_PLUS_ONE_THRESHOLD = 20
+
+logger = logging.getLogger(__name__)
+
+CallStats = namedtuple('CallStats', ['name', 'duration', 'statements', 'rows', 'pool_wait', 'n_plus_one'])
+
+
+class LoggingSink(object):
+    """Log every instrumented call, the suspected N+1 ones as warnings"""
+
+    def __init__(self, logger=logger, level=logging.DEBUG):
+        self._logger = logger
+        self._level = level
+
+    def record(self, stats):
+        level = logging.WARNING if stats.n_plus_one else self._level
+        self._logger.log(
+            level,
+            '%s: %.3f ms, %s statements, %s rows, %.3f ms waiting for a connection%s',
+            stats.name,
+            stats.duration * 1000,
+            stats.statements,
+            stats.rows,
+            stats.pool_wait * 1000,
+            ' (possible N+1)' if stats.n_plus_one else '',
+        )
+
+
+class CallbackSink(object):
+
+    def __init__(self, callback):
+        self._callback = callback
+
+    def record(self, stats):
+        self._callback(stats)
+
+
+class RegistrySink(object):
+    """Accumulate the calls per DAO function, like the counters of a metrics registry"""
+
+    _FIELDS = ('calls', 'duration', 'statements', 'rows', 'pool_wait', 'n_plus_one')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def record(self, stats):
+        with self._lock:
+            counters = self._counters.setdefault(stats.name, dict.fromkeys(self._FIELDS, 0))
+            counters['calls'] += 1
+            counters['duration'] += stats.duration
+            counters['statements'] += stats.statements
+            counters['rows'] += stats.rows
+            counters['pool_wait'] += stats.pool_wait
+            counters['n_plus_one'] += int(stats.n_plus_one)
+
+    def collect(self):
+        """Returns the counters of each DAO function, keyed by function name"""
+        with self._lock:
+            return {name: dict(counters) for name, counters in self._counters.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class _Call(object):
+
+    __slots__ = ('statements', 'rows', 'pool_wait')
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.pool_wait = 0.0
+
+
+_sink = None
+_n_plus_one_threshold = DEFAULT_N_PLUS_ONE_THRESHOLD
+_local = threading.local()
+
+
+def is_enabled():
+    return _sink is not None
+
+
+def enable(sink, n_plus_one_threshold=DEFAULT_N_PLUS_ONE_THRESHOLD):
+    """Start recording the DAO calls into `sink`
+
+    A call running more than `n_plus_one_threshold` statements is flagged as
+    a possible N+1.
+    """
+    global _sink, _n_plus_one_threshold
+    if not event.contains(Engine, 'after_cursor_execute', _count_statement):
+        event.listen(Engine, 'after_cursor_execute', _count_statement)
+    _n_plus_one_threshold = n_plus_one_threshold
+    _sink = sink
+
+
+def disable():
+    global _sink
+    _sink = None
+    if event.contains(Engine, 'after_cursor_execute', _count_statement):
+        event.remove(Engine, 'after_cursor_execute', _count_statement)
+
+
+def record_pool_wait(duration):
+    call = getattr(_local, 'call', None)
+    if call is not None:
+        call.pool_wait += duration
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    call = getattr(_local, 'call', None)
+    if call is None:
+        return
+    call.statements += 1
+    if cursor.rowcount > 0:
+        call.rows += cursor.rowcount
+
+
+def instrumented(func, name=None):
+    """Record the calls of `func` while the instrumentation is enabled
+
+    Only the outermost instrumented call of a thread is recorded, the
+    statements of the nested ones are accounted to it. When `func` returns a
+    generator, the call is recorded once the generator is exhausted or closed,
+    and only the time spent in the generator is accounted to it.
+    """
+    name = name or '{}.{}'.format(func.__module__, func.__name__)
+
+    @wraps(func)
+    def wrapped(*args, **kwargs):
+        if _sink is None or getattr(_local, 'call', None) is not None:
+            return func(*args, **kwargs)
+
+        call = _local.call = _Call()
+        start = time.time()
+        result = None
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            duration = time.time() - start
+            _local.call = None
+            if not inspect.isgenerator(result):
+                _record(name, call, duration)
+        if inspect.isgenerator(result):
+            return _instrumented_generator(result, name, call, duration)
+        return result
+    return wrapped
+
+
+def _instrumented_generator(generator, name, call, duration):
+    # the caller runs its own statements between two items, they are not part of the call
+    try:
+        while True:
+            outer = getattr(_local, 'call', None)
+            _local.call = call
+            start = time.time()
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+            finally:
+                duration += time.time() - start
+                _local.call = outer
+            yield item
+    finally:
+        generator.close()
+        _record(name, call, duration)
+
+
+def _record(name, call, duration):
+    sink = _sink
+    if sink is None:
+        return
+    stats = CallStats(
+        name,
+        duration,
+        call.statements,
+        call.rows,
+        call.pool_wait,
+        call.statements > _n_plus_one_threshold,
+    )
+    try:
+        sink.record(stats)
+    except Exception:
+        logger.exception('instrumentation sink failed to record %s', name)
+
+
+def instrumented_persistor(factory):
+    """Decorate a persistor factory to instrument the public methods of its persistors
+
+    The persistors are returned as is while the instrumentation is disabled.
+    """
+    @wraps(factory)
+    def wrapped(*args, **kwargs):
+        if _sink is None:
+            return factory(*args, **kwargs)
+
+        # building the persistor, e.g. with a daosession factory, is not a call of its own
+        outer = getattr(_local, 'call', None)
+        _local.call = outer or _Call()
+        try:
+            persistor = factory(*args, **kwargs)
+        finally:
+            _local.call = outer
+        return _InstrumentedPersistor(persistor)
+    return wrapped
+
+
+class _InstrumentedPersistor(object):
+
+    def __init__(self, persistor):
+        self._persistor = persistor
+
+    def __getattr__(self, attr):
+        value = getattr(self._persistor, attr)
+        if attr.startswith('_') or not inspect.ismethod(value):
+            return value
+        cls = type(self._persistor)
+        return instrumented(value, '{}.{}.{}'.format(cls.__module__, cls.__name__, attr))
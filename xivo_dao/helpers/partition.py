@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import re
+
+from datetime import datetime
+
+from sqlalchemy.sql import text
+
+PARTITION_KEYS = {
+    'call_log': 'date',
+    'cel': 'eventtime',
+    'queue_log': 'time',
+}
+
+DEFAULT_FUTURE_MONTHS = 3
+
+_PARTITION_NAME_FMT = '{table}_y{year:04d}m{month:02d}'
+_PARTITION_NAME_RE = re.compile(r'^(?P<table>\w+)_y(?P<year>\d{4})m(?P<month>\d{2})$')
+
+_IS_PARTITIONED_QUERY = text('''
+SELECT EXISTS (
+  SELECT 1 FROM pg_partitioned_table
+  WHERE partrelid = to_regclass(:table_name)
+)
+''')
+
+_LIST_PARTITIONS_QUERY = text('''
+SELECT child.relname AS name
+FROM pg_inherits
+JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+WHERE parent.oid = to_regclass(:table_name)
+ORDER BY child.relname
+''')
+
+
+def _utc_naive(date):
+    # the partition bounds are naive UTC datetimes
+    if date.utcoffset() is None:
+        return date
+    return (date - date.utcoffset()).replace(tzinfo=None)
+
+
+def _month_start(date):
+    return datetime(date.year, date.month, 1)
+
+
+def _next_month(date):
+    if date.month == 12:
+        return datetime(date.year + 1, 1, 1)
+    return datetime(date.year, date.month + 1, 1)
+
+
+def _check_table(table_name):
+    if table_name not in PARTITION_KEYS:
+        raise ValueError('{} is not a partitionable table'.format(table_name))
+
+
+def partition_name(table_name, month):
+    return _PARTITION_NAME_FMT.format(table=table_name, year=month.year, month=month.month)
+
+
+def is_partitioned(session, table_name):
+    _check_table(table_name)
+    return session.execute(_IS_PARTITIONED_QUERY, {'table_name': table_name}).scalar()
+
+
+def list_partitions(session, table_name):
+    """Return the (name, month) of the monthly partitions of `table_name`, oldest first
+
+    Partitions that do not follow the `<table>_yYYYYmMM` naming are ignored.
+    """
+    _check_table(table_name)
+    result = []
+    for row in session.execute(_LIST_PARTITIONS_QUERY, {'table_name': table_name}):
+        match = _PARTITION_NAME_RE.match(row.name)
+        if not match or match.group('table') != table_name:
+            continue
+        month = datetime(int(match.group('year')), int(match.group('month')), 1)
+        result.append((row.name, month))
+    return result
+
+
+def create_partition(session, table_name, month):
+    """Create the partition of `table_name` holding the rows of the month of `month`
+
+    The bounds are UTC midnights so the planner can prune partitions whenever a
+    query bounds the partition key with datetime parameters.
+    """
+    _check_table(table_name)
+    start = _month_start(month)
+    end = _next_month(start)
+    name = partition_name(table_name, start)
+    session.execute(
+        'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} '
+        "FOR VALUES FROM ('{start:%Y-%m-%d} 00:00:00+00') TO ('{end:%Y-%m-%d} 00:00:00+00')".format(
+            name=name, table=table_name, start=start, end=end,
+        )
+    )
+    return name
+
+
+def create_future_partitions(session, table_name, months=DEFAULT_FUTURE_MONTHS, now=None):
+    """Make sure the partitions of the current month and the `months` following ones exist"""
+    month = _month_start(_utc_naive(now or datetime.utcnow()))
+    names = []
+    for _ in range(months + 1):
+        names.append(create_partition(session, table_name, month))
+        month = _next_month(month)
+    return names
+
+
+def detach_partitions_before(session, table_name, before, drop=False):
+    """Detach the partitions only holding rows older than `before`
+
+    Detaching a whole month is a catalog operation, which replaces the
+    row-by-row DELETE of the retention jobs on partitioned tables. The detached
+    tables are dropped when `drop` is True, otherwise they are kept for archival.
+    A naive `before` is taken as UTC.
+
+    Returns the names of the detached partitions.
+    """
+    before = _utc_naive(before)
+    detached = []
+    for name, month in list_partitions(session, table_name):
+        if _next_month(month) > before:
+            continue
+        session.execute('ALTER TABLE {table} DETACH PARTITION {name}'.format(table=table_name, name=name))
+        if drop:
+            session.execute('DROP TABLE {name}'.format(name=name))
+        detached.append(name)
+    return detached
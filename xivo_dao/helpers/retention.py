@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import time
+
+from sqlalchemy import select
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def delete_in_batches(session, table, criteria, batch_size=DEFAULT_BATCH_SIZE,
+                      pause=0, progress=None, commit=None):
+    """Delete the rows of `table` matching `criteria`, `batch_size` rows at a time
+
+    Each batch is a `DELETE ... WHERE id IN (SELECT id ... LIMIT n)`. The
+    batches run in the transaction of the session unless `commit` is given:
+    it is then called after each batch, e.g. `session.commit` to keep locks
+    and WAL bounded when the caller owns the whole session.
+    `pause` is the number of seconds to wait between two batches, it requires
+    `commit` since sleeping in a transaction would only hold its locks longer.
+    `progress(batch_count, total_count)` is called after each batch.
+
+    Returns the number of deleted rows.
+    """
+    if pause and not commit:
+        raise ValueError('pause requires commit')
+
+    batch = select([table.c.id]).where(criteria).limit(batch_size)
+    query = table.delete().where(table.c.id.in_(batch))
+
+    total = 0
+    while True:
+        count = session.execute(query).rowcount
+        if commit:
+            commit()
+        total += count
+
+        if progress:
+            progress(count, total)
+
+        if count < batch_size:
+            return total
+
+        if pause:
+            time.sleep(pause)
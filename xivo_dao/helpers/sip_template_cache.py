@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import threading
+
+from collections import defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+
+from xivo_dao.alchemy.endpoint_sip import CHANGED_TEMPLATES_KEY
+from xivo_dao.alchemy.pjsip_transport import PJSIPTransport
+
+NOTIFY_CHANNEL = 'endpoint_sip_template_changed'
+# payload asking for the invalidation of every template
+NOTIFY_ALL = '*'
+
+_PENDING_KEY = 'pending_endpoint_sip_templates'
+_NOTIFY_QUERY = text('SELECT pg_notify(:channel, :payload)')
+# a NOTIFY payload must be shorter than 8000 bytes
+_NOTIFY_BATCH_SIZE = 200
+
+
+class TemplateCache(object):
+    '''
+    Process wide cache of the flattened configurations of the SIP templates
+
+    Entries are keyed by (kind, template uuid), kind being the flavour of the
+    flattening (user or trunk). Invalidating a template also invalidates the
+    templates inheriting from it.
+
+    The cache is disabled until enable() is called: a process enabling it must
+    also listen to the invalidations of the other processes, see listen().
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dependents = defaultdict(set)
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind, uuid, build):
+        '''
+        Returns the cached config of a template, calling build on a miss
+
+        build returns the config and the uuids of the templates it inherits from.
+        '''
+        if not self.enabled:
+            return build()[0]
+
+        uuid = str(uuid)
+        key = (kind, uuid)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            generation = self._generation
+
+        config, parent_uuids = build()
+
+        with self._lock:
+            # do not store a config built before a concurrent invalidation
+            if generation == self._generation:
+                self._entries[key] = config
+                for parent_uuid in parent_uuids:
+                    self._dependents[str(parent_uuid)].add(uuid)
+        return config
+
+    def invalidate(self, uuids=None):
+        with self._lock:
+            self._generation += 1
+            if uuids is None:
+                self._entries.clear()
+                self._dependents.clear()
+                return
+
+            pending = [str(uuid) for uuid in uuids]
+            seen = set()
+            while pending:
+                uuid = pending.pop()
+                if uuid in seen:
+                    continue
+                seen.add(uuid)
+                for key in [key for key in self._entries if key[1] == uuid]:
+                    del self._entries[key]
+                pending.extend(self._dependents.pop(uuid, ()))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+            }
+
+
+template_cache = TemplateCache()
+# notify the changes even though this process does not use the cache
+_notifications = False
+
+
+def enable():
+    template_cache.enabled = True
+    template_cache.invalidate()
+
+
+def disable():
+    template_cache.enabled = False
+    template_cache.invalidate()
+
+
+def enable_notifications():
+    '''Notify the template changes of this process to the caches of the other ones'''
+    global _notifications
+    _notifications = True
+
+
+def disable_notifications():
+    global _notifications
+    _notifications = False
+
+
+def _is_active():
+    return template_cache.enabled or _notifications
+
+
+def listen(dbapi_connection):
+    '''Subscribe a DBAPI connection to the invalidations of the other processes'''
+    cursor = dbapi_connection.cursor()
+    cursor.execute('LISTEN {}'.format(NOTIFY_CHANNEL))
+    cursor.close()
+
+
+def handle_notifications(dbapi_connection):
+    '''
+    Invalidate the templates notified on a connection given to listen
+
+    Meant to be called when the connection is readable, e.g. from a select loop.
+    '''
+    dbapi_connection.poll()
+    while dbapi_connection.notifies:
+        notify = dbapi_connection.notifies.pop(0)
+        _invalidate(uuid for uuid in notify.payload.split(',') if uuid)
+
+
+def _invalidate(uuids):
+    uuids = set(uuids)
+    if NOTIFY_ALL in uuids:
+        template_cache.invalidate()
+    else:
+        template_cache.invalidate(uuids)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_transports(session, flush_context):
+    if not _is_active():
+        return
+
+    # the templates are flattened with the name of their transport
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, PJSIPTransport):
+            session.info.setdefault(CHANGED_TEMPLATES_KEY, set()).add(NOTIFY_ALL)
+            return
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _invalidate_flushed_templates(session, flush_context):
+    changed = session.info.pop(CHANGED_TEMPLATES_KEY, None)
+    if not changed or not _is_active():
+        return
+
+    _invalidate(changed)
+    session.info.setdefault(_PENDING_KEY, set()).update(changed)
+
+    changed = sorted(changed)
+    for i in range(0, len(changed), _NOTIFY_BATCH_SIZE):
+        payload = ','.join(changed[i:i + _NOTIFY_BATCH_SIZE])
+        session.connection().execute(_NOTIFY_QUERY, channel=NOTIFY_CHANNEL, payload=payload)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _invalidate_pending_templates(session):
+    # entries built by other sessions before the end of the transaction are stale
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        _invalidate(pending)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from hamcrest import assert_that, equal_to, has_entries, is_
+from mock import patch, sentinel
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, literal_column, select, text
+
+from .. import db_manager
+
+
+class TestInitDBFromConfig(unittest.TestCase):
+
+    @patch('xivo_dao.helpers.db_manager.init_db')
+    def test_pool_options(self, init_db):
+        config = {
+            'db_uri': sentinel.uri,
+            'db_pool': {'size': 20, 'max_overflow': 5, 'recycle': 3600, 'timeout': 10, 'pre_ping': True},
+        }
+
+        db_manager.init_db_from_config(config)
+
+        init_db.assert_called_once_with(
+            sentinel.uri,
+            pool_size=20,
+            max_overflow=5,
+            pool_recycle=3600,
+            pool_timeout=10,
+            pool_pre_ping=True,
+            replica_uris=None,
+        )
+
+    @patch('xivo_dao.helpers.db_manager.init_db')
+    def test_default_pool_options(self, init_db):
+        db_manager.init_db_from_config({'db_uri': sentinel.uri})
+
+        init_db.assert_called_once_with(
+            sentinel.uri,
+            pool_size=None,
+            max_overflow=None,
+            pool_recycle=None,
+            pool_timeout=None,
+            pool_pre_ping=False,
+            replica_uris=None,
+        )
+
+
+class TestPoolStatus(unittest.TestCase):
+
+    def test_pool_status(self):
+        engine = create_engine('sqlite://', poolclass=db_manager.InstrumentedQueuePool, pool_size=2)
+
+        connection = engine.connect()
+        status = db_manager.pool_status(engine)
+        connection.close()
+
+        assert_that(status, has_entries(size=2, checked_out=1, wait_count=1))
+
+    def test_pool_status_of_other_pools(self):
+        engine = create_engine('sqlite://')
+
+        assert_that(db_manager.pool_status(engine), equal_to({}))
+
+
+class TestCompileForAsyncpg(unittest.TestCase):
+
+    def test_positional_parameters(self):
+        table = Table('t', MetaData(), Column('id', Integer))
+        query = select([table.c.id]).where(table.c.id.in_([1, 2])).limit(1)
+
+        sql, args = db_manager.compile_for_asyncpg(query)
+
+        assert_that(sql, equal_to('SELECT t.id \nFROM t \nWHERE t.id IN ($1, $2) \n LIMIT $3'))
+        assert_that(args, equal_to([1, 2, 1]))
+
+    def test_percent_signs_are_not_doubled(self):
+        table = Table('t', MetaData(), Column('id', Integer), Column('name', String))
+        query = (select([table.c.id % 2, literal_column("'100%'")])
+                 .where(table.c.name.like('%a%'))
+                 .where(text("t.name != 'b%'")))
+
+        sql, args = db_manager.compile_for_asyncpg(query)
+
+        assert_that(sql, equal_to(
+            "SELECT t.id % $1 AS anon_1, '100%' \nFROM t \nWHERE t.name LIKE $2 AND t.name != 'b%'"
+        ))
+        assert_that(args, equal_to([2, '%a%']))
+
+
+class TestRoutingSession(unittest.TestCase):
+
+    def setUp(self):
+        self.primary = create_engine('sqlite://')
+        self.replica = create_engine('sqlite://')
+        self.table = Table('t', MetaData(), Column('id', Integer, primary_key=True))
+        self.session = db_manager.RoutingSession(bind=self.primary, replicas=[self.replica])
+
+    def test_without_replicas(self):
+        session = db_manager.RoutingSession(bind=self.primary)
+
+        assert_that(session.get_bind(clause=select([self.table])), is_(self.primary))
+
+    def test_reads_go_to_replica(self):
+        assert_that(self.session.get_bind(clause=select([self.table])), is_(self.replica))
+
+    def test_writes_go_to_primary(self):
+        assert_that(self.session.get_bind(clause=self.table.insert()), is_(self.primary))
+        assert_that(self.session.get_bind(), is_(self.primary))
+
+    def test_select_for_update_goes_to_primary(self):
+        clause = select([self.table]).with_for_update()
+
+        assert_that(self.session.get_bind(clause=clause), is_(self.primary))
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        self.session.get_bind(clause=self.table.delete())
+
+        assert_that(self.session.get_bind(clause=select([self.table])), is_(self.primary))
+
+        self.session.close()
+
+        assert_that(self.session.get_bind(clause=select([self.table])), is_(self.replica))
+
+    def test_read_only_session(self):
+        self.session.info[db_manager.READ_ONLY] = True
+
+        assert_that(self.session.get_bind(clause=self.table.insert()), is_(self.replica))
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from hamcrest import assert_that, equal_to, is_
+from mock import Mock, patch, sentinel
+
+from .. import db_utils
+
+
+class TestSnapshotScope(unittest.TestCase):
+
+    def setUp(self):
+        self.session = Mock()
+        self.connection = self.session.connection.return_value
+        self.connection.execute.return_value.scalar.return_value = sentinel.exported_id
+        patcher = patch('xivo_dao.helpers.db_utils.db_manager.Session')
+        self.Session = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.Session.session_factory.return_value = self.session
+        self.registry = self.Session.registry
+        self.registry.has.return_value = True
+        self.registry.return_value = sentinel.previous_session
+
+    def test_exports_a_snapshot(self):
+        with db_utils.snapshot_scope() as snapshot_id:
+            assert_that(snapshot_id, equal_to(sentinel.exported_id))
+            self.registry.set.assert_called_once_with(self.session)
+
+        self.session.connection.assert_called_once_with(
+            execution_options={'isolation_level': 'REPEATABLE READ'},
+        )
+        self.session.rollback.assert_called_once_with()
+        self.registry.set.assert_called_with(sentinel.previous_session)
+
+    def test_imports_a_snapshot(self):
+        with db_utils.snapshot_scope('00000003-0000001B-1') as snapshot_id:
+            assert_that(snapshot_id, equal_to('00000003-0000001B-1'))
+
+        statement, = self.connection.execute.call_args[0]
+        assert_that(str(statement), equal_to('SET TRANSACTION SNAPSHOT :snapshot_id'))
+
+    def test_session_is_released_on_error(self):
+        self.registry.has.return_value = False
+
+        try:
+            with db_utils.snapshot_scope():
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+
+        assert_that(self.session.close.called, is_(True))
+        self.registry.clear.assert_called_once_with()
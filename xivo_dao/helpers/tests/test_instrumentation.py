@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from hamcrest import (
+    assert_that,
+    contains,
+    empty,
+    equal_to,
+    has_entries,
+    has_properties,
+    instance_of,
+)
+from mock import Mock
+from sqlalchemy import create_engine
+
+from .. import instrumentation
+
+
+class TestInstrumented(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        self.records = []
+        instrumentation.enable(instrumentation.CallbackSink(self.records.append), n_plus_one_threshold=2)
+
+    def tearDown(self):
+        instrumentation.disable()
+
+    def test_statements_and_rows(self):
+        @instrumentation.instrumented
+        def query():
+            return self.engine.execute('SELECT 1 UNION SELECT 2').fetchall()
+
+        query()
+
+        assert_that(self.records, contains(has_properties(
+            name='{}.query'.format(__name__),
+            statements=1,
+            n_plus_one=False,
+        )))
+
+    def test_n_plus_one(self):
+        @instrumentation.instrumented
+        def query():
+            for _ in range(3):
+                self.engine.execute('SELECT 1')
+
+        query()
+
+        assert_that(self.records, contains(has_properties(statements=3, n_plus_one=True)))
+
+    def test_nested_calls_are_accounted_to_the_outermost(self):
+        @instrumentation.instrumented
+        def inner():
+            self.engine.execute('SELECT 1')
+
+        @instrumentation.instrumented
+        def outer():
+            inner()
+            inner()
+
+        outer()
+
+        assert_that(self.records, contains(has_properties(name='{}.outer'.format(__name__), statements=2)))
+
+    def test_pool_wait(self):
+        @instrumentation.instrumented
+        def query():
+            instrumentation.record_pool_wait(0.5)
+
+        query()
+
+        assert_that(self.records, contains(has_properties(pool_wait=0.5)))
+
+    def test_disabled(self):
+        instrumentation.disable()
+
+        @instrumentation.instrumented
+        def query():
+            self.engine.execute('SELECT 1')
+
+        query()
+
+        assert_that(self.records, empty())
+
+    def test_generator_is_recorded_once_exhausted(self):
+        @instrumentation.instrumented
+        def query():
+            for _ in range(2):
+                yield self.engine.execute('SELECT 1').scalar()
+
+        results = query()
+        assert_that(self.records, empty())
+
+        for _ in results:
+            self.engine.execute('SELECT 2')
+
+        assert_that(self.records, contains(has_properties(name='{}.query'.format(__name__), statements=2)))
+
+    def test_generator_is_recorded_when_closed(self):
+        @instrumentation.instrumented
+        def query():
+            while True:
+                yield self.engine.execute('SELECT 1').scalar()
+
+        results = query()
+        next(results)
+        results.close()
+
+        assert_that(self.records, contains(has_properties(statements=1)))
+
+    def test_failing_sink(self):
+        sink = Mock()
+        sink.record.side_effect = Exception
+        instrumentation.enable(sink)
+
+        result = instrumentation.instrumented(lambda: 42)()
+
+        assert_that(result, equal_to(42))
+
+
+class TestRegistrySink(unittest.TestCase):
+
+    def test_collect(self):
+        sink = instrumentation.RegistrySink()
+
+        sink.record(instrumentation.CallStats('f', 0.5, 2, 3, 0.0, False))
+        sink.record(instrumentation.CallStats('f', 0.5, 30, 3, 0.25, True))
+
+        assert_that(sink.collect(), has_entries(f=has_entries(
+            calls=2,
+            duration=1.0,
+            statements=32,
+            rows=6,
+            pool_wait=0.25,
+            n_plus_one=1,
+        )))
+
+
+class TestInstrumentedPersistor(unittest.TestCase):
+
+    class Persistor(object):
+
+        value = 42
+
+        def get(self):
+            return self._find()
+
+        def _find(self):
+            return self.value
+
+        @staticmethod
+        def build():
+            return 'built'
+
+    def setUp(self):
+        self.records = []
+        self.factory = instrumentation.instrumented_persistor(self.Persistor)
+        instrumentation.enable(instrumentation.CallbackSink(self.records.append))
+
+    def tearDown(self):
+        instrumentation.disable()
+
+    def test_public_methods_are_instrumented(self):
+        persistor = self.factory()
+
+        assert_that(persistor.get(), equal_to(42))
+        assert_that(persistor._find(), equal_to(42))
+        assert_that(persistor.value, equal_to(42))
+
+        assert_that(self.records, contains(has_properties(name='{}.Persistor.get'.format(__name__))))
+
+    def test_static_methods_are_not_instrumented(self):
+        assert_that(self.factory().build(), equal_to('built'))
+
+        assert_that(self.records, empty())
+
+    def test_instrumented_factory_is_not_recorded(self):
+        factory = instrumentation.instrumented_persistor(instrumentation.instrumented(self.Persistor))
+
+        assert_that(factory().get(), equal_to(42))
+
+        assert_that(self.records, contains(has_properties(name='{}.Persistor.get'.format(__name__))))
+
+    def test_disabled(self):
+        instrumentation.disable()
+
+        assert_that(self.factory(), instance_of(self.Persistor))
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from datetime import datetime
+
+from hamcrest import assert_that, calling, contains, empty, equal_to, is_, raises
+from mock import Mock, patch
+from pytz import FixedOffset
+
+from xivo_dao.tests.test_dao import DAOTestCase
+
+from .. import partition
+
+
+class TestPartitionName(unittest.TestCase):
+
+    def test_partition_name(self):
+        result = partition.partition_name('queue_log', datetime(2021, 3, 15, 12, 0))
+
+        assert_that(result, equal_to('queue_log_y2021m03'))
+
+    def test_next_month_wraps_year(self):
+        result = partition._next_month(datetime(2021, 12, 31))
+
+        assert_that(result, equal_to(datetime(2022, 1, 1)))
+
+
+class TestDetachPartitionsBefore(unittest.TestCase):
+
+    @patch('xivo_dao.helpers.partition.list_partitions')
+    def test_given_aware_before_then_compared_in_utc(self, list_partitions):
+        list_partitions.return_value = [
+            ('call_log_y2021m01', datetime(2021, 1, 1)),
+            ('call_log_y2021m02', datetime(2021, 2, 1)),
+        ]
+        session = Mock()
+        before = datetime(2021, 3, 1, 0, 30, tzinfo=FixedOffset(60))
+
+        result = partition.detach_partitions_before(session, 'call_log', before)
+
+        assert_that(result, contains('call_log_y2021m01'))
+
+
+class TestPartition(DAOTestCase):
+
+    def test_unknown_table(self):
+        assert_that(
+            calling(partition.create_partition).with_args(self.session, 'userfeatures', datetime.now()),
+            raises(ValueError),
+        )
+
+    def test_is_partitioned_when_not_converted(self):
+        assert_that(partition.is_partitioned(self.session, 'queue_log'), is_(False))
+
+    def test_list_partitions_when_not_converted(self):
+        assert_that(partition.list_partitions(self.session, 'cel'), empty())
+
+    def test_detach_partitions_before_when_not_converted(self):
+        result = partition.detach_partitions_before(self.session, 'call_log', datetime(2021, 1, 1))
+
+        assert_that(result, contains())
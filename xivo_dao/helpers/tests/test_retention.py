@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from hamcrest import (
+    assert_that,
+    calling,
+    contains,
+    contains_inanyorder,
+    equal_to,
+    has_property,
+    raises,
+)
+from mock import Mock, call
+
+from xivo_dao.alchemy.cel import CEL as CELSchema
+from xivo_dao.tests.test_dao import DAOTestCase
+
+from .. import retention
+
+
+class TestDeleteInBatches(DAOTestCase):
+
+    def setUp(self):
+        super(TestDeleteInBatches, self).setUp()
+        self.old_cel_ids = [self.add_cel(linkedid='old') for _ in range(3)]
+        self.new_cel_ids = [self.add_cel(linkedid='new') for _ in range(2)]
+        self.criteria = CELSchema.linkedid == 'old'
+
+    def test_delete_in_batches(self):
+        progress = Mock()
+
+        count = retention.delete_in_batches(
+            self.session, CELSchema.__table__, self.criteria, batch_size=2, progress=progress,
+        )
+
+        assert_that(count, equal_to(3))
+        assert_that(progress.call_args_list, contains(call(2, 2), call(1, 3)))
+        result = self.session.query(CELSchema).all()
+        assert_that(result, contains_inanyorder(*[has_property('id', id_) for id_ in self.new_cel_ids]))
+
+    def test_batches_stay_in_the_transaction_of_the_session(self):
+        savepoint = self.session.begin_nested()
+
+        retention.delete_in_batches(self.session, CELSchema.__table__, self.criteria, batch_size=2)
+        savepoint.rollback()
+
+        assert_that(self.session.query(CELSchema).count(), equal_to(5))
+
+    def test_commit_after_each_batch(self):
+        commit = Mock()
+
+        retention.delete_in_batches(self.session, CELSchema.__table__, self.criteria, batch_size=2,
+                                    commit=commit, pause=0.01)
+
+        assert_that(commit.call_count, equal_to(2))
+
+    def test_pause_without_commit(self):
+        assert_that(
+            calling(retention.delete_in_batches).with_args(
+                self.session, CELSchema.__table__, self.criteria, pause=1,
+            ),
+            raises(ValueError),
+        )
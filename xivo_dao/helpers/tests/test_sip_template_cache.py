@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from hamcrest import assert_that, equal_to, has_entries
+
+from ..sip_template_cache import TemplateCache
+
+
+class TestTemplateCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TemplateCache()
+        self.cache.enabled = True
+
+    def test_disabled_cache_always_builds(self):
+        self.cache.enabled = False
+        calls = []
+
+        def build():
+            calls.append(True)
+            return {'name': 'tpl'}, []
+
+        self.cache.get('user', 'a', build)
+        result = self.cache.get('user', 'a', build)
+
+        assert_that(result, equal_to({'name': 'tpl'}))
+        assert_that(len(calls), equal_to(2))
+        assert_that(self.cache.stats(), has_entries(hits=0, misses=0, size=0))
+
+    def test_get_builds_once(self):
+        calls = []
+
+        def build():
+            calls.append(True)
+            return {'name': 'tpl'}, []
+
+        self.cache.get('user', 'a', build)
+        result = self.cache.get('user', 'a', build)
+
+        assert_that(result, equal_to({'name': 'tpl'}))
+        assert_that(len(calls), equal_to(1))
+        assert_that(self.cache.stats(), has_entries(hits=1, misses=1, size=1))
+
+    def test_kinds_are_cached_separately(self):
+        self.cache.get('user', 'a', lambda: ('user', []))
+        result = self.cache.get('trunk', 'a', lambda: ('trunk', []))
+
+        assert_that(result, equal_to('trunk'))
+
+    def test_invalidate_dependents(self):
+        self.cache.get('user', 'parent', lambda: ('parent', []))
+        self.cache.get('user', 'child', lambda: ('child', ['parent']))
+        self.cache.get('user', 'other', lambda: ('other', []))
+
+        self.cache.invalidate(['parent'])
+
+        assert_that(self.cache.stats(), has_entries(size=1))
+        result = self.cache.get('user', 'child', lambda: ('new child', ['parent']))
+        assert_that(result, equal_to('new child'))
+
+    def test_invalidate_all(self):
+        self.cache.get('user', 'a', lambda: ('a', []))
+
+        self.cache.invalidate()
+
+        assert_that(self.cache.stats(), has_entries(size=0))
+
+    def test_concurrent_invalidation_is_not_overwritten(self):
+        def build():
+            self.cache.invalidate(['a'])
+            return 'stale', []
+
+        self.cache.get('user', 'a', build)
+
+        assert_that(self.cache.stats(), has_entries(size=0))
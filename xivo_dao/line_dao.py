@@ -1,31 +1,47 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+from sqlalchemy import bindparam
+from sqlalchemy.orm import Query
+
 from xivo_dao.alchemy.linefeatures import LineFeatures
 from xivo_dao.alchemy.line_extension import LineExtension
 from xivo_dao.alchemy.user_line import UserLine
 from xivo_dao.alchemy.userfeatures import UserFeatures
 from xivo_dao.alchemy.extension import Extension as ExtensionTable
-from xivo_dao.helpers.db_manager import daosession
+from xivo_dao.helpers.db_manager import bakery, daosession
 
 
 @daosession
 def get_interface_from_exten_and_context(session, extension, context):
-    res = (session
-           .query(LineFeatures.endpoint_sip_uuid,
-                  LineFeatures.endpoint_sccp_id,
-                  LineFeatures.endpoint_custom_id,
-                  LineFeatures.name,
-                  UserLine.main_line)
-           .join(LineExtension, LineExtension.line_id == LineFeatures.id)
-           .join(ExtensionTable, LineExtension.extension_id == ExtensionTable.id)
-           .outerjoin(UserLine, UserLine.line_id == LineFeatures.id)
-           .filter(ExtensionTable.exten == extension)
-           .filter(ExtensionTable.context == context))
+    rows = _interface_from_exten_and_context_baked(session).params(extension=extension, context=context).all()
+    return _interface_from_exten_and_context_rows(rows, extension, context)
+
+
+_interface_from_exten_and_context_baked = bakery(
+    lambda session: _interface_from_exten_and_context_query(
+        bindparam('extension'), bindparam('context'),
+    ).with_session(session)
+)
+
+
+def _interface_from_exten_and_context_query(extension, context):
+    return (Query([LineFeatures.endpoint_sip_uuid,
+                   LineFeatures.endpoint_sccp_id,
+                   LineFeatures.endpoint_custom_id,
+                   LineFeatures.name,
+                   UserLine.main_line])
+            .join(LineExtension, LineExtension.line_id == LineFeatures.id)
+            .join(ExtensionTable, LineExtension.extension_id == ExtensionTable.id)
+            .outerjoin(UserLine, UserLine.line_id == LineFeatures.id)
+            .filter(ExtensionTable.exten == extension)
+            .filter(ExtensionTable.context == context))
+
 
+def _interface_from_exten_and_context_rows(rows, extension, context):
     interface = None
-    for row in res.all():
+    for row in rows:
         interface = _format_interface(row)
         if row.main_line:
             return interface
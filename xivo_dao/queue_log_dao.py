@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+from bisect import bisect_left
 from sqlalchemy import between, distinct
 from sqlalchemy.sql import text
 from sqlalchemy.sql.expression import and_, or_
@@ -10,9 +11,7 @@ from xivo_dao.alchemy.queue_log import QueueLog
 from sqlalchemy import func
 from datetime import timedelta
 from xivo_dao.helpers.db_manager import daosession
-
-
-_STR_TIME_FMT = "%Y-%m-%d %H:%M:%S.%f%z"
+from xivo_dao.helpers import retention
 
 
 def get_wrapup_times(session, start, end, interval):
@@ -32,60 +31,33 @@ AND
   queue_log.time BETWEEN :start AND :end
 '''
 
-    periods = [t for t in _enumerate_periods(start, end, interval)]
-    formatted_start = before_start.strftime('%Y-%m-%d %H:%M:%S%z')
-    formatted_end = end.strftime('%Y-%m-%d %H:%M:%S%z')
-
+    periods = list(_enumerate_periods(start, end, interval))
     rows = session.query(
         'start',
         'end',
         'agent_id'
-    ).from_statement(text(wrapup_times_query)).params(start=formatted_start,
-                                                      end=formatted_end)
+    ).from_statement(text(wrapup_times_query)).params(start=before_start, end=end)
 
     results = {}
     for row in rows.all():
         agent_id, wstart, wend = row.agent_id, row.start, row.end
 
-        starting_period = _find_including_period(periods, wstart)
-        ending_period = _find_including_period(periods, wend)
-
-        if starting_period and starting_period not in results:
-            results[starting_period] = {}
-        if ending_period and ending_period not in results:
-            results[ending_period] = {}
-
-        if starting_period is not None:
-            range_end = starting_period + interval
-            wend_in_start = wend if wend < range_end else range_end
-            time_in_period = wend_in_start - wstart
-            if agent_id not in results[starting_period]:
-                results[starting_period][agent_id] = {
-                    'wrapup_time': timedelta(seconds=0)
-                }
-            results[starting_period][agent_id]['wrapup_time'] += time_in_period
-
-        if ending_period == starting_period:
-            continue
+        first = max(bisect_left(periods, wstart) - 1, 0)
+        last = bisect_left(periods, wend)
+        for period in periods[first:last]:
+            period_end = period + interval
+            time_in_period = (wend if wend < period_end else period_end) - (wstart if wstart > period else period)
+            if time_in_period <= timedelta(0):
+                continue
 
-        time_in_period = wend - ending_period
-        if agent_id not in results[ending_period]:
-            results[ending_period][agent_id] = {
-                'wrapup_time': timedelta(seconds=0)
-            }
-        results[ending_period][agent_id]['wrapup_time'] += time_in_period
+            agents = results.setdefault(period, {})
+            if agent_id not in agents:
+                agents[agent_id] = {'wrapup_time': timedelta(seconds=0)}
+            agents[agent_id]['wrapup_time'] += time_in_period
 
     return results
 
 
-def _find_including_period(periods, t):
-    match = None
-    for period in periods:
-        if t > period:
-            match = period
-    return match
-
-
 def _enumerate_periods(start, end, interval):
     tmp = start
     while tmp <= end:
@@ -93,12 +65,11 @@ def _enumerate_periods(start, end, interval):
         tmp += interval
 
 
-def _get_ended_call(session, start_str, end, queue_log_event, stat_event):
+def _get_ended_call(session, start, end, queue_log_event, stat_event):
     pairs = []
     enter_queue_event = None
 
     higher_boundary = end + timedelta(days=1)
-    end_str = higher_boundary.strftime(_STR_TIME_FMT)
 
     queue_logs = (session
                   .query(QueueLog.event,
@@ -106,8 +77,8 @@ def _get_ended_call(session, start_str, end, queue_log_event, stat_event):
                          QueueLog.queuename,
                          QueueLog.data3,
                          QueueLog.time)
-                  .filter(and_(QueueLog.time >= start_str,
-                               QueueLog.time < end_str,
+                  .filter(and_(QueueLog.time >= start,
+                               QueueLog.time < higher_boundary,
                                or_(QueueLog.event == 'ENTERQUEUE',
                                    QueueLog.event == queue_log_event)))
                   .order_by(QueueLog.callid, QueueLog.time))
@@ -153,13 +124,11 @@ def _get_ended_call(session, start_str, end, queue_log_event, stat_event):
 
 
 def get_queue_abandoned_call(session, start, end):
-    start_str = start.strftime(_STR_TIME_FMT)
-    return _get_ended_call(session, start_str, end, 'ABANDON', 'abandoned')
+    return _get_ended_call(session, start, end, 'ABANDON', 'abandoned')
 
 
 def get_queue_timeout_call(session, start, end):
-    start_str = start.strftime(_STR_TIME_FMT)
-    return _get_ended_call(session, start_str, end, 'EXITWITHTIMEOUT', 'timeout')
+    return _get_ended_call(session, start, end, 'EXITWITHTIMEOUT', 'timeout')
 
 
 def get_first_time(session):
@@ -170,9 +139,6 @@ def get_first_time(session):
 
 
 def get_queue_names_in_range(session, start, end):
-    start = start.strftime(_STR_TIME_FMT)
-    end = end.strftime(_STR_TIME_FMT)
-
     return [r[0] for r in (session.query(distinct(QueueLog.queuename))
                            .filter(between(QueueLog.time, start, end)))]
 
@@ -191,6 +157,14 @@ def delete_event_between(session, start, end):
         and_(between(QueueLog.time, start, end))).delete(synchronize_session='fetch')
 
 
+@daosession
+def delete_event_between_by_batch(session, start, end, batch_size=retention.DEFAULT_BATCH_SIZE,
+                                  pause=0, progress=None, commit=False):
+    criteria = between(QueueLog.time, start, end)
+    return retention.delete_in_batches(session, QueueLog.__table__, criteria, batch_size, pause, progress,
+                                       commit=session.commit if commit else None)
+
+
 @daosession
 def insert_entry(session, time, callid, queue, agent, event, d1='', d2='', d3='', d4='', d5=''):
     entry = QueueLog(
@@ -208,9 +182,6 @@ def insert_entry(session, time, callid, queue, agent, event, d1='', d2='', d3=''
 
 
 def hours_with_calls(session, start, end):
-    start = start.strftime(_STR_TIME_FMT)
-    end = end.strftime(_STR_TIME_FMT)
-
     hours = (session
              .query(distinct(func.date_trunc('hour', QueueLog.time)).label('time'))
              .filter(between(QueueLog.time, start, end)))
@@ -2,10 +2,17 @@
 # Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+from sqlalchemy import sql
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import Integer
+
 from xivo_dao.alchemy.call_log import CallLog
+from xivo_dao.alchemy.call_log_participant import CallLogParticipant
 from xivo_dao.alchemy.cel import CEL
-from xivo_dao.helpers.db_utils import flush_session
+from xivo_dao.helpers.db_utils import BULK_INSERT_SIZE, bulk_insert, flush_session
 from xivo_dao.helpers.db_manager import daosession
+from xivo_dao.helpers import retention
+from xivo_dao.helpers.uuid import new_uuid
 
 
 @daosession
@@ -30,6 +37,75 @@ def create_call_log(session, call_log):
          .update({'call_log_id': call_log.id}, synchronize_session=False))
 
 
+@daosession
+def bulk_create_from_list(session, call_logs, batch_size=BULK_INSERT_SIZE):
+    """Insert call logs without the unit of work and return their ids in input order
+
+    The rows are inserted by multi-row INSERT statements of `batch_size` rows.
+    """
+    if not call_logs:
+        return []
+
+    with flush_session(session):
+        ids = _allocate_call_log_ids(session, call_logs)
+
+        bulk_insert(session, CallLog.__table__, [
+            _call_log_row(call_log, call_log_id) for call_log, call_log_id in zip(call_logs, ids)
+        ], batch_size)
+
+        participants = [
+            _participant_row(participant, call_log_id)
+            for call_log, call_log_id in zip(call_logs, ids)
+            for participant in call_log.participants
+        ]
+        bulk_insert(session, CallLogParticipant.__table__, participants, batch_size)
+
+        cel_ids, cel_call_log_ids = [], []
+        for call_log, call_log_id in zip(call_logs, ids):
+            cel_ids.extend(call_log.cel_ids)
+            cel_call_log_ids.extend([call_log_id] * len(call_log.cel_ids))
+        if cel_ids:
+            _link_cels(session, cel_ids, cel_call_log_ids)
+
+    return ids
+
+
+def _allocate_call_log_ids(session, call_logs):
+    missing = len([call_log for call_log in call_logs if call_log.id is None])
+    query = sql.text("SELECT nextval('call_log_id_seq') FROM generate_series(1, :count)")
+    new_ids = iter([row[0] for row in session.execute(query, {'count': missing})] if missing else [])
+    return [call_log.id if call_log.id is not None else next(new_ids) for call_log in call_logs]
+
+
+def _call_log_row(call_log, call_log_id):
+    row = {column.key: getattr(call_log, column.key) for column in CallLog.__table__.columns}
+    row['id'] = call_log_id
+    return row
+
+
+def _participant_row(participant, call_log_id):
+    return {
+        'uuid': participant.uuid or new_uuid(),
+        'call_log_id': call_log_id,
+        'user_uuid': participant.user_uuid,
+        'line_id': participant.line_id,
+        'role': participant.role,
+        'tags': participant.tags or [],
+    }
+
+
+def _link_cels(session, cel_ids, call_log_ids):
+    links = sql.select([
+        sql.func.unnest(sql.bindparam('cel_ids', cel_ids, type_=ARRAY(Integer))).label('cel_id'),
+        sql.func.unnest(sql.bindparam('call_log_ids', call_log_ids, type_=ARRAY(Integer))).label('call_log_id'),
+    ]).alias('links')
+    session.execute(
+        CEL.__table__.update()
+        .where(CEL.__table__.c.id == links.c.cel_id)
+        .values(call_log_id=links.c.call_log_id)
+    )
+
+
 @daosession
 def delete_from_list(session, call_log_ids):
     with flush_session(session):
@@ -49,3 +125,24 @@ def delete(session, older=None):
             query = query.where(CallLog.date >= older)
         result = [r.id for r in session.execute(query)]
         return result
+
+
+@daosession
+def delete_by_batch(session, older=None, before=None, batch_size=retention.DEFAULT_BATCH_SIZE, pause=0, progress=None,
+                    commit=False):
+    """Same as delete() but in batches, returning the number of deleted call logs
+
+    `before` deletes the call logs started before the given date, for retention.
+    At least one of `older` and `before` is required. `commit` commits the
+    session after each batch and is required by `pause`.
+    """
+    if not older and not before:
+        raise ValueError('delete_by_batch requires older or before')
+
+    criteria = sql.true()
+    if older:
+        criteria = sql.and_(criteria, CallLog.date >= older)
+    if before:
+        criteria = sql.and_(criteria, CallLog.date < before)
+    return retention.delete_in_batches(session, CallLog.__table__, criteria, batch_size, pause, progress,
+                                       commit=session.commit if commit else None)
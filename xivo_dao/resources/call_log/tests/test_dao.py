@@ -2,18 +2,23 @@
 # Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import uuid
+
 from datetime import datetime as dt
 from datetime import timedelta as td
 from hamcrest import all_of
 from hamcrest import assert_that
+from hamcrest import calling
 from hamcrest import contains
 from hamcrest import contains_inanyorder
 from hamcrest import empty
 from hamcrest import equal_to
 from hamcrest import has_length
 from hamcrest import has_property
+from hamcrest import raises
 
 from xivo_dao.alchemy.call_log import CallLog
+from xivo_dao.alchemy.call_log_participant import CallLogParticipant
 from xivo_dao.alchemy.cel import CEL
 from xivo_dao.resources.call_log import dao as call_log_dao
 from xivo_dao.tests.test_dao import DAOTestCase
@@ -71,6 +76,59 @@ class TestCallLogDAO(DAOTestCase):
             all_of(has_property('id', cel_id_3), has_property('call_log_id', call_log_id_2)),
             all_of(has_property('id', cel_id_4), has_property('call_log_id', call_log_id_2))))
 
+    def test_bulk_create_from_list(self):
+        user_uuid = '6b8a5fa2-9a14-4e4b-9bfb-5b1b9e2a5f62'
+        cel_id_1, cel_id_2, cel_id_3 = self.add_cel(), self.add_cel(), self.add_cel()
+        call_log_1 = CallLog(date=dt.now(), tenant_uuid=self.default_tenant.uuid, source_name='first')
+        call_log_1.cel_ids = [cel_id_1, cel_id_2]
+        call_log_1.participants = [CallLogParticipant(user_uuid=user_uuid, role='source')]
+        call_log_2 = CallLog(date=dt.now(), tenant_uuid=self.default_tenant.uuid, source_name='second')
+        call_log_2.cel_ids = [cel_id_3]
+
+        ids = call_log_dao.bulk_create_from_list([call_log_1, call_log_2])
+
+        call_log_id_1, call_log_id_2 = ids
+        call_log_rows = self.session.query(CallLog).all()
+        assert_that(call_log_rows, contains_inanyorder(
+            all_of(has_property('id', call_log_id_1), has_property('source_name', 'first'),
+                   has_property('source_user_uuid', user_uuid)),
+            all_of(has_property('id', call_log_id_2), has_property('source_name', 'second'))))
+
+        cel_rows = self.session.query(CEL).all()
+        assert_that(cel_rows, contains_inanyorder(
+            all_of(has_property('id', cel_id_1), has_property('call_log_id', call_log_id_1)),
+            all_of(has_property('id', cel_id_2), has_property('call_log_id', call_log_id_1)),
+            all_of(has_property('id', cel_id_3), has_property('call_log_id', call_log_id_2))))
+
+    def test_bulk_create_from_list_in_batches(self):
+        call_logs = [
+            CallLog(date=dt.now(), tenant_uuid=self.default_tenant.uuid, source_name=str(i))
+            for i in range(3)
+        ]
+        user_uuids = [str(uuid.uuid4()) for _ in call_logs]
+        for call_log, user_uuid in zip(call_logs, user_uuids):
+            call_log.participants = [
+                CallLogParticipant(user_uuid=user_uuid, role='source'),
+                CallLogParticipant(user_uuid=user_uuid, role='destination'),
+            ]
+
+        ids = call_log_dao.bulk_create_from_list(call_logs, batch_size=2)
+
+        assert_that(ids, has_length(3))
+        assert_that(self.session.query(CallLog).all(), has_length(3))
+        participants = self.session.query(CallLogParticipant).all()
+        assert_that(participants, has_length(6))
+        for call_log_id, user_uuid in zip(ids, user_uuids):
+            assert_that(
+                [p.call_log_id for p in participants if p.user_uuid == user_uuid],
+                contains(call_log_id, call_log_id),
+            )
+
+    def test_bulk_create_from_list_empty(self):
+        result = call_log_dao.bulk_create_from_list([])
+
+        assert_that(result, empty())
+
     def test_delete_from_list(self):
         id_1, id_2, id_3 = [42, 43, 44]
         self.add_call_log(id=id_1)
@@ -112,6 +170,47 @@ class TestCallLogDAO(DAOTestCase):
         result = self.session.query(CallLog).all()
         assert_that(result, contains(call_log_2))
 
+    def test_delete_by_batch(self):
+        now = dt.now()
+        self.add_call_log(date=now)
+        call_log = self.add_call_log(date=now - td(hours=2))
+        self.add_call_log(date=now)
+        progress = []
+
+        count = call_log_dao.delete_by_batch(
+            older=now - td(hours=1),
+            batch_size=1,
+            progress=lambda batch, total: progress.append((batch, total)),
+        )
+
+        assert_that(count, equal_to(2))
+        assert_that(progress, contains((1, 1), (1, 2), (0, 2)))
+        result = self.session.query(CallLog).all()
+        assert_that(result, contains(call_log))
+
+    def test_delete_by_batch_before(self):
+        now = dt.now()
+        call_log = self.add_call_log(date=now)
+        self.add_call_log(date=now - td(hours=2))
+
+        count = call_log_dao.delete_by_batch(before=now - td(hours=1))
+
+        assert_that(count, equal_to(1))
+        result = self.session.query(CallLog).all()
+        assert_that(result, contains(call_log))
+
+    def test_delete_by_batch_without_bounds(self):
+        self.add_call_log()
+
+        assert_that(calling(call_log_dao.delete_by_batch), raises(ValueError))
+        assert_that(self.session.query(CallLog).all(), has_length(1))
+
+    def test_delete_by_batch_pause_without_commit(self):
+        assert_that(
+            calling(call_log_dao.delete_by_batch).with_args(before=dt.now(), pause=1),
+            raises(ValueError),
+        )
+
     def test_delete_empty(self):
         result = call_log_dao.delete()
         assert_that(result, empty())
@@ -1,13 +1,15 @@
 # -*- coding: utf-8 -*-
-# Copyright 2018-2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2018-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from xivo_dao.helpers.db_manager import daosession
+from xivo_dao.helpers import instrumentation
 
 from .persistor import CallPickupPersistor
 from .search import call_pickup_search
 
 
+@instrumentation.instrumented_persistor
 @daosession
 def _persistor(session, tenant_uuids=None):
     return CallPickupPersistor(session, call_pickup_search, tenant_uuids)
@@ -1,13 +1,17 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2017 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+from sqlalchemy import func
+
 from xivo_dao.helpers.db_manager import daosession
+from xivo_dao.helpers import retention
 from xivo_dao.alchemy.cel import CEL as CELSchema
 
+DEFAULT_BATCH_SIZE = 100
 
-@daosession
-def find_last_unprocessed(session, limit=None, older=None):
+
+def _last_unprocessed_linked_ids(session, limit=None, older=None):
     subquery = (session
                 .query(CELSchema.linkedid)
                 .filter(CELSchema.call_log_id == None)
@@ -17,7 +21,12 @@ def find_last_unprocessed(session, limit=None, older=None):
     elif older:
         subquery = subquery.filter(CELSchema.eventtime >= older)
 
-    linked_ids = subquery.subquery()
+    return subquery.subquery()
+
+
+@daosession
+def find_last_unprocessed(session, limit=None, older=None):
+    linked_ids = _last_unprocessed_linked_ids(session, limit, older)
 
     cel_rows = (session
                 .query(CELSchema)
@@ -28,6 +37,45 @@ def find_last_unprocessed(session, limit=None, older=None):
     return cel_rows
 
 
+@daosession
+def iter_last_unprocessed(session, limit=None, older=None, batch_size=DEFAULT_BATCH_SIZE, raw=False):
+    """Yield (linkedid, cels) for the same calls as find_last_unprocessed
+
+    The linked ids of the calls are fetched first, then the CELs of
+    `batch_size` calls at a time, so the session may be committed between two
+    calls. Calls are yielded by ascending time of their first CEL and their
+    CELs are sorted by ascending eventtime. With `raw`, CELs are plain named
+    tuples instead of ORM objects.
+    """
+    linked_ids = _last_unprocessed_linked_ids(session, limit, older)
+    calls = (session
+             .query(CELSchema.linkedid)
+             .filter(CELSchema.linkedid.in_(linked_ids))
+             .group_by(CELSchema.linkedid)
+             .order_by(func.min(CELSchema.eventtime), CELSchema.linkedid)
+             .all())
+
+    if raw:
+        query = session.query(*CELSchema.__table__.columns)
+    else:
+        query = session.query(CELSchema)
+
+    for start in range(0, len(calls), batch_size):
+        batch = [call.linkedid for call in calls[start:start + batch_size]]
+        cels = (query
+                .filter(CELSchema.linkedid.in_(batch))
+                .order_by(CELSchema.eventtime, CELSchema.id)
+                .all())
+
+        cels_by_linkedid = {}
+        for cel in cels:
+            cels_by_linkedid.setdefault(cel.linkedid, []).append(cel)
+        for linkedid in batch:
+            # the CELs of a call may have been deleted since the linked ids were fetched
+            if linkedid in cels_by_linkedid:
+                yield linkedid, cels_by_linkedid[linkedid]
+
+
 @daosession
 def find_from_linked_id(session, linked_id):
     cel_rows = (session
@@ -36,3 +84,15 @@ def find_from_linked_id(session, linked_id):
                 .order_by(CELSchema.eventtime.asc())
                 .all())
     return cel_rows
+
+
+@daosession
+def delete_by_batch(session, before, batch_size=retention.DEFAULT_BATCH_SIZE, pause=0, progress=None,
+                    commit=False):
+    """Delete the CELs older than `before` in batches and return their count
+
+    `commit` commits the session after each batch and is required by `pause`.
+    """
+    criteria = CELSchema.eventtime < before
+    return retention.delete_in_batches(session, CELSchema.__table__, criteria, batch_size, pause, progress,
+                                       commit=session.commit if commit else None)
@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import datetime
-from hamcrest import assert_that, contains, has_property, contains_inanyorder
+from hamcrest import all_of, assert_that, contains, equal_to, has_property, contains_inanyorder, instance_of, not_
 
 from xivo_dao.alchemy.cel import CEL as CELSchema
 from xivo_dao.alchemy.call_log import CallLog as CallLogSchema
@@ -169,6 +169,56 @@ class TestCELDAO(DAOTestCase):
         assert_that(result, contains(has_property('id', cel_id_1),
                                      has_property('id', cel_id_2)))
 
+    def test_iter_last_unprocessed_groups_cels_by_linkedid(self):
+        now = datetime.datetime.now()
+        cel_id_1 = self.add_cel(eventtime=now - datetime.timedelta(minutes=3), linkedid='1')
+        cel_id_2 = self.add_cel(eventtime=now - datetime.timedelta(minutes=2), linkedid='2')
+        cel_id_3 = self.add_cel(eventtime=now - datetime.timedelta(minutes=1), linkedid='1')
+
+        result = list(cel_dao.iter_last_unprocessed(limit=10, batch_size=1))
+
+        assert_that(result, contains(
+            contains('1', contains(has_property('id', cel_id_1), has_property('id', cel_id_3))),
+            contains('2', contains(has_property('id', cel_id_2))),
+        ))
+
+    def test_iter_last_unprocessed_when_committing_between_calls(self):
+        now = datetime.datetime.now()
+        cel_id_1 = self.add_cel(eventtime=now - datetime.timedelta(minutes=2), linkedid='1')
+        cel_id_2 = self.add_cel(eventtime=now - datetime.timedelta(minutes=1), linkedid='2')
+
+        result = []
+        for linkedid, cels in cel_dao.iter_last_unprocessed(limit=10, batch_size=1):
+            result.append((linkedid, [cel.id for cel in cels]))
+            self.session.commit()
+
+        assert_that(result, contains(
+            contains('1', contains(cel_id_1)),
+            contains('2', contains(cel_id_2)),
+        ))
+
+    def test_iter_last_unprocessed_raw(self):
+        cel_id_1 = self.add_cel(linkedid='1')
+        self._add_processed_cel(linkedid='2')
+
+        result = list(cel_dao.iter_last_unprocessed(limit=1, raw=True))
+
+        assert_that(result, contains(
+            contains('1', contains(all_of(has_property('id', cel_id_1), not_(instance_of(CELSchema))))),
+        ))
+
+    def test_delete_by_batch(self):
+        now = datetime.datetime.now()
+        self.add_cel(eventtime=now - datetime.timedelta(hours=3))
+        self.add_cel(eventtime=now - datetime.timedelta(hours=2))
+        cel_id = self.add_cel(eventtime=now)
+
+        count = cel_dao.delete_by_batch(before=now - datetime.timedelta(hours=1), batch_size=1)
+
+        assert_that(count, equal_to(2))
+        result = self.session.query(CELSchema).all()
+        assert_that(result, contains(has_property('id', cel_id)))
+
     def _add_processed_cel(self, **kwargs):
         call_log_id = self._add_call()
         cel_id = self.add_cel(**kwargs)
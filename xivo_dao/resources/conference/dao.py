@@ -3,11 +3,13 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from xivo_dao.helpers.db_manager import daosession
+from xivo_dao.helpers import instrumentation
 
 from .persistor import ConferencePersistor
 from .search import conference_search
 
 
+@instrumentation.instrumented_persistor
 @daosession
 def _persistor(session, tenant_uuids=None):
     return ConferencePersistor(session, conference_search, tenant_uuids)
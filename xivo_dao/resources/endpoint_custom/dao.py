@@ -1,14 +1,16 @@
 # -*- coding: utf-8 -*-
-# Copyright 2015-2018 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2015-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from xivo_dao.helpers.db_manager import Session
+from xivo_dao.helpers import instrumentation
 from xivo_dao.helpers.db_utils import flush_session
 
 from .persistor import CustomPersistor
 from .search import custom_search
 
 
+@instrumentation.instrumented_persistor
 def persistor(tenant_uuids=None):
     return CustomPersistor(Session, custom_search, tenant_uuids)
 
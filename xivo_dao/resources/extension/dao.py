@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from xivo_dao.alchemy.extension import Extension
 from xivo_dao.helpers.db_manager import Session
+from xivo_dao.helpers import instrumentation
 
 from .database import (
     agent_action_converter,
@@ -15,6 +16,7 @@ from .persistor import ExtensionPersistor
 from xivo_dao.resources.utils.search import SearchResult
 
 
+@instrumentation.instrumented_persistor
 def persistor(tenant_uuids=None):
     return ExtensionPersistor(Session, tenant_uuids)
 
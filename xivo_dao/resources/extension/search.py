@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-# Copyright 2014-2018 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2014-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from xivo_dao.alchemy.extension import Extension
@@ -13,6 +13,7 @@ config = SearchConfig(table=Extension,
                                'feature': Extension.feature,
                                'is_feature': Extension.is_feature,
                                'type': Extension.context_type},
+                      indexed=['exten', 'context'],
                       default_sort='exten')
 
 
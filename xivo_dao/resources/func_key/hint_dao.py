@@ -2,6 +2,8 @@
 # Copyright 2014-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+from collections import defaultdict
+
 from sqlalchemy import (
     and_,
     Integer,
@@ -10,6 +12,7 @@ from sqlalchemy import (
     sql,
 )
 from sqlalchemy.orm import (
+    Query,
     aliased,
     joinedload,
 )
@@ -39,16 +42,34 @@ from xivo_dao.resources.func_key.model import Hint
 
 
 def _find_extenfeatures(session, typeval):
-    return session.query(Extension.exten).filter(and_(
+    return _extenfeatures_query(typeval).with_session(session).scalar()
+
+
+def _extenfeatures_query(typeval):
+    return Query(Extension.exten).filter(and_(
         Extension.context == 'xivo-features',
         Extension.type == 'extenfeatures',
         Extension.typeval == typeval,
-    )).scalar()
+    ))
+
+
+def _filter_context(query, context_column, context):
+    # without a context, the rows of every context are returned with their context
+    if context is None:
+        return query.add_columns(context_column.label('context'))
+    return query.filter(context_column == context)
+
+
+def _by_context(rows, build):
+    rows_by_context = defaultdict(list)
+    for row in rows:
+        rows_by_context[row.context].append(row)
+    return {context: build(context_rows) for context, context_rows in rows_by_context.items()}
 
 
 def _common_filter(query, context):
     user_extension = aliased(Extension)
-    return query.join(
+    query = query.join(
         UserFeatures, FuncKeyMapping.template_id == UserFeatures.func_key_private_template_id,
     ).join(
         UserLine, UserFeatures.id == UserLine.user_id,
@@ -58,13 +79,13 @@ def _common_filter(query, context):
         user_extension, LineExtension.extension_id == user_extension.id,
     ).filter(
         and_(
-            user_extension.context == context,
             UserLine.main_user.is_(True),
             UserLine.main_line.is_(True),
             LineExtension.main_extension.is_(True),
             FuncKeyMapping.blf.is_(True),
         )
     )
+    return _filter_context(query, user_extension.context, context)
 
 
 @daosession
@@ -86,11 +107,30 @@ def user_hints(session, context):
         return tuple()
 
     user_arguments = _list_user_arguments(session, set(item.user_id for item in user_extensions))
+    return _user_hints(user_extensions, user_arguments)
+
+
+@daosession
+def all_user_hints(session):
+    """Returns the user hints of every context, keyed by context"""
+    return _all_user_hints(session)
+
+
+def _all_user_hints(session):
+    user_extensions = _list_user_extensions(session, None)
+    if not user_extensions:
+        return {}
+
+    user_arguments = _list_user_arguments(session, set(item.user_id for item in user_extensions))
+    return _by_context(user_extensions, lambda rows: _user_hints(rows, user_arguments))
+
+
+def _user_hints(user_extensions, user_arguments):
     hints = []
-    for user_id, extension in user_extensions:
-        argument = user_arguments.get(user_id)
+    for row in user_extensions:
+        argument = user_arguments.get(row.user_id)
         if argument:
-            hints.append(Hint(user_id=user_id, extension=extension, argument=argument))
+            hints.append(Hint(user_id=row.user_id, extension=row.extension, argument=argument))
     return tuple(hints)
 
 
@@ -120,10 +160,14 @@ def user_shared_hints(session):
 
 
 def _list_user_extensions(session, context):
-    query = session.query(
+    return _user_extensions_query(context).with_session(session).all()
+
+
+def _user_extensions_query(context):
+    query = Query([
         UserFeatures.id.label('user_id'),
         Extension.exten.label('extension'),
-    ).distinct(
+    ]).distinct(
     ).join(
         UserLine.userfeatures,
     ).join(
@@ -133,21 +177,25 @@ def _list_user_extensions(session, context):
     ).filter(and_(
         UserLine.main_user.is_(True),
         LineExtension.main_extension.is_(True),
-        Extension.context == context,
         UserFeatures.enablehint == 1,
     ))
-    return query.all()
+    return _filter_context(query, Extension.context, context)
 
 
 def _list_user_arguments(session, user_ids):
-    query = session.query(
+    query = _user_arguments_query(user_ids).with_session(session)
+    return {row.user_id: row.argument for row in query}
+
+
+def _user_arguments_query(user_ids):
+    return Query([
         UserFeatures.id.label('user_id'),
         sql.func.string_agg(sql.case([
             (LineFeatures.endpoint_sip_uuid != None, literal_column("'SIP/'") + EndpointSIP.name),
             (LineFeatures.endpoint_sccp_id != None, literal_column("'SCCP/'") + SCCPLine.name),
             (LineFeatures.endpoint_custom_id != None, UserCustom.interface)
         ]), literal_column("'&'")).label('argument'),
-    ).join(
+    ]).join(
         UserLine.userfeatures,
     ).join(
         UserLine.linefeatures,
@@ -163,16 +211,29 @@ def _list_user_arguments(session, user_ids):
         LineFeatures.commented == 0,
     )).group_by(UserFeatures.id)
 
-    return {row.user_id: row.argument for row in query}
-
 
 @daosession
 def conference_hints(session, context):
+    query = _conference_hints_query(context).with_session(session)
+    return _conference_hints(query.all())
+
+
+@daosession
+def all_conference_hints(session):
+    return _all_conference_hints(session)
+
+
+def _all_conference_hints(session):
+    query = _conference_hints_query(None).with_session(session)
+    return _by_context(query, _conference_hints)
+
+
+def _conference_hints_query(context):
     query = (
-        session.query(
+        Query([
             Conference.id.label('conference_id'),
             Extension.exten.label('extension')
-        )
+        ])
         .select_from(Conference)
         .join(FuncKeyDestConference, FuncKeyDestConference.conference_id == Conference.id)
         .join(
@@ -182,95 +243,165 @@ def conference_hints(session, context):
                 Extension.typeval == sql.cast(Conference.id, Unicode)
             )
         )
-        .filter(Extension.context == context)
     )
+    return _filter_context(query, Extension.context, context)
+
 
+def _conference_hints(rows):
     return tuple(
         Hint(conference_id=row.conference_id, extension=row.extension)
-        for row in query.all()
+        for row in rows
     )
 
 
 @daosession
 def service_hints(session, context):
-    query = session.query(
+    return _service_hints(_service_hints_query(context).with_session(session))
+
+
+@daosession
+def all_service_hints(session):
+    return _all_service_hints(session)
+
+
+def _all_service_hints(session):
+    return _by_context(_service_hints_query(None).with_session(session), _service_hints)
+
+
+def _service_hints_query(context):
+    query = Query([
         Extension.exten.label('extension'),
         UserFeatures.id.label('user_id'),
-    ).join(
+    ]).join(
         FuncKeyDestService, FuncKeyDestService.extension_id == Extension.id,
     ).join(
         FuncKeyMapping, FuncKeyDestService.func_key_id == FuncKeyMapping.func_key_id,
     ).filter(Extension.commented == 0)
 
-    query = _common_filter(query, context)
+    return _common_filter(query, context)
+
 
+def _service_hints(rows):
     return tuple(Hint(user_id=row.user_id,
                       extension=row.extension,
                       argument=None)
-                 for row in query)
+                 for row in rows)
 
 
 @daosession
 def forward_hints(session, context):
-    query = session.query(
+    return _user_argument_hints(_forward_hints_query(context).with_session(session))
+
+
+@daosession
+def all_forward_hints(session):
+    return _all_forward_hints(session)
+
+
+def _all_forward_hints(session):
+    return _by_context(_forward_hints_query(None).with_session(session), _user_argument_hints)
+
+
+def _forward_hints_query(context):
+    query = Query([
         Extension.exten.label('extension'),
         UserFeatures.id.label('user_id'),
         FuncKeyDestForward.number.label('argument'),
-    ).join(
+    ]).join(
         FuncKeyDestForward, FuncKeyDestForward.extension_id == Extension.id,
     ).join(
         FuncKeyMapping, FuncKeyDestForward.func_key_id == FuncKeyMapping.func_key_id,
     ).filter(Extension.commented == 0)
 
-    query = _common_filter(query, context)
+    return _common_filter(query, context)
+
 
+def _user_argument_hints(rows):
     return tuple(Hint(user_id=row.user_id,
                       extension=clean_extension(row.extension),
                       argument=row.argument)
-                 for row in query)
+                 for row in rows)
 
 
 @daosession
 def agent_hints(session, context):
-    query = session.query(
+    return _user_argument_hints(_agent_hints_query(context).with_session(session))
+
+
+@daosession
+def all_agent_hints(session):
+    return _all_agent_hints(session)
+
+
+def _all_agent_hints(session):
+    return _by_context(_agent_hints_query(None).with_session(session), _user_argument_hints)
+
+
+def _agent_hints_query(context):
+    query = Query([
         sql.cast(FuncKeyDestAgent.agent_id, Unicode).label('argument'),
         UserFeatures.id.label('user_id'),
         Extension.exten.label('extension'),
-    ).join(
+    ]).join(
         Extension, Extension.id == FuncKeyDestAgent.extension_id,
     ).join(
         FuncKeyMapping, FuncKeyDestAgent.func_key_id == FuncKeyMapping.func_key_id,
     ).filter(Extension.commented == 0)
 
-    query = _common_filter(query, context)
-
-    return tuple(Hint(user_id=row.user_id,
-                      extension=clean_extension(row.extension),
-                      argument=row.argument)
-                 for row in query)
+    return _common_filter(query, context)
 
 
 @daosession
 def custom_hints(session, context):
-    query = session.query(
+    return _custom_hints(_custom_hints_query(context).with_session(session))
+
+
+@daosession
+def all_custom_hints(session):
+    return _all_custom_hints(session)
+
+
+def _all_custom_hints(session):
+    return _by_context(_custom_hints_query(None).with_session(session), _custom_hints)
+
+
+def _custom_hints_query(context):
+    query = Query([
         FuncKeyDestCustom.exten.label('extension'),
-    ).join(
+    ]).join(
         FuncKeyMapping, FuncKeyDestCustom.func_key_id == FuncKeyMapping.func_key_id,
     )
 
-    query = _common_filter(query, context)
+    return _common_filter(query, context)
+
 
+def _custom_hints(rows):
     return tuple(Hint(extension=row.extension)
-                 for row in query)
+                 for row in rows)
 
 
 @daosession
 def bsfilter_hints(session, context):
-    bsfilter_extension = clean_extension(_find_extenfeatures(session, 'bsfilter'))
+    bsfilter_extension = _find_extenfeatures(session, 'bsfilter')
+    query = _bsfilter_hints_query(context).with_session(session)
+    return _bsfilter_hints(bsfilter_extension, query)
+
+
+@daosession
+def all_bsfilter_hints(session):
+    return _all_bsfilter_hints(session)
 
-    query = session.query(
+
+def _all_bsfilter_hints(session):
+    bsfilter_extension = _find_extenfeatures(session, 'bsfilter')
+    query = _bsfilter_hints_query(None).with_session(session)
+    return _by_context(query, lambda rows: _bsfilter_hints(bsfilter_extension, rows))
+
+
+def _bsfilter_hints_query(context):
+    query = Query([
         sql.cast(FuncKeyDestBSFilter.filtermember_id, Unicode).label('argument'),
-    ).join(
+    ]).join(
         Callfiltermember, Callfiltermember.id == FuncKeyDestBSFilter.filtermember_id,
     ).join(
         Callfilter, Callfilter.id == Callfiltermember.callfilterid,
@@ -288,27 +419,58 @@ def bsfilter_hints(session, context):
         LineExtension.main_extension.is_(True),
         Extension.commented == 0,
         Callfilter.commented == 0,
-        Extension.context == context,
     ))
+    return _filter_context(query, Extension.context, context)
+
 
+def _bsfilter_hints(bsfilter_extension, rows):
+    bsfilter_extension = clean_extension(bsfilter_extension)
     return tuple(Hint(extension=bsfilter_extension,
                       argument=row.argument)
-                 for row in query)
+                 for row in rows)
 
 
 @daosession
 def groupmember_hints(session, context):
-    query = (session.query(sql.cast(FuncKeyDestGroupMember.group_id, Unicode).label('argument'),
-                           UserFeatures.id.label('user_id'),
-                           Extension.exten.label('extension'))
+    return _user_argument_hints(_groupmember_hints_query(context).with_session(session))
+
+
+@daosession
+def all_groupmember_hints(session):
+    return _all_groupmember_hints(session)
+
+
+def _all_groupmember_hints(session):
+    return _by_context(_groupmember_hints_query(None).with_session(session), _user_argument_hints)
+
+
+def _groupmember_hints_query(context):
+    query = (Query([sql.cast(FuncKeyDestGroupMember.group_id, Unicode).label('argument'),
+                    UserFeatures.id.label('user_id'),
+                    Extension.exten.label('extension')])
              .join(Extension,
                    Extension.id == FuncKeyDestGroupMember.extension_id)
              .join(FuncKeyMapping,
                    FuncKeyDestGroupMember.func_key_id == FuncKeyMapping.func_key_id)
              .filter(Extension.commented == 0))
-    query = _common_filter(query, context)
+    return _common_filter(query, context)
 
-    return tuple(Hint(user_id=row.user_id,
-                      extension=clean_extension(row.extension),
-                      argument=row.argument)
-                 for row in query)
+
+@daosession
+def all_hints(session):
+    """Returns the hints of every kind and every context in one query per kind
+
+    The result is keyed by kind (user, conference, service, forward, agent,
+    custom, bsfilter and groupmember), then by context. Contexts without
+    hints of a kind are missing from it.
+    """
+    return {
+        'user': _all_user_hints(session),
+        'conference': _all_conference_hints(session),
+        'service': _all_service_hints(session),
+        'forward': _all_forward_hints(session),
+        'agent': _all_agent_hints(session),
+        'custom': _all_custom_hints(session),
+        'bsfilter': _all_bsfilter_hints(session),
+        'groupmember': _all_groupmember_hints(session),
+    }
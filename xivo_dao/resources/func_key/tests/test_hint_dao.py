@@ -13,6 +13,7 @@ from hamcrest import (
     contains_inanyorder,
     empty,
     equal_to,
+    has_entries,
 )
 from hamcrest.core.base_matcher import BaseMatcher
 from hamcrest.core.helpers.wrap_matcher import wrap_matcher
@@ -583,3 +584,61 @@ class TestUserSharedHints(TestHints):
         results = hint_dao.user_shared_hints()
 
         assert_that(results, empty())
+
+
+class TestAllHints(TestHints):
+
+    def test_user_hints_are_grouped_by_context(self):
+        user = self.add_user(enablehint=1)
+        extension1 = self.add_extension(exten='1001', context=self.context.name)
+        extension2 = self.add_extension(exten='1002', context=self.context2.name)
+        self.add_user_destination(user.id)
+        self.add_sip_line_to_extension_and_user('line1', user.id, extension1.id)
+        self.add_sip_line_to_extension_and_user('line2', user.id, extension2.id, main_line=False)
+
+        result = hint_dao.all_user_hints()
+
+        assert_that(result, has_entries({
+            self.context.name: contains(
+                a_hint(user_id=user.id, extension='1001', argument='SIP/line1&SIP/line2'),
+            ),
+            self.context2.name: contains(
+                a_hint(user_id=user.id, extension='1002', argument='SIP/line1&SIP/line2'),
+            ),
+        }))
+
+    def test_user_hints_without_users(self):
+        assert_that(hint_dao.all_user_hints(), equal_to({}))
+
+    def test_service_hints_are_grouped_by_context(self):
+        destination_row = self.create_service_func_key('*25', 'enablednd')
+        user_row = self.add_user_and_func_key()
+        self.add_func_key_to_user(destination_row, user_row)
+
+        result = hint_dao.all_service_hints()
+
+        assert_that(result, equal_to({
+            self.context.name: (Hint(user_id=user_row.id, extension='*25', argument=None),),
+        }))
+
+    def test_all_hints(self):
+        destination_row = self.create_forward_func_key('_*23.', 'fwdbusy', '1234')
+        user_row = self.add_user_and_func_key(self.add_endpoint_sip(name='abcdef').uuid)
+        self.add_func_key_to_user(destination_row, user_row)
+
+        result = hint_dao.all_hints()
+
+        assert_that(result, has_entries(
+            user=has_entries({self.context.name: contains(
+                a_hint(user_id=user_row.id, extension='1000', argument='SIP/abcdef'),
+            )}),
+            forward=has_entries({self.context.name: contains(
+                Hint(user_id=user_row.id, extension='*23', argument='1234'),
+            )}),
+            service={},
+            conference={},
+            agent={},
+            custom={},
+            bsfilter={},
+            groupmember={},
+        ))
@@ -85,7 +85,7 @@ class FuncKeyPersistor(object):
         rows, total = self.template_search.search_from_query(query, parameters)
 
         items = [self.get(row.id) for row in rows]
-        return SearchResult(total=total, items=items)
+        return SearchResult(total=total, items=items, next_after=getattr(rows, 'next_after', None))
 
     def create(self, template):
         template = self.add_template(template)
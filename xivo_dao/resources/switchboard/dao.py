@@ -1,13 +1,15 @@
 # -*- coding: utf-8 -*-
-# Copyright 2016-2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2016-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from xivo_dao.helpers.db_manager import daosession
+from xivo_dao.helpers import instrumentation
 
 from .persistor import SwitchboardPersistor
 from .search import switchboard_search
 
 
+@instrumentation.instrumented_persistor
 @daosession
 def _persistor(session, tenant_uuids=None):
     return SwitchboardPersistor(session, switchboard_search, tenant_uuids=tenant_uuids)
@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import unicode_literals
 
 from xivo_dao.helpers.db_manager import Session
+from xivo_dao.helpers import instrumentation
 
 from xivo_dao.resources.user.persistor import UserPersistor
 from xivo_dao.resources.func_key_template.persistor import build_persistor as build_template_persistor
@@ -13,6 +14,7 @@ from xivo_dao.resources.user.view import user_view
 from xivo_dao.resources.user.fixes import UserFixes
 
 
+@instrumentation.instrumented_persistor
 def persistor(tenant_uuids=None):
     return UserPersistor(Session, user_view, user_search, tenant_uuids)
 
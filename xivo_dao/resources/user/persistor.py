@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-# Copyright 2015-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2015-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from xivo_dao.alchemy.userfeatures import UserFeatures as User
@@ -70,7 +70,7 @@ class UserPersistor(CriteriaBuilderMixin):
             query = query.filter(User.tenant_uuid.in_(self.tenant_uuids))
         rows, total = self.user_search.search_from_query(query, parameters)
         users = view.convert_list(rows)
-        return SearchResult(total, users)
+        return SearchResult(total, users, getattr(rows, 'next_after', None))
 
     def create(self, user):
         self.prepare_template(user)
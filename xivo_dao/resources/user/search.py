@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-# Copyright 2014-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2014-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import six
@@ -49,6 +49,10 @@ config = SearchConfig(table=UserFeatures,
                               'exten',
                               'username',
                               'provisioning_code'],
+                      indexed=['caller_id',
+                               'email',
+                               'exten',
+                               'username'],
                       default_sort='lastname')
 
 
@@ -479,6 +479,30 @@ class TestSearchGivenMultipleUsers(TestSearch):
                                           offset=1,
                                           limit=1)
 
+    def test_when_paginating_after_a_cursor_then_returns_the_following_page(self):
+        tenant_uuids = [self.default_tenant.uuid]
+        first_page = user_dao.search(tenant_uuids=tenant_uuids, order='firstname', after='', limit=3)
+
+        assert_that(first_page, equal_to(SearchResult(4, [self.user1, self.user2, self.user3])))
+        assert_that(first_page.next_after, is_not(none()))
+
+        last_page = user_dao.search(
+            tenant_uuids=tenant_uuids, order='firstname', after=first_page.next_after, limit=3,
+        )
+
+        assert_that(last_page, equal_to(SearchResult(4, [self.user4])))
+        assert_that(last_page.next_after, none())
+
+    def test_when_paginating_a_view_after_a_cursor_then_returns_the_cursor(self):
+        tenant_uuids = [self.default_tenant.uuid]
+        result = user_dao.search(tenant_uuids=tenant_uuids, view='summary', order='firstname', after='', limit=1)
+
+        assert_that(result.items, contains(has_property('id', self.user1.id)))
+        assert_that(result.next_after, is_not(none()))
+
+    def test_when_paginating_after_a_cursor_with_an_offset_then_raises_error(self):
+        self.assertRaises(InputError, user_dao.search, after='', offset=1)
+
 
 class TestSearchMutipleSameCriteria(TestSearch):
     def test_when_multiple_uuid_then_returns_right_number_of_items(self):
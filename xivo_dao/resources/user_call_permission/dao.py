@@ -3,9 +3,11 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from xivo_dao.helpers.db_manager import Session
+from xivo_dao.helpers import instrumentation
 from xivo_dao.resources.user_call_permission.persistor import Persistor
 
 
+@instrumentation.instrumented_persistor
 def persistor():
     return Persistor(Session)
 
@@ -1,14 +1,16 @@
 # -*- coding: utf-8 -*-
-# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2020-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from xivo_dao.helpers.db_manager import Session
+from xivo_dao.helpers import instrumentation
 
 
 from .persistor import UserExternalAppPersistor
 from .search import user_external_app_search
 
 
+@instrumentation.instrumented_persistor
 def _persistor():
     return UserExternalAppPersistor(Session, user_external_app_search)
 
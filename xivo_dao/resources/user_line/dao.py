@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2017 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from xivo_dao.helpers.db_manager import Session
+from xivo_dao.helpers import instrumentation
 from xivo_dao.resources.user_line.persistor import Persistor
 
 
+@instrumentation.instrumented_persistor
 def persistor():
     return Persistor(Session, 'UserLine')
 
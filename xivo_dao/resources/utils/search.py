@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
-# Copyright 2014-2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2014-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import base64
+import json
 import six
 
 from collections import namedtuple
@@ -10,18 +12,76 @@ from unidecode import unidecode
 import sqlalchemy as sa
 
 from sqlalchemy import sql
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import class_mapper
+from sqlalchemy.sql.expression import ClauseElement, Executable
 from sqlalchemy.sql.functions import ReturnTypeFromArgs
 from sqlalchemy.types import Integer
+from sqlalchemy.util import KeyedTuple
 
 from xivo_dao.helpers import errors
+from xivo_dao.helpers.db_manager import has_immutable_unaccent, immutable_unaccent
 
-SearchResult = namedtuple('SearchResult', ['total', 'items'])
+
+class SearchResult(namedtuple('SearchResult', ['total', 'items'])):
+    """Total and items of a search.
+
+    `next_after` is the cursor of the following page when the search was
+    paginated with `after`, see CursorPage. It is not part of the tuple so
+    that `total, items = result` keeps working.
+    """
+
+    def __new__(cls, total, items, next_after=None):
+        result = super(SearchResult, cls).__new__(cls, total, items)
+        if next_after is None:
+            next_after = getattr(items, 'next_after', None)
+        result.next_after = next_after
+        return result
 
 
 class unaccent(ReturnTypeFromArgs):
     pass
 
 
+class _Explain(Executable, ClauseElement):
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain)
+def _compile_explain(element, compiler, **kwargs):
+    return 'EXPLAIN (FORMAT JSON) {}'.format(compiler.process(element.statement, **kwargs))
+
+
+class CursorPage(list):
+    """Rows of a cursor paginated search.
+
+    `next_after` is the opaque token to pass as the `after` parameter to fetch
+    the following page, or None when the last page has been reached.
+    """
+
+    def __init__(self, rows, next_after=None):
+        super(CursorPage, self).__init__(rows)
+        self.next_after = next_after
+
+
+def encode_cursor(sort_value, primary_key):
+    payload = json.dumps([sort_value, list(primary_key)], default=six.text_type)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token):
+    try:
+        payload = base64.urlsafe_b64decode(token.encode('ascii'))
+        sort_value, primary_key = json.loads(payload.decode('utf-8'))
+    except (ValueError, TypeError, UnicodeError):
+        raise errors.wrong_type('after', 'cursor returned by a previous search')
+    if not isinstance(primary_key, list):
+        raise errors.wrong_type('after', 'cursor returned by a previous search')
+    return sort_value, primary_key
+
+
 class CriteriaBuilderMixin(object):
 
     def build_criteria(self, query, criteria):
@@ -39,17 +99,27 @@ class CriteriaBuilderMixin(object):
 
 class SearchConfig(object):
 
-    def __init__(self, table, columns, default_sort, search=None, sort=None):
+    def __init__(self, table, columns, default_sort, search=None, sort=None, indexed=None):
         self.table = table
         self._columns = columns
         self._default_sort = default_sort
         self._search = search
         self._sort = sort
+        self._indexed = indexed or []
 
     def all_search_columns(self):
+        return [self._columns[name] for name in self.all_search_column_names()]
+
+    def all_search_column_names(self):
         if self._search:
-            return [self._columns[s] for s in self._search]
-        return list(self._columns.values())
+            return list(self._search)
+        return list(self._columns.keys())
+
+    def is_indexed(self, column_name):
+        return column_name in self._indexed
+
+    def has_indexed(self):
+        return bool(self._indexed)
 
     def column_for_searching(self, column_name):
         return self._columns.get(column_name)
@@ -67,6 +137,9 @@ class SearchConfig(object):
 
         return name
 
+    def primary_key_columns(self):
+        return list(class_mapper(self.table).primary_key)
+
 
 class SearchSystem(object):
 
@@ -75,12 +148,16 @@ class SearchSystem(object):
         'desc': sql.desc,
     }
 
+    COUNT_MODES = ('exact', 'estimate', 'none')
+
     DEFAULTS = {
         'search': None,
         'order': None,
         'direction': 'asc',
         'limit': None,
-        'offset': 0
+        'offset': 0,
+        'after': None,
+        'count': 'exact',
     }
 
     def __init__(self, config):
@@ -96,10 +173,84 @@ class SearchSystem(object):
 
         query = self._filter(query, parameters['search'])
         query = self._filter_exact_match(query, parameters)
+
+        if parameters['after'] is not None:
+            return self._search_after(query, parameters)
+
         sorted_query = self._sort(query, parameters['order'], parameters['direction'])
         paginated_query = self._paginate(sorted_query, parameters['limit'], parameters['offset'])
 
-        return paginated_query.all(), sorted_query.count()
+        return paginated_query.all(), self._count(sorted_query, parameters['count'])
+
+    def _search_after(self, query, parameters):
+        sort_column = self.config.column_for_sorting(parameters['order'])
+        pk_columns = self.config.primary_key_columns()
+        direction = parameters['direction']
+
+        counted_query = query
+        if parameters['after']:
+            sort_value, pk_value = decode_cursor(parameters['after'])
+            if len(pk_value) != len(pk_columns):
+                raise errors.wrong_type('after', 'cursor returned by a previous search')
+            query = query.filter(self._after_criteria(sort_column, pk_columns, direction, sort_value, pk_value))
+
+        labels = [description['name'] for description in query.column_descriptions]
+        single_entity = len(labels) == 1 and query.column_descriptions[0]['entity'] is query.column_descriptions[0]['expr']
+
+        order = self.SORT_DIRECTIONS[direction]
+        query = (query
+                 .add_columns(sort_column, *pk_columns)
+                 .order_by(order(sort_column), *(order(column) for column in pk_columns)))
+        if parameters['limit']:
+            query = query.limit(parameters['limit'])
+
+        results = query.all()
+        key_length = len(pk_columns) + 1
+        if single_entity:
+            rows = [result[0] for result in results]
+        else:
+            rows = [KeyedTuple(tuple(result)[:-key_length], labels) for result in results]
+
+        next_after = None
+        if results and parameters['limit'] and len(results) == parameters['limit']:
+            last = tuple(results[-1])[-key_length:]
+            next_after = encode_cursor(last[0], last[1:])
+
+        return CursorPage(rows, next_after), self._count(counted_query, parameters['count'])
+
+    def _after_criteria(self, sort_column, pk_columns, direction, sort_value, pk_value):
+        # PostgreSQL sorts NULL values last in ascending order and first in descending order
+        if direction == 'asc':
+            pk_after = sql.tuple_(*pk_columns) > sql.tuple_(*pk_value)
+            if sort_value is None:
+                return sql.and_(sort_column.is_(None), pk_after)
+            return sql.or_(sort_column > sort_value,
+                           sql.and_(sort_column == sort_value, pk_after),
+                           sort_column.is_(None))
+        else:
+            pk_after = sql.tuple_(*pk_columns) < sql.tuple_(*pk_value)
+            if sort_value is None:
+                return sql.or_(sort_column.isnot(None),
+                               sql.and_(sort_column.is_(None), pk_after))
+            return sql.or_(sort_column < sort_value,
+                           sql.and_(sort_column == sort_value, pk_after))
+
+    def _count(self, query, mode):
+        if mode == 'none':
+            return None
+        if mode == 'estimate':
+            return self._estimate_count(query)
+        return query.count()
+
+    def _estimate_count(self, query):
+        session = query.session
+        statement = query.statement
+        # run on the bind of the query itself, e.g. the replica of a RoutingSession
+        bind = session.get_bind(clause=statement)
+        plan = session.execute(_Explain(statement), bind=bind).scalar()
+        if isinstance(plan, six.string_types):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
 
     def _populate_parameters(self, parameters=None):
         new_params = dict(self.DEFAULTS)
@@ -116,17 +267,28 @@ class SearchSystem(object):
         if parameters['limit'] is not None and parameters['limit'] <= 0:
             raise errors.wrong_type('limit', 'positive number')
 
+        if parameters['after'] is not None and parameters['offset']:
+            raise errors.exclusive_parameters('after', 'offset')
+
         if parameters['direction'] not in self.SORT_DIRECTIONS.keys():
             raise errors.invalid_direction(parameters['direction'])
 
+        if parameters['count'] not in self.COUNT_MODES:
+            raise errors.invalid_choice('count', self.COUNT_MODES)
+
     def _filter(self, query, term=None):
         if not term:
             return query
 
         criteria = []
-        for column in self.config.all_search_columns():
-            clean_term = unidecode(term)
-            expression = unaccent(sql.cast(column, sa.String)).ilike('%%%s%%' % clean_term)
+        pattern = '%%%s%%' % unidecode(term)
+        use_indexes = self.config.has_indexed() and has_immutable_unaccent(query.session)
+        for name in self.config.all_search_column_names():
+            column = self.config.column_for_searching(name)
+            if use_indexes and self.config.is_indexed(name):
+                expression = immutable_unaccent(column).ilike(pattern)
+            else:
+                expression = unaccent(sql.cast(column, sa.String)).ilike(pattern)
             criteria.append(expression)
 
         query = query.filter(sql.or_(*criteria))
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-# Copyright 2014-2019 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2014-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import unicode_literals
@@ -13,9 +13,14 @@ from hamcrest import equal_to
 from hamcrest import contains
 from hamcrest import contains_inanyorder
 from hamcrest import has_length
+from hamcrest import instance_of
 from hamcrest import is_in
+from hamcrest import is_not
+from hamcrest import none
 from hamcrest import raises
 
+from sqlalchemy import literal_column
+
 from xivo_dao.tests.test_dao import DAOTestCase
 from xivo_dao.resources.utils.search import SearchConfig
 from xivo_dao.resources.utils.search import SearchSystem
@@ -139,6 +144,103 @@ class TestSearchSystem(DAOTestCase):
         assert_that(total, equal_to(2))
         assert_that(rows, contains(last_user_row))
 
+    def test_given_empty_after_then_returns_first_page_and_cursor(self):
+        user_row1 = self.add_user(lastname='Abigale')
+        user_row2 = self.add_user(lastname='Bob')
+        self.add_user(lastname='Zintrabi')
+
+        rows, total = self.search.search(self.session, {'after': '', 'limit': 2})
+
+        assert_that(total, equal_to(3))
+        assert_that(rows, contains(user_row1, user_row2))
+        assert_that(rows.next_after, is_not(none()))
+
+    def test_given_after_then_returns_rows_following_cursor(self):
+        self.add_user(lastname='Abigale')
+        self.add_user(lastname='Bob')
+        last_user_row = self.add_user(lastname='Zintrabi')
+        first_page, _ = self.search.search(self.session, {'after': '', 'limit': 2})
+
+        rows, total = self.search.search(self.session, {'after': first_page.next_after, 'limit': 2})
+
+        assert_that(total, equal_to(3))
+        assert_that(rows, contains(last_user_row))
+        assert_that(rows.next_after, none())
+
+    def test_given_after_and_equal_sort_values_then_uses_primary_key_as_tie_break(self):
+        user_row1 = self.add_user(lastname='Same')
+        user_row2 = self.add_user(lastname='Same')
+        user_row3 = self.add_user(lastname='Same')
+        first_page, _ = self.search.search(self.session, {'after': '', 'limit': 1})
+
+        rows, _ = self.search.search(self.session, {'after': first_page.next_after})
+
+        assert_that(first_page, contains(user_row1))
+        assert_that(rows, contains(user_row2, user_row3))
+
+    def test_given_after_and_direction_desc_then_returns_rows_following_cursor(self):
+        user_row1 = self.add_user(lastname='Abigale')
+        user_row2 = self.add_user(lastname='Bob')
+        self.add_user(lastname='Zintrabi')
+        first_page, _ = self.search.search(self.session, {'after': '', 'limit': 1, 'direction': 'desc'})
+
+        rows, _ = self.search.search(self.session, {'after': first_page.next_after, 'direction': 'desc'})
+
+        assert_that(rows, contains(user_row2, user_row1))
+
+    def test_given_after_and_null_sort_values_then_pages_through_null_rows(self):
+        user_row1 = self.add_user(userfield='mtl')
+        user_row2 = self.add_user(userfield=None)
+        user_row3 = self.add_user(userfield=None)
+        params = {'after': '', 'limit': 2, 'order': 'userfield'}
+        first_page, _ = self.search.search(self.session, params)
+
+        params['after'] = first_page.next_after
+        rows, _ = self.search.search(self.session, params)
+
+        assert_that(first_page, contains(user_row1, user_row2))
+        assert_that(rows, contains(user_row3))
+
+    def test_given_invalid_after_then_raises_error(self):
+        self.assertRaises(InputError,
+                          self.search.search,
+                          self.session, {'after': 'invalid'})
+
+    def test_given_after_and_offset_then_raises_error(self):
+        self.assertRaises(InputError,
+                          self.search.search,
+                          self.session, {'after': '', 'offset': 1})
+
+    def test_given_count_none_then_total_is_not_computed(self):
+        self.add_user()
+
+        rows, total = self.search.search(self.session, {'count': 'none'})
+
+        assert_that(total, none())
+        assert_that(rows, has_length(1))
+
+    def test_given_count_estimate_then_total_is_estimated(self):
+        self.add_user()
+
+        _, total = self.search.search(self.session, {'count': 'estimate'})
+
+        assert_that(total, instance_of(int))
+
+    def test_given_count_estimate_and_percent_literal_then_total_is_estimated(self):
+        self.add_user(firstname='100%')
+        query = (self.session
+                 .query(UserFeatures)
+                 .filter(UserFeatures.firstname.like(literal_column("'%\\%'"))))
+
+        _, total = self.search.search_from_query(query, {'count': 'estimate', 'search': 'a%b'})
+
+        assert_that(total, instance_of(int))
+
+    def test_given_invalid_count_then_raises_error(self):
+        self.assertRaises(InputError,
+                          self.search.search,
+                          self.session, {'count': 'invalid'})
+
     def test_given_offset_is_zero_then_does_not_offset_rows(self):
         first_user_row = self.add_user(lastname='Abigale')
         last_user_row = self.add_user(lastname='Zintrabi')
@@ -175,6 +277,36 @@ class TestSearchSystem(DAOTestCase):
         assert_that(total, equal_to(2))
         assert_that(rows, contains(user_row2, user_row1))
 
+    def test_given_search_term_and_indexed_column_then_searches_without_accent(self):
+        config = SearchConfig(table=UserFeatures,
+                              columns={'lastname': UserFeatures.lastname,
+                                       'callerid': UserFeatures.callerid},
+                              indexed=['callerid'],
+                              default_sort='lastname')
+        user_row = self.add_user(callerid='"Accênt"')
+        self.add_user(callerid='"Other"')
+
+        rows, total = SearchSystem(config).search(self.session, {'search': 'accent'})
+
+        assert_that(total, equal_to(1))
+        assert_that(rows, contains(user_row))
+
+    def test_given_indexed_column_and_no_immutable_unaccent_then_searches_with_unaccent(self):
+        # databases upgraded by migrations that do not create the function
+        self.session.execute('DROP FUNCTION immutable_unaccent(text) CASCADE')
+        config = SearchConfig(table=UserFeatures,
+                              columns={'lastname': UserFeatures.lastname,
+                                       'callerid': UserFeatures.callerid},
+                              indexed=['callerid'],
+                              default_sort='lastname')
+        user_row = self.add_user(callerid='"Accênt"')
+        self.add_user(callerid='"Other"')
+
+        rows, total = SearchSystem(config).search(self.session, {'search': 'accent'})
+
+        assert_that(total, equal_to(1))
+        assert_that(rows, contains(user_row))
+
     def test_given_search_term_then_searches_in_numeric_columns(self):
         self.add_user(simultcalls=1)
         user_row2 = self.add_user(simultcalls=2)
@@ -279,6 +411,15 @@ class TestSearchConfig(unittest.TestCase):
 
         assert_that(result, contains_inanyorder(column1, column2))
 
+    def test_given_list_of_indexed_columns_then_column_is_indexed(self):
+        config = SearchConfig(table=Mock(),
+                              columns={'column1': Mock(), 'column2': Mock()},
+                              indexed=['column1'],
+                              default_sort='column1')
+
+        assert_that(config.is_indexed('column1'), equal_to(True))
+        assert_that(config.is_indexed('column2'), equal_to(False))
+
     def test_that_column_for_searching_results_the_column(self):
         table = Mock()
         column1 = Mock()
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import six
 
+from datetime import timedelta
+
 from xivo_dao.alchemy.stat_agent_periodic import StatAgentPeriodic
+from xivo_dao.helpers.db_utils import bulk_insert
 
 
 def insert_stats(session, period_stats, period_start):
@@ -20,9 +23,34 @@ def insert_stats(session, period_stats, period_start):
         session.add(entry)
 
 
+def bulk_insert_stats(session, stats_by_period):
+    """Same as insert_stats for many periods, without the unit of work
+
+    `stats_by_period` maps a period start to the period stats given to insert_stats.
+    """
+    zero = timedelta(0)
+    rows = [
+        {
+            'time': period_start,
+            'login_time': times.get('login_time', zero),
+            'pause_time': times.get('pause_time', zero),
+            'wrapup_time': times.get('wrapup_time', zero),
+            'stat_agent_id': agent_id,
+        }
+        for period_start, period_stats in six.iteritems(stats_by_period)
+        for agent_id, times in six.iteritems(period_stats)
+    ]
+    bulk_insert(session, StatAgentPeriodic.__table__, rows)
+
+
 def clean_table(session):
     session.query(StatAgentPeriodic).delete()
 
 
 def remove_after(session, date):
     session.query(StatAgentPeriodic).filter(StatAgentPeriodic.time >= date).delete()
+
+
+def bulk_remove_after(session, date):
+    table = StatAgentPeriodic.__table__
+    session.execute(table.delete().where(table.c.time >= date))
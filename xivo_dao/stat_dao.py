@@ -1,33 +1,20 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import six
 
+from sqlalchemy import func
 from sqlalchemy.sql import text
 
-_STR_TIME_FMT = "%Y-%m-%d %H:%M:%S.%f%z"
+from xivo_dao.alchemy.queue_log import QueueLog
+from xivo_dao.alchemy.stat_watermark import StatWatermark
 
-FILL_ANSWERED_CALL_ON_QUEUE_QUERY = text('''\n
+_FILL_ANSWERED_CALL_ON_QUEUE_TEMPLATE = '''\n
 INSERT INTO stat_call_on_queue (callid, "time", talktime, waittime, stat_queue_id, stat_agent_id, status)
 (
     WITH
-    call_entries AS (
-        SELECT
-            callid, queuename, agent, time, event, data1, data2, data3, data4, data5
-        FROM
-            queue_log
-        WHERE
-            time BETWEEN :start AND :end
-    ),
-    call_start AS (
-        SELECT
-            callid, queuename, time
-        FROM
-            call_entries
-        WHERE
-            event = 'ENTERQUEUE'
-    ),
+    {call_entries},
     call_end AS (
         SELECT
             callid, queuename, agent, time,
@@ -112,8 +99,90 @@ INSERT INTO stat_call_on_queue (callid, "time", talktime, waittime, stat_queue_i
     ORDER BY
         all_calls.time
 )
+'''
+
+FILL_ANSWERED_CALL_ON_QUEUE_QUERY = text(_FILL_ANSWERED_CALL_ON_QUEUE_TEMPLATE.format(call_entries='''\
+call_entries AS (
+        SELECT
+            callid, queuename, agent, time, event, data1, data2, data3, data4, data5
+        FROM
+            queue_log
+        WHERE
+            time BETWEEN :start AND :end
+    ),
+    call_start AS (
+        SELECT
+            callid, queuename, time
+        FROM
+            call_entries
+        WHERE
+            event = 'ENTERQUEUE'
+    )'''))
+
+# The ENTERQUEUE of a call ending after the watermark may have been processed by a previous run
+FILL_ANSWERED_CALL_ON_QUEUE_SINCE_QUERY = text(_FILL_ANSWERED_CALL_ON_QUEUE_TEMPLATE.format(call_entries='''\
+call_entries AS (
+        SELECT
+            callid, queuename, agent, time, event, data1, data2, data3, data4, data5
+        FROM
+            queue_log
+        WHERE
+            id > :last_id AND id <= :max_id
+    ),
+    call_start AS (
+        SELECT
+            callid, queuename, time
+        FROM
+            queue_log
+        WHERE
+            event = 'ENTERQUEUE'
+            AND callid IN (SELECT callid FROM call_entries)
+    )'''))
+
+# WARNING: these queries should always match the functions of the same name in xivo-manage-db
+FILL_SIMPLE_CALLS_SINCE_QUERY = text('''\
+INSERT INTO stat_call_on_queue (callid, "time", stat_queue_id, status)
+  SELECT
+    callid,
+    time,
+    (SELECT id FROM stat_queue WHERE name=queuename) as stat_queue_id,
+    CASE WHEN event = 'FULL' THEN 'full'::call_exit_type
+         WHEN event = 'DIVERT_CA_RATIO' THEN 'divert_ca_ratio'
+         WHEN event = 'DIVERT_HOLDTIME' THEN 'divert_waittime'
+         WHEN event = 'CLOSED' THEN 'closed'
+         WHEN event = 'JOINEMPTY' THEN 'joinempty'
+    END as status
+  FROM queue_log
+  WHERE event IN ('FULL', 'DIVERT_CA_RATIO', 'DIVERT_HOLDTIME', 'CLOSED', 'JOINEMPTY') AND
+        id > :last_id AND id <= :max_id
 ''')
 
+FILL_LEAVEEMPTY_CALLS_SINCE_QUERY = text('''\
+INSERT INTO stat_call_on_queue (callid, "time", waittime, stat_queue_id, status)
+  SELECT
+    enter_queue.callid,
+    enter_queue.time,
+    EXTRACT(EPOCH FROM (leave_empty.time - enter_queue.time))::INTEGER as waittime,
+    (SELECT id FROM stat_queue WHERE name=enter_queue.queuename) AS stat_queue_id,
+    'leaveempty' AS status
+  FROM queue_log AS leave_empty
+  INNER JOIN queue_log AS enter_queue
+    ON enter_queue.callid = leave_empty.callid
+    AND enter_queue.event = 'ENTERQUEUE'
+  WHERE leave_empty.event = 'LEAVEEMPTY' AND
+        leave_empty.id > :last_id AND leave_empty.id <= :max_id
+''')
+
+# the last queue_log id and the transactions running, as seen by the same snapshot
+_QUEUE_LOG_STATE_QUERY = text('''\
+SELECT
+  (SELECT max(id) FROM queue_log) AS max_id,
+  txid_snapshot_xmax(txid_current_snapshot()) AS next_txid,
+  (SELECT min(txid) FROM txid_snapshot_xip(txid_current_snapshot()) AS txid) AS oldest_running_txid
+''')
+
+CALLS_WATERMARK = 'stat_call_on_queue'
+
 
 def fill_simple_calls(session, start, end):
     _run_sql_function_returning_void(
@@ -125,8 +194,8 @@ def fill_simple_calls(session, start, end):
 
 def fill_answered_calls(session, start, end):
     params = {
-        'start': start.strftime(_STR_TIME_FMT),
-        'end': end.strftime(_STR_TIME_FMT),
+        'start': start,
+        'end': end,
     }
 
     session.execute(FILL_ANSWERED_CALL_ON_QUEUE_QUERY, params)
@@ -140,10 +209,62 @@ def fill_leaveempty_calls(session, start, end):
     )
 
 
-def _run_sql_function_returning_void(session, start, end, function):
-    start = start.strftime(_STR_TIME_FMT)
-    end = end.strftime(_STR_TIME_FMT)
+def fill_calls_since_watermark(session):
+    """Fill stat_call_on_queue from the queue_log rows added since the last run
+
+    The watermark row is locked until the end of the transaction and only moves
+    with the inserted calls, so a run that fails is simply retried from the
+    previous watermark. Returns the new watermark.
+
+    The ids are drawn from a sequence before the rows are committed, so a row
+    with a lower id than the visible ones may still be committed by a running
+    transaction. The watermark only moves past the ids seen while no other
+    transaction was running or, otherwise, past the ids seen by the previous
+    run once every transaction running at that time has ended.
+    """
+    watermark = _lock_watermark(session, CALLS_WATERMARK)
+    last_id = watermark.queue_log_id
+    state = session.execute(_QUEUE_LOG_STATE_QUERY).first()
+
+    if state.oldest_running_txid is None:
+        max_id = state.max_id or 0
+    elif watermark.pending_txid is not None and state.oldest_running_txid >= watermark.pending_txid:
+        max_id = watermark.pending_queue_log_id
+    else:
+        max_id = last_id
+    watermark.pending_queue_log_id = state.max_id or 0
+    watermark.pending_txid = state.next_txid
+
+    if max_id > last_id:
+        params = {'last_id': last_id, 'max_id': max_id}
+        session.execute(FILL_SIMPLE_CALLS_SINCE_QUERY, params)
+        session.execute(FILL_ANSWERED_CALL_ON_QUEUE_SINCE_QUERY, params)
+        session.execute(FILL_LEAVEEMPTY_CALLS_SINCE_QUERY, params)
+        watermark.queue_log_id = max_id
+
+    session.flush()
+    return watermark.queue_log_id
+
+
+def set_calls_watermark(session, queue_log_id=None):
+    """Move the watermark, e.g. to the last queue_log row after a full regeneration"""
+    watermark = _lock_watermark(session, CALLS_WATERMARK)
+    if queue_log_id is None:
+        queue_log_id = session.query(func.max(QueueLog.id)).scalar() or 0
+    watermark.queue_log_id = queue_log_id
+    session.flush()
+
+
+def _lock_watermark(session, name):
+    watermark = session.query(StatWatermark).filter(StatWatermark.name == name).with_for_update().first()
+    if watermark is None:
+        watermark = StatWatermark(name=name, queue_log_id=0)
+        session.add(watermark)
+        session.flush()
+    return watermark
 
+
+def _run_sql_function_returning_void(session, start, end, function):
     (session
      .query('place_holder')
      .from_statement(text(function))
@@ -152,32 +273,38 @@ def _run_sql_function_returning_void(session, start, end, function):
 
 
 def get_pause_intervals_in_range(session, start, end):
+    # the next UNPAUSEALL of a PAUSEALL is the earliest one among the rows
+    # that follow it; pauses still open at :end are closed by a lookup past :end
     pause_in_range = '''\
+WITH pause_events AS (
+  SELECT agent, time, event,
+    MIN(CASE WHEN event = 'UNPAUSEALL' THEN time END) OVER (
+      PARTITION BY agent
+      ORDER BY time DESC, event = 'PAUSEALL' DESC
+    ) AS unpauseall
+  FROM queue_log
+  WHERE event IN ('PAUSEALL', 'UNPAUSEALL')
+  AND time >= :start
+  AND time <= :end
+)
 SELECT stat_agent.id AS agent,
-       MIN(pauseall) AS pauseall,
-       unpauseall
-  FROM (
-    SELECT agent, time AS pauseall,
-      (
-        SELECT time
-        FROM queue_log
-        WHERE event = 'UNPAUSEALL' AND
-          agent = pause_all.agent AND
-          time > pause_all.time
-        ORDER BY time ASC limit 1
-      ) AS unpauseall
-    FROM queue_log AS pause_all
-    WHERE event = 'PAUSEALL'
-    AND time >= :start
-    ORDER BY agent, time DESC
-  ) AS pauseall, stat_agent
-  WHERE stat_agent.name = agent
-  GROUP BY stat_agent.id, unpauseall
+       MIN(pause_events.time) AS pauseall,
+       COALESCE(
+         pause_events.unpauseall,
+         (
+           SELECT MIN(time)
+           FROM queue_log
+           WHERE event = 'UNPAUSEALL' AND
+             agent = pause_events.agent AND
+             time > :end
+         )
+       ) AS unpauseall
+  FROM pause_events
+  INNER JOIN stat_agent ON stat_agent.name = pause_events.agent
+  WHERE pause_events.event = 'PAUSEALL'
+  GROUP BY stat_agent.id, pause_events.agent, pause_events.unpauseall
 '''
 
-    start = start.strftime(_STR_TIME_FMT)
-    end = end.strftime(_STR_TIME_FMT)
-
     rows = (session
             .query('agent', 'pauseall', 'unpauseall')
             .from_statement(text(pause_in_range))
@@ -306,12 +433,9 @@ ORDER BY
     agent_logins.agent, agent_logins.logout_timestamp
 '''
 
-    formatted_start = start.strftime(_STR_TIME_FMT)
-    formatted_end = end.strftime(_STR_TIME_FMT)
-
     rows = (session.query('agent', 'login_timestamp', 'logout_timestamp')
             .from_statement(text(completed_logins_query))
-            .params(start=formatted_start, end=formatted_end))
+            .params(start=start, end=end))
 
     results = {}
 
@@ -370,9 +494,6 @@ HAVING
   MAX(case when event like '%LOGIN' then time end) < :end
 '''
 
-    start = start.strftime(_STR_TIME_FMT)
-    end = end.strftime(_STR_TIME_FMT)
-
     rows = session.query(
         'agent',
         'login',
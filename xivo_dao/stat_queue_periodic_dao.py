@@ -1,12 +1,25 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import six
 
 from xivo_dao.alchemy.stat_queue_periodic import StatQueuePeriodic
+from xivo_dao.helpers.db_utils import bulk_insert
 from sqlalchemy.sql.functions import max
 
+_COUNTERS = (
+    'abandoned',
+    'answered',
+    'full',
+    'joinempty',
+    'leaveempty',
+    'closed',
+    'timeout',
+    'divert_ca_ratio',
+    'divert_waittime',
+)
+
 
 def insert_stats(session, stats, period_start):
     for queue_id, queue_stats in six.iteritems(stats):
@@ -27,6 +40,20 @@ def insert_stats(session, stats, period_start):
         session.add(entry)
 
 
+def bulk_insert_stats(session, stats_by_period):
+    """Same as insert_stats for many periods, without the unit of work
+
+    `stats_by_period` maps a period start to the stats given to insert_stats.
+    """
+    rows = []
+    for period_start, stats in six.iteritems(stats_by_period):
+        for queue_id, queue_stats in six.iteritems(stats):
+            row = {counter: queue_stats.get(counter, 0) for counter in _COUNTERS}
+            row.update(time=period_start, total=queue_stats['total'], stat_queue_id=queue_id)
+            rows.append(row)
+    bulk_insert(session, StatQueuePeriodic.__table__, rows)
+
+
 def get_most_recent_time(session):
     res = session.query(max(StatQueuePeriodic.time)).first()[0]
     if res is None:
@@ -40,3 +67,8 @@ def clean_table(session):
 
 def remove_after(session, date):
     session.query(StatQueuePeriodic).filter(StatQueuePeriodic.time >= date).delete()
+
+
+def bulk_remove_after(session, date):
+    table = StatQueuePeriodic.__table__
+    session.execute(table.delete().where(table.c.time >= date))
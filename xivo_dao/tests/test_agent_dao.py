@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from hamcrest import assert_that, equal_to
+from hamcrest import assert_that, contains, equal_to
 
 from xivo_dao import agent_dao
 from xivo_dao.alchemy.agentfeatures import AgentFeatures
@@ -86,6 +86,37 @@ class TestAgentDAO(DAOTestCase):
 
         assert_that(result.id, equal_to(agent.id))
 
+    def test_agents_with_queues(self):
+        agent1 = self._insert_agent(self.agent1_number)
+        agent2 = self._insert_agent(self.agent2_number)
+        queue1 = self._insert_queue(64, 'queue1')
+        queue2 = self._insert_queue(65, 'queue2')
+        self._insert_queue_member(queue1.name, 'Agent/1001', agent1.id, penalty=1)
+        self._insert_queue_member(queue2.name, 'Agent/1001', agent1.id, penalty=2)
+        self._insert_queue_member('unknown', 'Agent/1001', agent1.id)
+
+        result = agent_dao.agents_with_queues()
+
+        assert_that(result, contains(
+            agent_dao._Agent(agent1.id, agent1.tenant_uuid, agent1.number, [
+                agent_dao._Queue(queue1.id, queue1.tenant_uuid, queue1.name, 1),
+                agent_dao._Queue(queue2.id, queue2.tenant_uuid, queue2.name, 2),
+            ]),
+            agent_dao._Agent(agent2.id, agent2.tenant_uuid, agent2.number, []),
+        ))
+
+    def test_agents_with_queues_filtered(self):
+        tenant = self.add_tenant()
+        agent1 = self._insert_agent(self.agent1_number)
+        agent2 = self._insert_agent(self.agent2_number)
+        agent3 = self._insert_agent(self.agent_number, tenant_uuid=tenant.uuid)
+
+        result = agent_dao.agents_with_queues(ids=[agent1.id, agent3.id])
+        assert_that([agent.id for agent in result], contains(agent1.id, agent3.id))
+
+        result = agent_dao.agents_with_queues(tenant_uuids=[self.default_tenant.uuid])
+        assert_that([agent.id for agent in result], contains(agent1.id, agent2.id))
+
     def test_get(self):
         agent = self._insert_agent()
 
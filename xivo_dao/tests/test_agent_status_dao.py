@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from xivo_dao import agent_status_dao
@@ -8,6 +8,7 @@ from xivo_dao.alchemy.agent_login_status import AgentLoginStatus
 from xivo_dao.alchemy.agent_membership_status import AgentMembershipStatus
 from xivo_dao.alchemy.queuefeatures import QueueFeatures
 from xivo_dao.alchemy.queuemember import QueueMember
+from xivo_dao.helpers import agent_status_registry
 from sqlalchemy import and_
 
 
@@ -413,6 +414,87 @@ class TestAgentStatusDao(DAOTestCase):
         self.assertEqual(agent2_status.queues[1].id, 2)
         self.assertEqual(agent2_status.queues[1].name, 'queue2')
 
+    def test_log_in_agents(self):
+        agent1 = self.add_agent()
+        agent2 = self.add_agent()
+        self._insert_agent_membership(agent2.id, 1, 'queue1')
+        agents = [
+            {
+                'agent_id': agent1.id,
+                'agent_number': agent1.number,
+                'extension': '1001',
+                'context': 'default',
+                'interface': 'Local/1001@default',
+                'state_interface': 'SIP/abcdef',
+            },
+            {
+                'agent_id': agent2.id,
+                'agent_number': agent2.number,
+                'extension': '1002',
+                'context': 'default',
+                'interface': 'Local/1002@default',
+                'state_interface': 'SIP/ghijkl',
+            },
+        ]
+
+        statuses = agent_status_dao.log_in_agents(agents)
+
+        self.assertEqual(len(statuses), 2)
+        self.assertEqual(statuses[0].agent_id, agent1.id)
+        self.assertEqual(statuses[0].extension, '1001')
+        self.assertEqual(statuses[0].paused, False)
+        self.assertNotEqual(statuses[0].login_at, None)
+        self.assertEqual(statuses[0].queues, [])
+        self.assertEqual(statuses[1].agent_id, agent2.id)
+        self.assertEqual(statuses[1].queues, [agent_status_dao._Queue(1, 'queue1', 0)])
+        self.assertEqual(agent_status_dao.get_status(agent2.id).interface, 'Local/1002@default')
+
+    def test_log_in_agents_without_agents(self):
+        self.assertEqual(agent_status_dao.log_in_agents([]), [])
+
+    def test_log_off_agents(self):
+        self._insert_agent_login_status(1, '41')
+        self._insert_agent_login_status(2, '42')
+        self._insert_agent_login_status(3, '43')
+
+        logged_off = agent_status_dao.log_off_agents([1, 3, 4])
+
+        self.assertEqual(sorted(logged_off), [1, 3])
+        self.assertEqual(agent_status_dao.get_logged_agent_ids(), [2])
+
+    def test_set_memberships(self):
+        agent = self.add_agent()
+        self._insert_agent_membership(agent.id, 1, 'queue1', 1)
+        self._insert_agent_membership(agent.id, 2, 'queue2', 2)
+        self._insert_agent_membership(42, 1, 'queue1', 1)
+        queues = [
+            agent_status_dao._Queue(2, 'queue2', 5),
+            agent_status_dao._Queue(3, 'queue3', 3),
+        ]
+
+        agent_status_dao.set_memberships(agent.id, queues)
+
+        memberships = (self.session
+                       .query(AgentMembershipStatus.queue_id, AgentMembershipStatus.penalty)
+                       .filter(AgentMembershipStatus.agent_id == agent.id)
+                       .order_by(AgentMembershipStatus.queue_id)
+                       .all())
+        self.assertEqual(memberships, [(2, 5), (3, 3)])
+        other_memberships = (self.session
+                             .query(AgentMembershipStatus)
+                             .filter(AgentMembershipStatus.agent_id == 42)
+                             .count())
+        self.assertEqual(other_memberships, 1)
+
+    def test_set_memberships_without_queues(self):
+        agent = self.add_agent()
+        self._insert_agent_membership(agent.id, 1, 'queue1')
+
+        agent_status_dao.set_memberships(agent.id, [])
+
+        count = self.session.query(AgentMembershipStatus).count()
+        self.assertEqual(count, 0)
+
     def test_remove_agent_from_queues_one_queue(self):
         agent = self.add_agent()
         self._insert_agent_membership(agent.id, 1, 'queue1')
@@ -553,3 +635,64 @@ class TestAgentStatusDao(DAOTestCase):
         queue_member.category = 'queue'
 
         self.add_me(queue_member)
+
+
+class TestAgentStatusDaoWithRegistry(TestAgentStatusDao):
+
+    def setUp(self):
+        super(TestAgentStatusDaoWithRegistry, self).setUp()
+        agent_status_registry.enable()
+
+    def tearDown(self):
+        agent_status_registry.disable()
+        super(TestAgentStatusDaoWithRegistry, self).tearDown()
+
+    def test_lookups_are_served_by_the_registry(self):
+        agent = self.add_agent()
+        self._insert_agent_login_status(agent.id, agent.number, extension='1001')
+        self._insert_agent_membership(agent.id, 1, 'queue1')
+        agent_status_registry.clear_pending(self.session)
+
+        agent_status_dao.get_status(agent.id)
+        (self.session
+         .query(AgentLoginStatus)
+         .filter(AgentLoginStatus.agent_id == agent.id)
+         .update({'paused': True}))
+
+        self.assertEqual(agent_status_dao.get_status(agent.id).paused, False)
+        self.assertEqual(agent_status_dao.get_status_by_number(agent.number).agent_id, agent.id)
+        self.assertEqual(agent_status_dao.get_agent_id_from_extension('1001', 'default'), agent.id)
+        self.assertEqual(len(agent_status_dao.get_status(agent.id).queues), 1)
+
+        agent_status_registry.registry.invalidate([agent.id])
+
+        self.assertEqual(agent_status_dao.get_status(agent.id).paused, True)
+
+    def test_uncommitted_changes_bypass_the_registry(self):
+        agent = self.add_agent()
+        self._insert_agent_login_status(agent.id, agent.number)
+        agent_status_registry.clear_pending(self.session)
+        agent_status_dao.get_status(agent.id)
+
+        agent_status_dao.update_pause_status(agent.id, True, 'lunch')
+
+        self.assertEqual(agent_status_dao.get_status(agent.id).paused_reason, 'lunch')
+
+
+class TestAgentStatusDaoNotifications(DAOTestCase):
+
+    def tearDown(self):
+        agent_status_registry.disable_notifications()
+        super(TestAgentStatusDaoNotifications, self).tearDown()
+
+    def test_writes_are_not_notified_by_default(self):
+        agent_status_dao.log_in_agent(1, '2', '1001', 'default', 'sip/abcdef', 'sip/abcdef')
+
+        self.assertFalse(agent_status_registry.is_pending(self.session))
+
+    def test_writes_are_notified_when_enabled(self):
+        agent_status_registry.enable_notifications()
+
+        agent_status_dao.log_in_agent(1, '2', '1001', 'default', 'sip/abcdef', 'sip/abcdef')
+
+        self.assertTrue(agent_status_registry.is_pending(self.session))
@@ -4,6 +4,7 @@
 
 from __future__ import unicode_literals
 
+import json
 import warnings
 
 from contextlib import contextmanager
@@ -15,6 +16,7 @@ from hamcrest import (
     empty,
     equal_to,
     has_entries,
+    has_key,
     has_items,
     has_properties,
     not_,
@@ -23,7 +25,9 @@ from hamcrest import (
 from mock import patch
 from xivo_test_helpers.hamcrest.uuid_ import uuid_
 from xivo_dao import asterisk_conf_dao
+from xivo_dao.helpers import sip_template_cache
 from xivo_dao.alchemy.agentqueueskill import AgentQueueSkill
+from xivo_dao.alchemy.endpoint_sip import EndpointSIP
 from xivo_dao.alchemy.iaxcallnumberlimits import IAXCallNumberLimits
 from xivo_dao.alchemy.queuepenalty import QueuePenalty
 from xivo_dao.alchemy.queuepenaltychange import QueuePenaltyChange
@@ -199,6 +203,39 @@ class TestSCCPLineSettingDAO(DAOTestCase, PickupHelperMixin):
             ),
         ))
 
+    def test_find_sccp_line_settings_json(self):
+        number = '1234'
+        sccp_line = self.add_sccpline(cid_num=number, allow='g729')
+        ule = self.add_user_line_with_exten(endpoint_sccp_id=sccp_line.id, exten=number)
+        pickup = self.add_pickup()
+        category = self.add_pickup_member_user(pickup, ule.user_id)
+
+        sccp_lines = json.loads(asterisk_conf_dao.find_sccp_line_settings_json().decode('utf-8'))
+
+        assert_that(sccp_lines, contains(
+            all_of(
+                has_entries({
+                    'id': sccp_line.id,
+                    'user_id': ule.user_id,
+                    'name': sccp_line.name,
+                    'language': None,
+                    'number': number,
+                    'context': 'foocontext',
+                    'allow': 'g729',
+                    category: contains(pickup.id),
+                }),
+                not_(has_key('disallow')),
+            ),
+        ))
+
+    def test_find_sccp_line_settings_json_when_line_disabled(self):
+        sccp_line = self.add_sccpline()
+        self.add_user_line_with_exten(endpoint_sccp_id=sccp_line.id, commented_line=1)
+
+        sccp_lines = asterisk_conf_dao.find_sccp_line_settings_json()
+
+        assert_that(json.loads(sccp_lines.decode('utf-8')), empty())
+
 
 class TestSccpConfDAO(DAOTestCase):
 
@@ -405,6 +442,34 @@ class TestAsteriskConfDAO(DAOTestCase, PickupHelperMixin):
             {sip.uuid: {category: set([pickup.id])}}
         ))
 
+    def test_find_all_pickup_members(self):
+        pickup = self.add_pickup()
+
+        sip = self.add_endpoint_sip()
+        sip_ule = self.add_user_line_with_exten(endpoint_sip_uuid=sip.uuid)
+        sip_category = self.add_pickup_member_user(pickup, sip_ule.user_id)
+        sccp_line = self.add_sccpline()
+        sccp_ule = self.add_user_line_with_exten(endpoint_sccp_id=sccp_line.id)
+        sccp_category = self.add_pickup_member_group(pickup, sccp_ule.user_id, category='pickup')
+
+        pickup_members = asterisk_conf_dao.find_all_pickup_members()
+
+        assert_that(pickup_members, equal_to({
+            'sip': {sip.uuid: {sip_category: set([pickup.id])}},
+            'sccp': {sccp_line.id: {sccp_category: set([pickup.id])}},
+            'custom': {},
+        }))
+
+    @patch('xivo_dao.asterisk_conf_dao.find_all_pickup_members')
+    def test_reload_context_computes_pickup_members_once(self, find_all_pickup_members):
+        find_all_pickup_members.return_value = {'sip': {}, 'sccp': {}, 'custom': {}}
+        reload_context = asterisk_conf_dao.ReloadContext()
+
+        list(asterisk_conf_dao.find_sccp_line_settings(reload_context=reload_context))
+        asterisk_conf_dao.find_sip_user_settings(reload_context=reload_context)
+
+        find_all_pickup_members.assert_called_once_with()
+
     def test_find_features_settings(self):
         self.add_features(var_name='atxfernoanswertimeout', var_val='15')
         self.add_features(var_name='parkext', var_val='700')
@@ -820,6 +885,32 @@ class TestAsteriskConfDAO(DAOTestCase, PickupHelperMixin):
             ),
         ))
 
+    def test_find_iax_calllimits_settings_json(self):
+        iax_call_number_limits = IAXCallNumberLimits(
+            destination='toto',
+            netmask='',
+            calllimits=5,
+        )
+        self.add_me(iax_call_number_limits)
+
+        iax_settings = asterisk_conf_dao.find_iax_calllimits_settings_json()
+
+        assert_that(json.loads(iax_settings.decode('utf-8')), contains(
+            iax_call_number_limits.todict(),
+        ))
+
+    def test_find_queue_settings_json(self):
+        queue2 = self.add_queue(name='queue2')
+        queue1 = self.add_queue(name='queue1')
+        self.add_queue(name='disabled', commented=1)
+
+        queues = asterisk_conf_dao.find_queue_settings_json()
+
+        assert_that(json.loads(queues.decode('utf-8')), contains(
+            queue1.todict(),
+            queue2.todict(),
+        ))
+
     def test_find_queue_settings(self):
         queue1 = self.add_queue()
 
@@ -980,6 +1071,42 @@ class TestAsteriskConfDAO(DAOTestCase, PickupHelperMixin):
             ),
         ))
 
+    def test_find_all_queue_members_settings(self):
+        user = self.add_user()
+        self.add_queue_member(
+            queue_name='toto', interface='SCCP/1003', usertype='user',
+            userid=1, penalty=15, commented=0, position=2,
+        )
+        self.add_queue_member(
+            queue_name='toto', interface='SIP/3m6dsc', usertype='user',
+            userid=54, penalty=5, commented=0, position=1,
+        )
+        self.add_queue_member(
+            queue_name='toto', interface='SIP/dsf4rs', usertype='user',
+            userid=3, penalty=42, commented=1, position=3,
+        )
+        self.add_queue_member(
+            queue_name='group', interface='ignored', usertype='user',
+            userid=user.id, category='group', penalty=0, commented=0,
+        )
+
+        result = asterisk_conf_dao.find_all_queue_members_settings()
+
+        assert_that(result, has_entries(
+            toto=contains(
+                contains('PJSIP/3m6dsc', '5', '', ''),
+                contains('SCCP/1003', '15', '', ''),
+            ),
+            group=contains(
+                contains(
+                    'Local/{}@usersharedlines'.format(user.uuid),
+                    '0',
+                    '',
+                    'hint:{}@usersharedlines'.format(user.uuid),
+                ),
+            ),
+        ))
+
     def test_find_agent_queue_skills_settings(self):
         agent1 = self.add_agent()
         queue_skill1 = self.add_queue_skill()
@@ -1908,3 +2035,107 @@ class TestFindSipTrunkSettings(BaseFindSIPSettings):
                 )
             )
         )
+
+
+class TestFindSipSettingsSince(BaseFindSIPSettings):
+
+    def _forget_changes(self):
+        self.session.query(EndpointSIP).update({'change_txid': 0}, synchronize_session=False)
+
+    def test_given_no_marker_then_returns_every_endpoint(self):
+        endpoint = self.add_endpoint_sip(template=False)
+        self.add_line(endpoint_sip_uuid=endpoint.uuid)
+
+        result = asterisk_conf_dao.find_sip_user_settings_since(None)
+
+        assert_that(result, has_entries(
+            configs=contains(has_entries(uuid=endpoint.uuid)),
+            deleted=empty(),
+            marker=not_(None),
+        ))
+
+    def test_given_no_change_then_returns_nothing(self):
+        endpoint = self.add_endpoint_sip(template=False)
+        self.add_line(endpoint_sip_uuid=endpoint.uuid)
+        self._forget_changes()
+
+        result = asterisk_conf_dao.find_sip_user_settings_since(1)
+
+        assert_that(result, has_entries(configs=empty(), deleted=empty()))
+
+    def test_given_changed_option_then_returns_endpoint(self):
+        endpoint = self.add_endpoint_sip(template=False)
+        other = self.add_endpoint_sip(template=False)
+        self.add_line(endpoint_sip_uuid=endpoint.uuid)
+        self.add_line(endpoint_sip_uuid=other.uuid)
+        self._forget_changes()
+
+        endpoint.endpoint_section_options = [['callerid', '"Foo" <101>']]
+        self.session.flush()
+
+        result = asterisk_conf_dao.find_sip_user_settings_since(1)
+
+        assert_that(result, has_entries(configs=contains(has_entries(uuid=endpoint.uuid))))
+
+    def test_given_changed_template_then_returns_dependents(self):
+        endpoint = self.add_endpoint_sip(template=False, templates=[self.general_config_template])
+        self.add_endpoint_sip(template=False)
+        self.add_trunk(endpoint_sip_uuid=endpoint.uuid)
+        self._forget_changes()
+
+        self.general_config_template.aor_section_options = [['max_contacts', '2']]
+        self.session.flush()
+
+        result = asterisk_conf_dao.find_sip_trunk_settings_since(1)
+
+        assert_that(result, has_entries(configs=contains(has_entries(
+            uuid=endpoint.uuid,
+            aor_section_options=has_items(contains('max_contacts', '2')),
+        ))))
+
+    def test_given_known_endpoint_without_line_then_returns_deleted(self):
+        endpoint = self.add_endpoint_sip(template=False)
+        removed = self.add_endpoint_sip(template=False)
+        self.add_line(endpoint_sip_uuid=endpoint.uuid)
+
+        result = asterisk_conf_dao.find_sip_user_settings_since(
+            None, known_uuids=[endpoint.uuid, removed.uuid],
+        )
+
+        assert_that(result, has_entries(deleted=contains(str(removed.uuid))))
+
+    def _enable_template_cache(self):
+        sip_template_cache.enable()
+        self.addCleanup(sip_template_cache.disable)
+
+    def test_given_changed_template_then_cached_flat_config_is_rebuilt(self):
+        self._enable_template_cache()
+        endpoint = self.add_endpoint_sip(template=False, templates=[self.general_config_template])
+        self.add_line(endpoint_sip_uuid=endpoint.uuid)
+        asterisk_conf_dao.find_sip_user_settings()
+
+        self.general_config_template.aor_section_options = [['max_contacts', '2']]
+        self.session.flush()
+
+        result = asterisk_conf_dao.find_sip_user_settings()
+
+        assert_that(result, contains(has_entries(
+            aor_section_options=has_items(contains('max_contacts', '2')),
+        )))
+
+    def test_given_renamed_transport_then_cached_flat_config_is_rebuilt(self):
+        self._enable_template_cache()
+        transport = self.add_transport(name='transport-udp')
+        template = self.add_endpoint_sip(template=True, transport_uuid=transport.uuid)
+        endpoint = self.add_endpoint_sip(template=False, templates=[template])
+        self.add_line(endpoint_sip_uuid=endpoint.uuid)
+        asterisk_conf_dao.find_sip_user_settings()
+
+        transport.name = 'transport-tcp'
+        self.session.flush()
+
+        result = asterisk_conf_dao.find_sip_user_settings()
+
+        assert_that(result, contains(has_entries(
+            endpoint_section_options=has_items(contains('transport', 'transport-tcp')),
+        )))
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import random
@@ -128,6 +128,30 @@ class TestQueueLogDAO(DAOTestCase):
 
         self.assertEqual(result, expected)
 
+    def test_get_wrapup_time_spanning_many_periods(self):
+        _, agent_id = self._insert_agent('Agent/1')
+        start = datetime(2012, 10, 1, 6, tzinfo=UTC)
+        end = datetime(2012, 10, 1, 7, 59, 59, 999999, tzinfo=UTC)
+        queue_log_data = '''\
+| time                            | callid | queuename | agent   | event       | data1 | data2 | data3 | data4 | data5 |
+| 2012-10-01 06:10:00.000000+0000 | NONE   | NONE      | Agent/1 | WRAPUPSTART |  1800 |       |       |       |       |
+| 2012-10-01 06:50:00.000000+0000 | NONE   | NONE      | Agent/1 | WRAPUPSTART |  2400 |       |       |       |       |
+'''
+        self._insert_queue_log_data(queue_log_data)
+
+        result = queue_log_dao.get_wrapup_times(self.session, start, end, timedelta(minutes=15))
+
+        expected = {
+            datetime(2012, 10, 1, 6, 0, tzinfo=UTC): {agent_id: {'wrapup_time': timedelta(minutes=5)}},
+            datetime(2012, 10, 1, 6, 15, tzinfo=UTC): {agent_id: {'wrapup_time': timedelta(minutes=15)}},
+            datetime(2012, 10, 1, 6, 30, tzinfo=UTC): {agent_id: {'wrapup_time': timedelta(minutes=10)}},
+            datetime(2012, 10, 1, 6, 45, tzinfo=UTC): {agent_id: {'wrapup_time': timedelta(minutes=10)}},
+            datetime(2012, 10, 1, 7, 0, tzinfo=UTC): {agent_id: {'wrapup_time': timedelta(minutes=15)}},
+            datetime(2012, 10, 1, 7, 15, tzinfo=UTC): {agent_id: {'wrapup_time': timedelta(minutes=15)}},
+        }
+
+        self.assertEqual(result, expected)
+
     def test_get_first_time(self):
         self.assertRaises(LookupError, queue_log_dao.get_first_time, self.session)
 
@@ -318,6 +342,21 @@ class TestQueueLogDAO(DAOTestCase):
 
         return expected
 
+    def test_delete_event_between_by_batch(self):
+        self._insert_entry_queue_full(datetime(2012, 7, 1, 7, 1, 1, tzinfo=UTC), 'delete_between_1', 'q1')
+        self._insert_entry_queue_full(datetime(2012, 7, 1, 8, 1, 1, tzinfo=UTC), 'delete_between_2', 'q1')
+        self._insert_entry_queue_full(datetime(2012, 7, 1, 8, 2, 1, tzinfo=UTC), 'delete_between_3', 'q2')
+        self._insert_entry_queue_full(datetime(2012, 7, 1, 9, 1, 1, tzinfo=UTC), 'delete_between_4', 'q1')
+
+        count = queue_log_dao.delete_event_between_by_batch(
+            '2012-07-01 08:00:00.000000', '2012-07-01 08:59:59.999999', batch_size=1)
+
+        callids = [r.callid for r in self.session.query(QueueLog.callid)
+                   .filter(QueueLog.callid.like('delete_between_%'))]
+
+        self.assertEqual(count, 2)
+        self.assertEqual(sorted(callids), ['delete_between_1', 'delete_between_4'])
+
     def test_delete_event_by_queue_between(self):
         self._insert_entry_queue_full(datetime(2012, 7, 1, 7, 1, 1, tzinfo=UTC), 'delete_between_1', 'q1')
         self._insert_entry_queue_full(datetime(2012, 7, 1, 8, 1, 1, tzinfo=UTC), 'delete_between_2', 'q1')
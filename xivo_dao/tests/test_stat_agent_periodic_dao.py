@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import six
@@ -82,6 +82,31 @@ class TestStatAgentPeriodicDAO(DAOTestCase):
         except LookupError:
             self.fail('Should have found a row')
 
+    def test_bulk_insert_stats(self):
+        _, agent_id_1 = self._insert_agent_to_stat_agent()
+        _, agent_id_2 = self._insert_agent_to_stat_agent()
+        stats = {
+            dt(2012, 1, 1, 1, 0, 0, tzinfo=UTC): {
+                agent_id_1: {'login_time': timedelta(minutes=50), 'pause_time': timedelta(minutes=13)},
+                agent_id_2: {'wrapup_time': timedelta(minutes=5)},
+            },
+            dt(2012, 1, 1, 2, 0, 0, tzinfo=UTC): {
+                agent_id_1: {'login_time': timedelta(minutes=20)},
+            },
+        }
+
+        stat_agent_periodic_dao.bulk_insert_stats(self.session, stats)
+
+        rows = (self.session.query(StatAgentPeriodic)
+                .order_by(StatAgentPeriodic.time, StatAgentPeriodic.stat_agent_id)
+                .all())
+        result = [(row.time, row.stat_agent_id, row.login_time, row.pause_time, row.wrapup_time) for row in rows]
+        self.assertEqual(result, [
+            (dt(2012, 1, 1, 1, tzinfo=UTC), agent_id_1, timedelta(minutes=50), timedelta(minutes=13), timedelta(0)),
+            (dt(2012, 1, 1, 1, tzinfo=UTC), agent_id_2, timedelta(0), timedelta(0), timedelta(minutes=5)),
+            (dt(2012, 1, 1, 2, tzinfo=UTC), agent_id_1, timedelta(minutes=20), timedelta(0), timedelta(0)),
+        ])
+
     def test_clean_table(self):
         _, agent_id = self._insert_agent_to_stat_agent()
         stats = {
@@ -132,3 +157,18 @@ class TestStatAgentPeriodicDAO(DAOTestCase):
 
         self.assertEqual(res.count(), 1)
         self.assertEqual(res[0].time, dt(2012, 1, 1, tzinfo=UTC))
+
+    def test_bulk_remove_after(self):
+        _, agent_id = self._insert_agent_to_stat_agent()
+        stats = {
+            dt(2012, 1, day, tzinfo=UTC): {agent_id: {'login_time': timedelta(minutes=15)}}
+            for day in (1, 2, 3)
+        }
+        stat_agent_periodic_dao.bulk_insert_stats(self.session, stats)
+
+        stat_agent_periodic_dao.bulk_remove_after(self.session, dt(2012, 1, 2, tzinfo=UTC))
+
+        res = self.session.query(StatAgentPeriodic.time)
+
+        self.assertEqual(res.count(), 1)
+        self.assertEqual(res[0].time, dt(2012, 1, 1, tzinfo=UTC))
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import datetime
@@ -10,7 +10,7 @@ from datetime import datetime as t
 
 from hamcrest import assert_that, contains, equal_to, has_properties
 
-from sqlalchemy import func
+from sqlalchemy import create_engine, func
 
 from xivo_dao import stat_dao
 from xivo_dao import stat_call_on_queue_dao
@@ -19,7 +19,7 @@ from xivo_dao.alchemy.stat_agent import StatAgent
 from xivo_dao.alchemy.stat_call_on_queue import StatCallOnQueue
 from xivo_dao.alchemy.stat_queue import StatQueue
 from xivo_dao.helpers.db_utils import flush_session
-from xivo_dao.tests.test_dao import DAOTestCase
+from xivo_dao.tests.test_dao import DAOTestCase, TEST_DB_URL
 
 TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
 
@@ -91,6 +91,100 @@ class TestFillAnsweredCall(DAOTestCase):
         assert_that(count, equal_to(1))
 
 
+class TestFillCallsSinceWatermark(DAOTestCase):
+
+    def setUp(self):
+        DAOTestCase.setUp(self)
+        self.callid = '1404377805.6457'
+        self.queue = StatQueue(name='swk_allemagne', tenant_uuid=self.default_tenant.uuid)
+        self.add_me(self.queue)
+        self.enterqueue_event = QueueLog(
+            time='2014-07-03 10:57:11.559080',
+            callid=self.callid,
+            queuename='swk_allemagne',
+            agent='NONE',
+            event='ENTERQUEUE',
+            data2='00049242184770',
+            data3='1',
+        )
+        self.complete_agent_event = QueueLog(
+            time='2014-07-03 11:06:10.374302',
+            callid=self.callid,
+            queuename='swk_allemagne',
+            agent='Agent/448',
+            event='COMPLETEAGENT',
+            data1='8',
+            data2='531',
+            data3='1',
+        )
+
+    def test_that_calls_straddling_the_watermark_are_added_once(self):
+        self.add_me(self.enterqueue_event)
+
+        first_watermark = stat_dao.fill_calls_since_watermark(self.session)
+
+        self.add_me(self.complete_agent_event)
+
+        second_watermark = stat_dao.fill_calls_since_watermark(self.session)
+        stat_dao.fill_calls_since_watermark(self.session)
+
+        assert_that(first_watermark, equal_to(self.enterqueue_event.id))
+        assert_that(second_watermark, equal_to(self.complete_agent_event.id))
+        result = self.session.query(StatCallOnQueue).all()
+        assert_that(result, contains(has_properties(
+            callid=self.callid,
+            status='answered',
+            talktime=531,
+            waittime=8,
+            stat_queue_id=self.queue.id,
+        )))
+
+    def test_that_rows_before_the_watermark_are_ignored(self):
+        self.add_me_all([self.enterqueue_event, self.complete_agent_event])
+        stat_dao.set_calls_watermark(self.session)
+        full_event = QueueLog(
+            time='2014-07-03 11:10:00.000000',
+            callid='1404377805.7000',
+            queuename='swk_allemagne',
+            agent='NONE',
+            event='FULL',
+        )
+        self.add_me(full_event)
+
+        stat_dao.fill_calls_since_watermark(self.session)
+
+        result = self.session.query(StatCallOnQueue).all()
+        assert_that(result, contains(has_properties(callid='1404377805.7000', status='full')))
+
+    def test_that_rows_are_kept_until_the_running_transactions_end(self):
+        full_event = QueueLog(
+            time='2014-07-03 11:10:00.000000',
+            callid='1404377805.7000',
+            queuename='swk_allemagne',
+            agent='NONE',
+            event='FULL',
+        )
+        engine = create_engine(TEST_DB_URL)
+        try:
+            with engine.begin() as running:
+                running.execute('SELECT txid_current()')
+                self.add_me(full_event)
+
+                first_watermark = stat_dao.fill_calls_since_watermark(self.session)
+
+            with engine.begin() as started_after:
+                started_after.execute('SELECT txid_current()')
+
+                second_watermark = stat_dao.fill_calls_since_watermark(self.session)
+        finally:
+            engine.dispose()
+
+        assert_that(first_watermark, equal_to(0))
+        assert_that(second_watermark, equal_to(full_event.id))
+        result = self.session.query(StatCallOnQueue).all()
+        assert_that(result, contains(has_properties(callid='1404377805.7000', status='full')))
+
+
 class TestFillSimpleCall(DAOTestCase):
 
     def setUp(self):
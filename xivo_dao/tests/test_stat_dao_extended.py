@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import six
@@ -228,6 +228,54 @@ class TestStatDAO(DAOTestCase):
 
         self.assertEqual(result, expected)
 
+    def test_get_pause_intervals_in_range_bounded_by_end(self):
+        _, agent_id_1 = self._insert_agent('Agent/1')
+        start = dt(2012, 7, 1, tzinfo=UTC)
+        end = dt(2012, 7, 21, 23, 59, 59, 999999, tzinfo=UTC)
+
+        queue_log_data = '''\
+| time                          | callid | queuename | agent   | event      | data1 | data2 | data3 | data4 | data5 |
+| 2012-07-21 23:59:19.999999+00 | NONE   | NONE      | Agent/1 | PAUSEALL   |       |       |       |       |       |
+| 2012-07-22 02:02:19.999999+00 | NONE   | NONE      | Agent/1 | UNPAUSEALL |       |       |       |       |       |
+| 2012-07-22 09:59:09.999999+00 | NONE   | NONE      | Agent/1 | PAUSEALL   |       |       |       |       |       |
+| 2012-07-22 10:54:09.999999+00 | NONE   | NONE      | Agent/1 | UNPAUSEALL |       |       |       |       |       |
+'''
+
+        self._insert_queue_log_data(queue_log_data)
+
+        result = stat_dao.get_pause_intervals_in_range(self.session, start, end)
+
+        expected = {
+            agent_id_1: [
+                (
+                    dt(2012, 7, 21, 23, 59, 19, 999999, tzinfo=UTC),
+                    dt(2012, 7, 22, 2, 2, 19, 999999, tzinfo=UTC),
+                )
+            ]
+        }
+
+        self.assertEqual(result, expected)
+
+    def test_get_pause_intervals_in_range_not_unpaused(self):
+        _, agent_id_1 = self._insert_agent('Agent/1')
+        start = dt(2012, 7, 1, tzinfo=UTC)
+        end = dt(2012, 7, 31, 23, 59, 59, 999999, tzinfo=UTC)
+
+        queue_log_data = '''\
+| time                          | callid | queuename | agent   | event      | data1 | data2 | data3 | data4 | data5 |
+| 2012-07-21 09:59:09.999999+00 | NONE   | NONE      | Agent/1 | PAUSEALL   |       |       |       |       |       |
+'''
+
+        self._insert_queue_log_data(queue_log_data)
+
+        result = stat_dao.get_pause_intervals_in_range(self.session, start, end)
+
+        expected = {
+            agent_id_1: [(dt(2012, 7, 21, 9, 59, 9, 999999, tzinfo=UTC), None)]
+        }
+
+        self.assertEqual(result, expected)
+
     def _insert_queue_log_data(self, queue_log_data):
         with flush_session(self.session):
             lines = queue_log_data.split('\n')
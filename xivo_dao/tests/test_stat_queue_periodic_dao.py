@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from datetime import datetime as dt
@@ -68,6 +68,25 @@ class TestStatQueuePeriodicDAO(DAOTestCase):
         except LookupError:
             self.fail('Should have found a row')
 
+    def test_bulk_insert_stats(self):
+        stats = self._get_stats_for_queue()
+        queue_id = list(stats.keys())[0]
+        stats_by_period = {
+            dt(2012, 1, 1, tzinfo=UTC): stats,
+            dt(2012, 1, 2, tzinfo=UTC): {queue_id: {'full': 4, 'total': 10}},
+        }
+
+        stat_queue_periodic_dao.bulk_insert_stats(self.session, stats_by_period)
+
+        result = self.session.query(StatQueuePeriodic).order_by(StatQueuePeriodic.time).all()
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result[0].answered, 27)
+        self.assertEqual(result[0].divert_waittime, 15)
+        self.assertEqual(result[0].total, 98)
+        self.assertEqual(result[1].answered, 0)
+        self.assertEqual(result[1].full, 4)
+        self.assertEqual(result[1].stat_queue_id, queue_id)
+
     def test_get_most_recent_time(self):
         self.assertRaises(LookupError, stat_queue_periodic_dao.get_most_recent_time, self.session)
 
@@ -123,3 +142,17 @@ class TestStatQueuePeriodicDAO(DAOTestCase):
 
         self.assertEqual(res.count(), 1)
         self.assertEqual(res[0].time, dt(2012, 1, 1, tzinfo=UTC))
+
+    def test_bulk_remove_after(self):
+        queue_name, queue_id = self._insert_queue_to_stat_queue()
+        stats = {queue_id: {'full': 4, 'total': 10}}
+        stat_queue_periodic_dao.bulk_insert_stats(self.session, {
+            dt(2012, 1, day, tzinfo=UTC): stats for day in (1, 2, 3)
+        })
+
+        stat_queue_periodic_dao.bulk_remove_after(self.session, dt(2012, 1, 2, tzinfo=UTC))
+
+        res = self.session.query(StatQueuePeriodic.time)
+
+        self.assertEqual(res.count(), 1)
+        self.assertEqual(res[0].time, dt(2012, 1, 1, tzinfo=UTC))
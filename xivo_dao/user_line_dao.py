@@ -1,26 +1,39 @@
 # -*- coding: utf-8 -*-
-# Copyright 2013-2020 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2021 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from sqlalchemy import and_
+from sqlalchemy import and_, bindparam
+from sqlalchemy.orm import Query
 
 from xivo_dao.alchemy.linefeatures import LineFeatures as LineSchema
 from xivo_dao.alchemy.user_line import UserLine
 
-from xivo_dao.helpers.db_manager import daosession
+from xivo_dao.helpers.db_manager import bakery, daosession
 
 
 @daosession
 def get_line_identity_by_user_id(session, user_id):
-    row = (session.query(LineSchema.endpoint_sip_uuid,
-                         LineSchema.endpoint_sccp_id,
-                         LineSchema.endpoint_custom_id,
-                         LineSchema.name)
-           .join(UserLine, and_(UserLine.line_id == LineSchema.id,
-                                UserLine.user_id == int(user_id),
-                                UserLine.main_user == True,  # noqa
-                                UserLine.main_line == True))
-           .first())
+    row = _line_identity_by_user_id_baked(session).params(user_id=int(user_id)).first()
+    return _line_identity(row, user_id)
+
+
+_line_identity_by_user_id_baked = bakery(
+    lambda session: _line_identity_by_user_id_query(bindparam('user_id')).with_session(session)
+)
+
+
+def _line_identity_by_user_id_query(user_id):
+    return (Query([LineSchema.endpoint_sip_uuid,
+                   LineSchema.endpoint_sccp_id,
+                   LineSchema.endpoint_custom_id,
+                   LineSchema.name])
+            .join(UserLine, and_(UserLine.line_id == LineSchema.id,
+                                 UserLine.user_id == user_id,
+                                 UserLine.main_user == True,  # noqa
+                                 UserLine.main_line == True)))
+
+
+def _line_identity(row, user_id):
     if not row:
         raise LookupError('Could not find a line for user %s', user_id)
     elif row.endpoint_sip_uuid: